@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+"""
+avwap.py — AVWAP من مجاميع تراكمية (prefix sums) بدل نسخ ذيل الإطار لكل مرساة.
+
+- vwap_prefix: P = cumsum(tp·v) و V = cumsum(v) مرة واحدة لكل إطار (أو جاهزة من batch_features،
+  وهي نفس المجاميع التي بُني منها عمود vwap).
+- AVWAP من المرساة a حتى الشمعة b = (P[b] - P[a-1]) / (V[b] - V[a-1]) ⇒ O(1) لأي مرساة.
+  حجم صفري على كامل المقطع ⇒ V[b] == V[a-1] تمامًا (إضافة أصفار لا تغيّر المجموع) ⇒ None كما كان.
+- avwap_many / confluence_count: نفس الحساب على مصفوفات (رموز × شموع) ومراسي (رموز × k)
+  لفحص تقاطع المراسي المتعددة لكل الكون دفعة واحدة.
+
+tests/test_avwap.py: مطابقة avwap_from_index القديم (نسخة + cumsum).
+"""
+
+from __future__ import annotations
+import math
+from typing import Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+
+def vwap_prefix(h: np.ndarray, l: np.ndarray, c: np.ndarray, v: np.ndarray, axis: int = -1) -> Tuple[np.ndarray, np.ndarray]:
+    tp = (h + l + c) / 3.0
+    return np.cumsum(tp * v, axis=axis), np.cumsum(v, axis=axis)
+
+
+def frame_prefix(df: pd.DataFrame) -> Tuple[np.ndarray, np.ndarray]:
+    return vwap_prefix(*(df[k].to_numpy(dtype=np.float64) for k in ("high", "low", "close", "volume")))
+
+
+def avwap_at(prefix: Tuple[np.ndarray, np.ndarray], anchor: Optional[int], bar: int = -2) -> Optional[float]:
+    """AVWAP من الموضع anchor حتى الموضع bar (افتراضيًا الشمعة المغلقة الأخيرة)."""
+    P, V = prefix
+    n = len(P)
+    b = bar + n if bar < 0 else bar
+    if anchor is None or anchor < 0 or anchor > b or b >= n:
+        return None
+    num, den = P[b], V[b]
+    if anchor > 0:
+        num, den = num - P[anchor - 1], den - V[anchor - 1]
+    if den == 0:
+        return None
+    x = num / den
+    return float(x) if math.isfinite(x) else None
+
+
+def avwap_many(P: np.ndarray, V: np.ndarray, anchors: np.ndarray, bar: int = -2) -> np.ndarray:
+    """P, V: (S, N)؛ anchors: (S, k) مواضع (سالبة/خارج النطاق = غائبة) ⇒ (S, k) مع NaN للغائب."""
+    S, N = P.shape
+    b = bar + N if bar < 0 else bar
+    a = np.asarray(anchors, dtype=np.int64)
+    ok = (a >= 0) & (a <= b)
+    prev = np.clip(a - 1, 0, N - 1)
+    rows = np.arange(S)[:, None]
+    base_p = np.where(a > 0, P[rows, prev], 0.0)
+    base_v = np.where(a > 0, V[rows, prev], 0.0)
+    den = V[:, b:b + 1] - base_v
+    with np.errstate(divide="ignore", invalid="ignore"):
+        out = (P[:, b:b + 1] - base_p) / den
+    out[~ok | (den == 0) | ~np.isfinite(out)] = np.nan
+    return out
+
+
+def confluence_count(price: np.ndarray, avwaps: np.ndarray, tol: np.ndarray) -> np.ndarray:
+    """عدد المراسي التي السعر فوقها بهامش tol لكل رمز (المراسي الغائبة لا تُحسب)."""
+    thr = avwaps * (1.0 - np.asarray(tol, dtype=np.float64)[:, None])
+    return ((~np.isnan(avwaps)) & (np.asarray(price, dtype=np.float64)[:, None] >= thr)).sum(axis=1)
+
@@ -0,0 +1,190 @@
+# -*- coding: utf-8 -*-
+"""
+batch_features.py — حساب مؤشرات وبوابات LTF لكل الكون دفعة واحدة (مصفوفة رموز × شموع).
+
+- الرموز التي تشترك في نفس شبكة الشموع (نفس الطول ونفس الطوابع بعد tail(240)) تُكدَّس في مصفوفات
+  (S, N) ويُحسب كل شيء بعمليات على المحور الكامل:
+  * EWM (adjust=False) بنفس مسح الكتل في indicators_np (_ewm_scan) على مصفوفة (K, S, N): كل
+    EMAs/RSI/ATR/vol_ema لكل الرموز في ضرب واحد — نواة واحدة للمسارين الفردي والجماعي.
+  * rolling (vol_ma20/z20/NR4/NR7) عبر sliding_window_view على المحور 1.
+  * مجاميع VWAP التراكمية (tp·v، v) تبقى في السجل ⇒ AVWAP أي مرساة في check_signal بفرق O(1).
+  * مدخلات البوابات: ATR% وكمّيات نطاقه الديناميكي (EWM span 5 + quantile 25/75)، median حجم 60،
+    z20، vol_ema5/20، ميل macd_hist، نظام السوق، وسلسلة quote volume.
+- الناتج: جدول ميزات لكل رمز (dict) يقرؤه ltf_precheck(feats=...) بلا أي DataFrame،
+  و frame() يبني df المؤشرات من صف المصفوفة (بدون إعادة حساب) للناجين فقط.
+- رمز بشموع فيها NaN أو أقل من 80 شمعة أو شبكة مختلفة الطول يبقى في مجموعته الخاصة أو يُترك
+  للمسار الفردي (لا يظهر في الجدول).
+"""
+
+from __future__ import annotations
+import os
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+from avwap import vwap_prefix
+from indicators_np import CLOSE_ALPHAS, _ewm_scan
+
+BATCH_FEATURES = os.getenv("BATCH_FEATURES", "0") == "1"
+
+_IND_COLS = ("ema9", "ema21", "ema50", "ema200", "rsi", "vol_ma20", "ema_fast", "ema_slow", "macd",
+             "macd_signal", "macd_hist", "atr", "vwap", "nr7", "nr4", "vol_z20")
+
+
+def _rolling_min_rows(x: np.ndarray, win: int) -> np.ndarray:
+    out = np.full(x.shape, np.nan)
+    if x.shape[1] >= win:
+        out[:, win - 1:] = sliding_window_view(x, win, axis=1).min(axis=-1)
+    return out
+
+
+def _stack(rows: list, trim: int) -> Optional[np.ndarray]:
+    if not rows or len(rows) < 80:
+        return None
+    try:
+        a = np.asarray(rows, dtype=np.float64)
+    except Exception:
+        return None
+    if a.ndim != 2 or a.shape[1] != 6 or np.isnan(a).any():
+        return None
+    return a[-trim:]
+
+
+def compute_group(ts: np.ndarray, o, h, l, c, v, atr_period: int = 14, vol_ma: int = 20) -> Dict[str, np.ndarray]:
+    """مصفوفات (S, N) لنفس شبكة الشموع ⇒ أعمدة add_indicators + مدخلات البوابات (S,)."""
+    S, N = c.shape
+    d = np.zeros_like(c)
+    d[:, 1:] = c[:, 1:] - c[:, :-1]
+    gain = np.where(d > 0, d, 0.0)
+    loss = -np.where(d < 0, d, 0.0)
+    gain[:, 0] = loss[:, 0] = 0.0
+    hl = np.abs(h - l)
+    tr = hl.copy()
+    cp = c[:, :-1]
+    tr[:, 1:] = np.maximum(hl[:, 1:], np.maximum(np.abs(h[:, 1:] - cp), np.abs(l[:, 1:] - cp)))
+
+    # مرور 1: EMAs الإغلاق ×6، gain/loss، ATR، vol_ema5/20
+    alphas = CLOSE_ALPHAS + (1.0 / 14, 1.0 / 14, 1.0 / atr_period, 2.0 / 6, 2.0 / 21)
+    x = np.empty((len(alphas), S, N))
+    x[:6] = c
+    x[6], x[7], x[8], x[9], x[10] = gain, loss, tr, v, v
+    y = _ewm_scan(x, alphas)
+    ema9, ema21, ema50, ema200, efast, eslow = y[:6]
+    ag, al, atr, vol_ema5, vol_ema20 = y[6], y[7], y[8], y[9], y[10]
+    al = np.where(al == 0, 1e-9, al)
+    rsi = 100 - (100 / (1 + ag / al))
+    macd = efast - eslow
+
+    # مرور 2: MACD signal + تنعيم ATR% (span 5) لنطاق ATR الديناميكي
+    atr_pct_all = atr / c
+    y2 = _ewm_scan(np.stack([macd, atr_pct_all]), (CLOSE_ALPHAS[0], 2.0 / 6))
+    macd_signal, atr_pct_sm = y2[0], y2[1]
+    macd_hist = macd - macd_signal
+
+    cum_pv, cum_v = vwap_prefix(h, l, c, v, axis=1)
+    vwap = cum_pv / np.where(cum_v == 0, np.nan, cum_v)
+
+    # rolling
+    def _mean_minp1(win: int) -> np.ndarray:
+        out = np.empty((S, N))
+        head = min(win - 1, N)
+        out[:, :head] = np.cumsum(v[:, :head], axis=1) / np.arange(1, head + 1)
+        if N >= win:
+            out[:, win - 1:] = sliding_window_view(v, win, axis=1).mean(axis=-1)
+        return out
+
+    vol_ma20 = _mean_minp1(vol_ma)
+    vol_z20 = np.full((S, N), np.nan)
+    if N >= 20:
+        w = sliding_window_view(v, 20, axis=1)
+        m = w.mean(axis=-1)
+        dv = w - m[..., None]
+        sd = np.sqrt((dv * dv).mean(axis=-1))
+        sd[(sd == 0) | (w.max(axis=-1) == w.min(axis=-1))] = np.nan
+        vol_z20[:, 19:] = (v[:, 19:] - m) / sd
+    nr7 = hl == _rolling_min_rows(hl, 7)
+    nr4 = hl == _rolling_min_rows(hl, 4)
+
+    # مدخلات البوابات (الشمعة المغلقة = -2)
+    price = c[:, -2]
+    atr_c = atr[:, -2]
+    up = (c[:, -1] > ema50[:, -1]) & ((ema50[:, -1] - ema50[:, -11]) > 0 if N > 10 else False)
+    seg = slice(max(0, N - 80), N)
+    width = (h[:, seg].max(axis=1) - l[:, seg].min(axis=1)) / np.maximum(c[:, -1], 1e-9)
+    atrp_reg = atr_c / np.maximum(price, 1e-9)
+    regime = np.where(up, "trend", np.where(width <= 6 * atrp_reg, "range", "mixed"))
+    xq = np.clip(atr_pct_sm[:, -200:], 0, None)
+    q25, q75 = np.quantile(xq, [0.25, 0.75], axis=1)
+    v_med60 = np.median(v[:, -61:-1], axis=1) if N >= 61 else vol_ma20[:, -2]
+
+    return {
+        "ema9": ema9, "ema21": ema21, "ema50": ema50, "ema200": ema200, "rsi": rsi, "vol_ma20": vol_ma20,
+        "ema_fast": efast, "ema_slow": eslow, "macd": macd, "macd_signal": macd_signal, "macd_hist": macd_hist,
+        "atr": atr, "vwap": vwap, "nr7": nr7, "nr4": nr4, "vol_z20": vol_z20,
+        "_cum_pv": cum_pv, "_cum_v": cum_v,
+        # (S,)
+        "_atr_pct": atr_c / np.maximum(price, 1e-9),
+        "_macd_slope_3": macd_hist[:, -2] - macd_hist[:, -5],
+        "_regime": regime, "_q25": q25, "_q75": q75,
+        "_v_med60": v_med60, "_vol_ema5": vol_ema5[:, -2], "_vol_ema20": vol_ema20[:, -2],
+    }
+
+
+def compute_universe(data: Dict[str, list], trim: int = 240, atr_period: int = 14,
+                     vol_ma: int = 20) -> Dict[str, dict]:
+    """data: {symbol: صفوف ccxt} ⇒ {symbol: ميزات}. رموز غير صالحة للدفعة لا تظهر في الناتج."""
+    groups: Dict[bytes, List[tuple]] = {}
+    for sym, rows in data.items():
+        a = _stack(rows, trim)
+        if a is None:
+            continue
+        ts = a[:, 0].astype(np.int64)
+        groups.setdefault(ts.tobytes(), []).append((sym, rows, a, ts))
+
+    out: Dict[str, dict] = {}
+    for members in groups.values():
+        ts = members[0][3]
+        A = np.stack([m[2] for m in members])                 # (S, N, 6)
+        o, h, l, c, v = (np.ascontiguousarray(A[:, :, k]) for k in range(1, 6))
+        g = compute_group(ts, o, h, l, c, v, atr_period=atr_period, vol_ma=vol_ma)
+        N = len(ts)
+        for i, (sym, rows, a, _) in enumerate(members):
+            n_rows = len(rows)
+            closed = {"timestamp": int(ts[-2]), "open": o[i, -2], "high": h[i, -2], "low": l[i, -2],
+                      "close": c[i, -2], "volume": v[i, -2], "vol_ma20": g["vol_ma20"][i, -2]}
+            out[sym] = {
+                "n_rows": n_rows, "last_ts": int(ts[-1]), "last_close": float(c[i, -1]), "n": N,
+                "closed": closed, "open_cur": float(o[i, -1]),
+                "atr": float(g["atr"][i, -2]), "atr_pct": float(g["_atr_pct"][i]),
+                "macd_slope_3": float(g["_macd_slope_3"][i]), "regime": str(g["_regime"][i]),
+                "q_band": (float(g["_q25"][i]), float(g["_q75"][i])),   # N ≥ 80 ⇒ ≥ 40 قيمة دائمًا
+                "rvol_stats": (float(g["_v_med60"][i]), float(g["vol_z20"][i, -2]),
+                               float(g["_vol_ema5"][i]), float(g["_vol_ema20"][i])),
+                "qv": c[i] * v[i],
+                "vwap_prefix": (g["_cum_pv"][i], g["_cum_v"][i]),   # AVWAP لأي مرساة (avwap.py)
+                "frame": _frame_builder(g, i, ts, o, h, l, c, v, n_rows),
+            }
+    return out
+
+
+def _frame_builder(g: dict, i: int, ts, o, h, l, c, v, n_rows: int):
+    def frame() -> pd.DataFrame:
+        N = len(ts)
+        cols = {"timestamp": ts, "open": o[i], "high": h[i], "low": l[i], "close": c[i], "volume": v[i]}
+        for k in _IND_COLS:
+            cols[k] = g[k][i]
+        # نفس index مسار _prepare_ltf_df: reset_index ثم tail(240)
+        return pd.DataFrame(cols, index=pd.RangeIndex(n_rows - N, n_rows))
+    return frame
+
+
+def matches(feats: Optional[dict], ohlcv: list) -> bool:
+    """الميزات محسوبة من نفس الصفوف؟ (الطول + آخر طابع + آخر إغلاق للشمعة الجارية)."""
+    try:
+        return (feats is not None and len(ohlcv) == feats["n_rows"] and int(ohlcv[-1][0]) == feats["last_ts"]
+                and float(ohlcv[-1][4]) == feats["last_close"])
+    except Exception:
+        return False
+
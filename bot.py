@@ -9,11 +9,23 @@ import signal
 from datetime import datetime, timedelta, timezone
 from pathlib import Path
 from typing import Tuple, Optional, Dict, Any, List
-from collections import deque
 import random
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 
 import ccxt
 import pytz
+from okx_async import OKXAsync
+from candle_store import CandleStore, CANDLE_STORE_CAPACITY
+from resample import resample_ohlcv, compare_bars, okx_bar_offset_ms, tf_to_ms
+from ticker_snapshot import TickerSnapshot
+from single_flight import SingleFlight, make_key
+from rate_limiter import EndpointRateLimiter
+from okx_routes import SymbolRouter
+from scan_pipeline import Pipeline, Stage
+from strategy_pool import StrategyPool, STRATEGY_POOL, STRATEGY_POOL_WORKERS
+from scan_shards import ShardCoordinator, SHARD_MODE, SHARD_OUTBOX_POLL_SEC
+from scan_tiers import ScanTiers, SCAN_TIERS
 from aiogram import Bot, Dispatcher, F
 from aiogram.filters import Command, CommandObject
 from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup
@@ -104,7 +116,7 @@ from config import (
     MAX_OPEN_TRADES, TIMEZONE, DAILY_REPORT_HOUR_LOCAL,
     PRICE_2_WEEKS_USD, PRICE_4_WEEKS_USD,
     SUB_DURATION_2W, SUB_DURATION_4W,
-    USDT_TRC20_WALLET
+    USDT_TRC20_WALLET, APP_DATA_DIR
 )
 
 # === Force pricing/durations override (optional, keeps DB keys)
@@ -125,7 +137,9 @@ from database import (
     has_open_trade_on_symbol, get_stats_24h, get_stats_7d,
     User, Trade,
     # NEW imports for multi-targets flow
-    trade_targets_list, trade_entries_list, update_last_hit_idx
+    trade_targets_list, trade_entries_list, update_last_hit_idx,
+    # تقسيم الفحص بين عدة عمّال
+    outbox_put, outbox_take, outbox_prune, outbox_pending_count
 )
 
 # Optional referral helpers (defensive import)
@@ -146,7 +160,8 @@ except Exception:
     def db_list_active_uids(s): return []
 
 # Strategy & Symbols
-from strategy import check_signal  # NOTE: strategy applies Auto-Relax + scoring
+from batch_features import BATCH_FEATURES
+from strategy import check_signal, ltf_precheck, ltf_batch_features, PIVOT_INDEX, PIVOT_INDEXES, STATE as STRATEGY_STATE, REJECTS as STRATEGY_REJECTS, PROFILE as STRATEGY_PROFILE, PRE_GATES, CHECK_GATES  # NOTE: strategy applies Auto-Relax + scoring
 from symbols import list_symbols, INST_TYPE, TARGET_SYMBOLS_COUNT, MIN_24H_USD_VOL
 import symbols as symbols_mod  # لاستخدام SYMBOLS_META و _prepare_symbols()
 
@@ -162,32 +177,13 @@ logging.getLogger("aiogram").setLevel(logging.INFO)
 # ===== OKX market helpers (safe loader & symbol adapter) =====
 OKX_MARKET_TYPES = [t.strip() for t in os.getenv("OKX_MARKET_TYPES", "spot,swap").split(",") if t.strip()]
 
-def safe_load_okx_markets(exchange, logger=None):
+async def safe_load_okx_markets(exchange, logger=None):
     """
     يجلب الأسواق نوعًا بنوع مع فلترة المعطوبين (base/quote/symbol).
     يحقن النتائج في exchange.markets و exchange.markets_by_id.
-    يعيد set بالـ symbols الصحيحة.
+    يعيد set بالـ symbols الصحيحة. كل نوع عبر _okx_call (عائلة instruments في محدّد المعدل).
     """
-    all_markets = []
-    total_bad = 0
-    for t in OKX_MARKET_TYPES:
-        try:
-            raw = exchange.fetch_markets_by_type(t, {})
-        except Exception as e:
-            if logger: logger.warning(f"[okx] skip type {t}: {e}")
-            continue
-        good = [m for m in raw if m.get("base") and m.get("quote") and m.get("symbol")]
-        bad  = len(raw) - len(good)
-        total_bad += bad
-        if bad and logger:
-            logger.info(f"[okx] filtered {bad} malformed {t} markets")
-        all_markets.extend(good)
-
-    exchange.markets = exchange.index_by(all_markets, "symbol") if all_markets else {}
-    exchange.markets_by_id = exchange.index_by(all_markets, "id") if all_markets else {}
-    if logger:
-        logger.info(f"[okx] loaded {len(all_markets)} markets (filtered={total_bad}) from types={OKX_MARKET_TYPES}")
-    return set(exchange.markets.keys())
+    return await exchange.load_markets_by_types(OKX_MARKET_TYPES, logger, call=_okx_call)
 
 def prefer_swap_symbol(sym: str, markets: set) -> str | None:
     """
@@ -246,8 +242,8 @@ TIME_EXIT_DEFAULT_BARS = int(os.getenv("TIME_EXIT_DEFAULT_BARS", "8"))
 TIME_EXIT_GRACE_SEC = int(os.getenv("TIME_EXIT_GRACE_SEC", "45"))
 HTF_FETCH_PARALLEL = os.getenv("HTF_FETCH_PARALLEL", "0") == "1"  # لتقليل ضغط الاتصالات
 
-# OKX
-exchange = ccxt.okx({"enableRateLimit": True})
+# OKX — محوّل asyncio فوق جلسة HTTP مشتركة (بدل ccxt المتزامن + run_in_executor)
+exchange = OKXAsync()
 AVAILABLE_SYMBOLS: List[str] = []
 AVAILABLE_SYMBOLS_LOCK = asyncio.Lock()
 
@@ -255,26 +251,38 @@ AVAILABLE_SYMBOLS_LOCK = asyncio.Lock()
 OKX_PUBLIC_MAX = int(os.getenv("OKX_PUBLIC_RATE_MAX", "18"))
 OKX_PUBLIC_WIN = float(os.getenv("OKX_PUBLIC_RATE_WINDOW", "2"))
 
-class SlidingRateLimiter:
-    def __init__(self, max_calls: int, window_sec: float):
-        self.max_calls = max_calls; self.window = window_sec
-        self.calls = deque(); self._lock = asyncio.Lock()
-    async def wait(self):
-        while True:
-            async with self._lock:
-                now = asyncio.get_running_loop().time()
-                while self.calls and (now - self.calls[0]) > self.window:
-                    self.calls.popleft()
-                if len(self.calls) < self.max_calls:
-                    self.calls.append(now); return
-                sleep_for = self.window - (now - self.calls[0]) + 0.05
-            await asyncio.sleep(max(sleep_for, 0.05))
+# ميزانية مستقلة لكل عائلة endpoints (candles/tickers/books/...) — انظر rate_limiter.py
+# OKX_PUBLIC_RATE_MAX/WINDOW تبقى ميزانية العائلة الافتراضية للدوال غير المصنّفة
+RATE = EndpointRateLimiter(default=(OKX_PUBLIC_MAX, OKX_PUBLIC_WIN))
 
-RATE = SlidingRateLimiter(OKX_PUBLIC_MAX, OKX_PUBLIC_WIN)
+# الطلبات المتطابقة المتزامنة (فحص/مراقبة/تريلينغ/debug) تُدمج في طلب واحد + إعادة استخدام لثانية
+OKX_SINGLEFLIGHT_TTL_SEC = float(os.getenv("OKX_SINGLEFLIGHT_TTL_SEC", "1.0"))
+OKX_FLIGHTS = SingleFlight(OKX_SINGLEFLIGHT_TTL_SEC)
+
+async def _okx_call(method: str, *args, **kwargs):
+    """نقطة الدخول الوحيدة لطلبات OKX العامة: single-flight ثم محدّد المعدل ثم الاستدعاء غير المتزامن."""
+    family, weight = RATE.family_of(method, kwargs)
+    async def _go():
+        await RATE.wait(family, weight)
+        try:
+            return await getattr(exchange, method)(*args, **kwargs)
+        except (ccxt.RateLimitExceeded, ccxt.DDoSProtection):
+            RATE.penalize(family)
+            raise
+    return await OKX_FLIGHTS.do(make_key(method, args, kwargs), _go)
 
 # === فواصل الفحص والتحديث ===
 SYMBOLS_REFRESH_HOURS = int(os.getenv("SYMBOLS_REFRESH_HOURS", "4"))  # تحديث الرموز كل 4 ساعات
 SIGNAL_SCAN_INTERVAL_SEC = int(os.getenv("SIGNAL_SCAN_INTERVAL_SEC", "60"))  # 60=دقيقة | 300=5 دقائق
+# bar = فحص بعد إغلاق كل شمعة TIMEFRAME بـ SCAN_BAR_CLOSE_DELAY_SEC | interval = كل SIGNAL_SCAN_INTERVAL_SEC (القديم)
+SCAN_SCHEDULE = os.getenv("SCAN_SCHEDULE", "bar").strip().lower()
+SCAN_BAR_CLOSE_DELAY_SEC = float(os.getenv("SCAN_BAR_CLOSE_DELAY_SEC", "3"))
+# الرموز التي لم تظهر شمعتها الجديدة بعد (تأخر المنصة) يعاد فحصها فقط حتى SCAN_BAR_RETRIES مرة
+SCAN_BAR_RETRY_SEC = float(os.getenv("SCAN_BAR_RETRY_SEC", "10"))
+SCAN_BAR_RETRIES = int(os.getenv("SCAN_BAR_RETRIES", "3"))
+SCAN_SKIP_UNCHANGED = os.getenv("SCAN_SKIP_UNCHANGED", "1") == "1"
+# مهلة الدورة: بعدها لا يبدأ رمز جديد، وما لم يُصل إليه يتقدم في الدورة التالية (0 = تلقائي)
+SCAN_CYCLE_BUDGET_SEC = float(os.getenv("SCAN_CYCLE_BUDGET_SEC", "0"))
 
 # مراقبة الصفقات
 MONITOR_INTERVAL_SEC = int(os.getenv("MONITOR_INTERVAL_SEC", "15"))
@@ -283,6 +291,12 @@ TIMEFRAME = os.getenv("TIMEFRAME", "5m")
 # ⚠️ لتقليل ضغط اتصالات urllib3 (pool=10/host)، خفّضنا التوازي الافتراضي
 SCAN_BATCH_SIZE = int(os.getenv("SCAN_BATCH_SIZE", "8"))
 MAX_CONCURRENCY = int(os.getenv("MAX_CONCURRENCY", "4"))
+# خط الفحص: عمّال الجلب وحجم الطوابير بين المراحل (ضغط عكسي)
+SCAN_FETCH_WORKERS = int(os.getenv("SCAN_FETCH_WORKERS", str(MAX_CONCURRENCY)))
+SCAN_QUEUE_SIZE = int(os.getenv("SCAN_QUEUE_SIZE", str(SCAN_BATCH_SIZE)))
+STRATEGY_EXECUTOR = ThreadPoolExecutor(max_workers=1, thread_name_prefix="strategy")
+# STRATEGY_POOL=1: التقييم في عمليات منفصلة (عدد الأنوية) بدل الخيط الواحد
+STRATEGY_PROCS: Optional[StrategyPool] = StrategyPool(STRATEGY_POOL_WORKERS) if STRATEGY_POOL else None
 
 # Risk V2
 RISK_STATE_FILE = Path("risk_state.json")
@@ -719,14 +733,13 @@ async def load_okx_markets_and_filter():
     """يبني AVAILABLE_SYMBOLS من SYMBOLS مع تكييف :USDT لعقود السواب، باستخدام لودر آمن."""
     global AVAILABLE_SYMBOLS
     try:
-        loop = asyncio.get_event_loop()
-
         # جرّب اللودر الآمن أولاً
-        markets = await loop.run_in_executor(None, safe_load_okx_markets, exchange, logger)
+        markets = await safe_load_okx_markets(exchange, logger)
         if not markets:
             # fallback: حاول load_markets التقليدي (قد ينجح أحيانًا)
-            await loop.run_in_executor(None, exchange.load_markets)
+            await exchange.load_markets()
             markets = set(exchange.markets.keys())
+        ROUTES.rebuild(exchange.markets)
 
         syms = list(SYMBOLS)
         meta = getattr(symbols_mod, "SYMBOLS_META", {}) or {}
@@ -775,11 +788,11 @@ async def rebuild_available_symbols(new_symbols: List[str] | Tuple[List[str], Di
             logger.warning("rebuild_available_symbols: incoming list is EMPTY — skipped (keeping previous).")
             return
 
-        loop = asyncio.get_event_loop()
-        markets = await loop.run_in_executor(None, safe_load_okx_markets, exchange, logger)
+        markets = await safe_load_okx_markets(exchange, logger)
         if not markets:
-            await loop.run_in_executor(None, exchange.load_markets)
+            await exchange.load_markets()
             markets = set(exchange.markets.keys())
+        ROUTES.rebuild(exchange.markets)
 
         filtered, skipped = [], []
         for s in raw_list:
@@ -830,53 +843,33 @@ async def refresh_symbols_periodically():
 # ---------------------------
 # Data fetchers
 # ---------------------------
+# جدول التوجيه: الرمز الفعلي + instType + الصيغة الناجحة + حجر BadSymbol (يُبنى مع كل تحميل أسواق)
+ROUTES = SymbolRouter(prefer_swap_symbol)
+
 def _okx_ticker_params(sym_eff: str) -> dict:
     """
-    يحدّد instType المناسب لـ OKX (SWAP أو SPOT) إن أمكن من exchange.markets.
+    يحدّد instType المناسب لـ OKX (SWAP أو SPOT) من جدول التوجيه.
     """
-    try:
-        m = None
-        if getattr(exchange, "markets", None):
-            m = exchange.markets.get(sym_eff)
-            if m is None:
-                # أحيانًا sym_eff يكون id (مثل IMX-USDT-SWAP)
-                mid = getattr(exchange, "markets_by_id", {}).get(sym_eff)
-                if mid:
-                    m = mid
-        if m:
-            if m.get("contract") or (m.get("type") == "swap"):
-                return {"instType": "SWAP"}
-            if m.get("spot") or (m.get("type") == "spot"):
-                return {"instType": "SPOT"}
-    except Exception:
-        pass
-    # افتراضي آمن: جرّب SWAP أولًا (أغلب رموزنا سواب)، وسنُسقط إلى SPOT بالفولباك داخل المستدعي.
-    return {"instType": "SWAP"}
+    return {"instType": ROUTES.inst_type(sym_eff)}
 
 def _maybe_adapt_symbol_for_fetch(sym: str) -> str:
     """
     يكيّف الرمز للجلب: يفضّل السواب :USDT إن وُجد، وإلا يحاول البدائل.
-    يعتمد فقط على exchange.markets المحمَّلة مسبقًا (بدون أي await/blocking).
+    يعتمد فقط على جدول التوجيه المبني من الأسواق المحمَّلة (بدون أي await/blocking).
     """
-    try:
-        markets = set(exchange.markets.keys()) if getattr(exchange, "markets", None) else set()
-        if not markets:
-            return sym  # لا نحاول تحميل الأسواق هنا لتجنب مشاكل اللوب
-        alt = prefer_swap_symbol(sym, markets)
-        return alt or sym
-    except Exception:
-        return sym
+    if not len(ROUTES) and getattr(exchange, "markets", None):
+        ROUTES.rebuild(exchange.markets)
+    return ROUTES.resolve(sym)
 
-
-async def fetch_ohlcv(symbol: str, timeframe=TIMEFRAME, limit=300) -> list:
+async def _fetch_ohlcv_remote(symbol: str, timeframe=TIMEFRAME, limit=300, since: Optional[int] = None) -> list:
+    if ROUTES.is_quarantined(symbol):
+        return []
     sym_eff = _maybe_adapt_symbol_for_fetch(symbol)
     for attempt in range(4):
         try:
-            await RATE.wait()
-            loop = asyncio.get_event_loop()
-            return await loop.run_in_executor(
-                None, lambda: exchange.fetch_ohlcv(sym_eff, timeframe=timeframe, limit=limit)
-            )
+            rows = await _okx_call("fetch_ohlcv", sym_eff, timeframe=timeframe, since=since, limit=limit)
+            ROUTES.forgive(sym_eff)
+            return rows
         except (ccxt.RateLimitExceeded, ccxt.DDoSProtection):
             await asyncio.sleep(0.6 * (attempt + 1) + random.uniform(0.1, 0.4))
         except ccxt.BadSymbol as e:
@@ -884,118 +877,242 @@ async def fetch_ohlcv(symbol: str, timeframe=TIMEFRAME, limit=300) -> list:
                 logger.info(f"FETCH_OHLCV retry with original symbol after adapt fail: {sym_eff} -> {symbol}")
                 sym_eff = symbol  # جرّب الأصل كفرصة أخيرة
                 continue
-            logger.warning(f"❌ FETCH_OHLCV BadSymbol [{symbol}]: {e}")
+            ttl = ROUTES.quarantine(symbol)
+            logger.warning(f"❌ FETCH_OHLCV BadSymbol [{symbol}]: {e} — quarantined {ttl:.0f}s")
             return []
         except Exception as e:
             logger.warning(f"❌ FETCH_OHLCV ERROR [{sym_eff}]: {e}")
             return []
     return []
 
+# مخزن الشموع: أول طلب كامل، ثم الفروقات فقط عبر since (CANDLE_CACHE=0 للتعطيل)
+CANDLE_CACHE = os.getenv("CANDLE_CACHE", "1") == "1"
+CANDLES = CandleStore(_fetch_ohlcv_remote)
+
+# حفظ الشموع على القرص لإعادة تشغيل دافئة (تحميل عند الإقلاع + حفظ دوري + عند الإيقاف)
+CANDLE_PERSIST = os.getenv("CANDLE_PERSIST", "1") == "1"
+CANDLE_PERSIST_SEC = int(os.getenv("CANDLE_PERSIST_SEC", "300"))
+CANDLE_PERSIST_MAX_AGE_H = float(os.getenv("CANDLE_PERSIST_MAX_AGE_H", "24"))
+CANDLE_PERSIST_DIR = Path(os.getenv("CANDLE_PERSIST_DIR", str(APP_DATA_DIR / "ohlcv")))
+
+async def fetch_ohlcv(symbol: str, timeframe=TIMEFRAME, limit=300) -> list:
+    if CANDLE_CACHE:
+        return await CANDLES.get(symbol, timeframe, limit)
+    return await _fetch_ohlcv_remote(symbol, timeframe=timeframe, limit=limit)
+
 # NEW: HTF support (H1/H4/D1)
 HTF_MAP = {"H1": ("1h", 220), "H4": ("4h", 220), "D1": ("1d", 220)}
 
+async def _fetch_htf_remote(symbol: str, tf_ccxt: str, limit: int, since: Optional[int] = None) -> list:
+    if ROUTES.is_quarantined(symbol):
+        return []
+    se = _maybe_adapt_symbol_for_fetch(symbol)
+    for attempt in range(3):
+        try:
+            rows = await _okx_call("fetch_ohlcv", se, timeframe=tf_ccxt, since=since, limit=limit)
+            ROUTES.forgive(se)
+            return rows
+        except (ccxt.RateLimitExceeded, ccxt.DDoSProtection):
+            await asyncio.sleep(0.5 * (attempt + 1))
+        except ccxt.BadSymbol:
+            # حاول الرمز الأصلي كفرصة أخيرة
+            if se != symbol:
+                se = symbol
+                continue
+            ROUTES.quarantine(symbol)
+            return []
+        except Exception:
+            return []
+    return []
+
+# كاش HTF: كل إطار يُخدم من الذاكرة حتى إغلاق شمعته الجارية ثم يُحدَّث بالفرق فقط.
+# آمن لأن pass_mtf_filter_any يقرأ الشموع المغلقة فقط (iloc[-2]). HTF_CACHE=0 للتعطيل.
+HTF_CACHE = os.getenv("HTF_CACHE", "1") == "1"
+
+# إعادة تشكيل محلية: H4 (و D1 اختياريًا) تُبنى من سلسلة H1 واحدة مخزّنة بدل جلبها من المنصة.
+# D1 يحتاج ~5300 شمعة H1 (18 صفحة في الإقلاع البارد) لذا هو اختياري.
+# HTF_RESAMPLE_VERIFY=1 يقارن الناتج بشموع المنصة ويستخدم شموع المنصة عند أي اختلاف.
+HTF_RESAMPLE = os.getenv("HTF_RESAMPLE", "1") == "1"
+HTF_RESAMPLE_D1 = os.getenv("HTF_RESAMPLE_D1", "0") == "1"
+HTF_RESAMPLE_VERIFY = os.getenv("HTF_RESAMPLE_VERIFY", "0") == "1"
+HTF_DERIVED = (["H4"] + (["D1"] if HTF_RESAMPLE_D1 else [])) if (HTF_RESAMPLE and HTF_CACHE) else []
+RESAMPLE_STATS = {"built": 0, "memo": 0, "verified": 0, "mismatch": 0}
+_RESAMPLE_MEMO: Dict[tuple, tuple] = {}
+
+def _htf_base_depth() -> int:
+    base_tf, base_limit = HTF_MAP["H1"]
+    depth = base_limit
+    for k in HTF_DERIVED:
+        tf, limit = HTF_MAP[k]
+        depth = max(depth, (tf_to_ms(tf) // tf_to_ms(base_tf)) * (limit + 1))
+    return depth
+
+HTF_BASE_DEPTH = _htf_base_depth()
+HTF_CANDLES = CandleStore(_fetch_htf_remote, capacity=max(CANDLE_STORE_CAPACITY, HTF_BASE_DEPTH))
+
+def _resampled(symbol: str, key: str, base: list) -> list:
+    """H1 → key مع ذاكرة حسب آخر صف في الأساس (الأساس لا يتغيّر قبل إغلاق شمعة H1)."""
+    tf, limit = HTF_MAP[key]
+    sig = (int(base[0][0]), tuple(base[-1]), len(base))
+    hit = _RESAMPLE_MEMO.get((symbol, key))
+    if hit and hit[0] == sig:
+        RESAMPLE_STATS["memo"] += 1
+        return hit[1]
+    rows = resample_ohlcv(base, HTF_MAP["H1"][0], tf, okx_bar_offset_ms(tf, exchange.bar_of(tf)))[-limit:]
+    _RESAMPLE_MEMO[(symbol, key)] = (sig, rows)
+    RESAMPLE_STATS["built"] += 1
+    return rows
+
+def _candle_stores() -> dict:
+    return {"ltf": CANDLES, "htf": HTF_CANDLES}
+
+def load_persisted_candles():
+    if not CANDLE_PERSIST:
+        return
+    t0 = time.time()
+    counts = {}
+    for name, store in _candle_stores().items():
+        try:
+            counts[name] = store.load_dir(CANDLE_PERSIST_DIR / name, max_age_sec=CANDLE_PERSIST_MAX_AGE_H * 3600)
+        except Exception as e:
+            logger.warning(f"[candles] load {name} failed: {e}")
+    logger.info(f"[candles] warm start: {counts} series from {CANDLE_PERSIST_DIR} in {time.time()-t0:.2f}s")
+
+async def flush_persisted_candles():
+    if not CANDLE_PERSIST:
+        return
+    for name, store in _candle_stores().items():
+        snap = store.snapshot_dirty()          # النسخ داخل اللوب، والكتابة في thread
+        if snap:
+            try:
+                await asyncio.to_thread(CandleStore.write_snapshot, CANDLE_PERSIST_DIR / name, snap)
+            except Exception as e:
+                logger.warning(f"[candles] flush {name} failed: {e}")
+
+async def persist_candles_loop():
+    while True:
+        await asyncio.sleep(CANDLE_PERSIST_SEC)
+        await flush_persisted_candles()
+
 async def fetch_ohlcv_htf(symbol: str) -> dict:
     """Fetches H1/H4/D1 OHLCV; parallelism optional to reduce connection pool pressure."""
-    sym_eff = _maybe_adapt_symbol_for_fetch(symbol)
 
     async def _one(tf_ccxt: str, limit: int) -> list:
-        se = sym_eff
-        for attempt in range(3):
-            try:
-                await RATE.wait()
-                loop = asyncio.get_event_loop()
-                return await loop.run_in_executor(
-                    None, lambda: exchange.fetch_ohlcv(se, timeframe=tf_ccxt, limit=limit)
-                )
-            except (ccxt.RateLimitExceeded, ccxt.DDoSProtection):
-                await asyncio.sleep(0.5 * (attempt + 1))
-            except ccxt.BadSymbol:
-                # حاول الرمز الأصلي كفرصة أخيرة
-                if se != symbol:
-                    se = symbol
+        if HTF_CACHE:
+            return await HTF_CANDLES.get(symbol, tf_ccxt, limit, until_close=True)
+        return await _fetch_htf_remote(symbol, tf_ccxt, limit)
+
+    out = {}
+    remote_map = dict(HTF_MAP)
+    if HTF_DERIVED:
+        base_tf, base_limit = HTF_MAP["H1"]
+        base = await HTF_CANDLES.get(symbol, base_tf, HTF_BASE_DEPTH, until_close=True)
+        if base:
+            out["H1"] = base[-base_limit:]
+            remote_map.pop("H1", None)
+            for k in HTF_DERIVED:
+                try:
+                    rows = _resampled(symbol, k, base)
+                except Exception as e:
+                    logger.warning(f"[resample] {symbol} {k} failed: {e}")
                     continue
-                return []
-            except Exception:
-                return []
-        return []
+                if HTF_RESAMPLE_VERIFY:
+                    remote = await _one(*HTF_MAP[k])
+                    cmp = compare_bars(rows, remote)
+                    RESAMPLE_STATS["verified"] += cmp["checked"]
+                    if cmp["mismatched"]:
+                        RESAMPLE_STATS["mismatch"] += cmp["mismatched"]
+                        logger.warning(f"[resample] {symbol} {k} mismatch {cmp['mismatched']}/{cmp['checked']} "
+                                       f"first={cmp['first_bad']}")
+                        rows = remote
+                out[k] = rows
+                remote_map.pop(k, None)
 
     if HTF_FETCH_PARALLEL:
-        tasks = {k: asyncio.create_task(_one(v[0], v[1])) for k, v in HTF_MAP.items()}
-        out = {}
+        tasks = {k: asyncio.create_task(_one(v[0], v[1])) for k, v in remote_map.items()}
         for k, t in tasks.items():
             try:
                 out[k] = await t
             except Exception:
                 out[k] = []
     else:
-        out = {}
-        for k, v in HTF_MAP.items():
+        for k, v in remote_map.items():
             out[k] = await _one(v[0], v[1])
 
-    return {k: v for k, v in out.items() if v}
+    return {k: out[k] for k in HTF_MAP if out.get(k)}
 
-async def fetch_ticker_price(symbol: str) -> Optional[float]:
-    """
-    يجلب السعر الأخير مع تمرير instType لـ OKX + فولباكات:
-    - fetch_ticker(sym, {"instType": guess}) ثم العكس ثم بدون بارامترات
-    - إن فشل التيكر نأخذ mid من دفتر الأوامر
-    - لوج أدق لسبب الفشل
-    """
-    def _guess_inst_type(sym: str) -> str:
-        return "SWAP" if ":USDT" in (sym or "") else "SPOT"
+async def _fetch_tickers_by_type(mtype: str) -> dict:
+    return await _okx_call("fetch_tickers", None, params={"type": mtype})
 
-    async def _fetch_ticker_any(sym: str) -> Optional[dict]:
-        try:
-            await RATE.wait()
-            loop = asyncio.get_event_loop()
-            return await loop.run_in_executor(
-                None, lambda: exchange.fetch_ticker(sym, params={"instType": _guess_inst_type(sym)})
-            )
-        except Exception:
-            pass
+# لقطة أسعار جماعية (طلب tickers واحد لكل instType) تخدم المراقبة/السبريد/التريلينغ من الذاكرة
+TICKERS = TickerSnapshot(_fetch_tickers_by_type)
+# TP/SL/التريلينغ: لقطة بعمر ≤ هذا فقط؛ الأقدم ⇒ تحديث جماعي واحد للنوع (TICKERS.last_fresh) لا تيكر لكل صفقة
+MONITOR_PRICE_MAX_AGE_SEC = float(os.getenv("MONITOR_PRICE_MAX_AGE_SEC", "2"))
+
+async def _fetch_ticker_routed(sym: str) -> Optional[dict]:
+    """تيكر عبر صيغ جدول التوجيه (الناجحة سابقًا أولاً)؛ BadSymbol في كل الصيغ ⇒ حجر صحي."""
+    bad = 0
+    variants = ROUTES.variants(sym, "ticker")
+    for params in variants:
         try:
-            await RATE.wait()
-            loop = asyncio.get_event_loop()
-            alt = "SPOT" if _guess_inst_type(sym) == "SWAP" else "SWAP"
-            return await loop.run_in_executor(None, lambda: exchange.fetch_ticker(sym, params={"instType": alt}))
+            if params is not None:
+                t = await _okx_call("fetch_ticker", sym, params=params)
+            else:
+                t = await _okx_call("fetch_ticker", sym)
+            ROUTES.remember(sym, "ticker", params)
+            return t
+        except ccxt.BadSymbol:
+            bad += 1
         except Exception:
             pass
+    if bad == len(variants):
+        ROUTES.quarantine(sym)
+    return None
+
+async def _fetch_book_routed(sym: str) -> Optional[tuple[float, float]]:
+    """أفضل (bid, ask) من دفتر أوامر بعمق صغير عبر صيغ جدول التوجيه."""
+    for params in ROUTES.variants(sym, "book"):
         try:
-            await RATE.wait()
-            loop = asyncio.get_event_loop()
-            return await loop.run_in_executor(None, lambda: exchange.fetch_ticker(sym))
+            if params is not None:
+                book = await _okx_call("fetch_order_book", sym, limit=5, params=params)
+            else:
+                book = await _okx_call("fetch_order_book", sym, limit=5)
+            bids = book.get("bids") or []
+            asks = book.get("asks") or []
+            best_bid = float(bids[0][0]) if bids and bids[0] and bids[0][0] is not None else None
+            best_ask = float(asks[0][0]) if asks and asks[0] and asks[0][0] is not None else None
+            if best_bid and best_ask and best_bid > 0 and best_ask > 0:
+                ROUTES.remember(sym, "book", params)
+                return best_bid, best_ask
         except Exception:
-            return None
-
-    async def _fetch_book_mid(sym: str) -> Optional[float]:
-        for params in (
-            {"instType": _guess_inst_type(sym)},
-            {"instType": "SPOT" if _guess_inst_type(sym) == "SWAP" else "SWAP"},
-            None,
-        ):
-            try:
-                await RATE.wait()
-                loop = asyncio.get_event_loop()
-                if params is not None:
-                    book = await loop.run_in_executor(None, lambda: exchange.fetch_order_book(sym, limit=5, params=params))
-                else:
-                    book = await loop.run_in_executor(None, lambda: exchange.fetch_order_book(sym, limit=5))
-                bids = book.get("bids") or []
-                asks = book.get("asks") or []
-                if not bids or not asks or not bids[0] or not asks[0]:
-                    continue
-                best_bid = float(bids[0][0]); best_ask = float(asks[0][0])
-                if best_bid > 0 and best_ask > 0:
-                    return (best_bid + best_ask) / 2.0
-            except Exception:
-                continue
-        return None
+            continue
+    return None
 
+async def fetch_ticker_price(symbol: str, max_age_sec: Optional[float] = None) -> Optional[float]:
+    """
+    يجلب السعر الأخير: لقطة التيكرات أولاً، ثم تيكر فردي عبر صيغ جدول التوجيه،
+    ثم mid من دفتر الأوامر. الرموز المحجورة (BadSymbol) تُتخطّى حتى انتهاء الحجر.
+    """
+    # max_age_sec: أقصى عمر مقبول للقطة (None = TICKER_MAX_AGE_SEC؛ 0 = تيكر حي دائمًا)
     sym_eff = _maybe_adapt_symbol_for_fetch(symbol)
 
+    if max_age_sec is None:
+        snap = TICKERS.last(sym_eff)
+    elif max_age_sec > 0:
+        snap = await TICKERS.last_fresh(sym_eff, max_age_sec)
+    else:
+        snap = None
+    if snap is not None:
+        return snap
+
     for attempt in range(3):
+        if ROUTES.is_quarantined(sym_eff):
+            if sym_eff != symbol:
+                sym_eff = symbol
+                continue
+            return None
         try:
-            ticker = await _fetch_ticker_any(sym_eff)
+            ticker = await _fetch_ticker_routed(sym_eff)
             if ticker:
                 price = (
                     ticker.get("last")
@@ -1006,9 +1123,9 @@ async def fetch_ticker_price(symbol: str) -> Optional[float]:
                 if price is not None:
                     return float(price)
 
-            mid = await _fetch_book_mid(sym_eff)
-            if mid is not None:
-                return float(mid)
+            pair = await _fetch_book_routed(sym_eff)
+            if pair is not None:
+                return float((pair[0] + pair[1]) / 2.0)
 
             if sym_eff != symbol:
                 sym_eff = symbol
@@ -1020,13 +1137,6 @@ async def fetch_ticker_price(symbol: str) -> Optional[float]:
             await asyncio.sleep(0.5 * (attempt + 1) + random.uniform(0.05, 0.2))
             if attempt == 2:
                 logger.warning(f"❌ FETCH_TICKER RATE [{sym_eff}]: {repr(e)}")
-        except ccxt.BadSymbol as e:
-            if sym_eff != symbol:
-                logger.info(f"FETCH_TICKER retry with original after adapt fail: {sym_eff} -> {symbol}")
-                sym_eff = symbol
-                continue
-            logger.warning(f"❌ FETCH_TICKER BadSymbol [{symbol}]: {repr(e)}")
-            return None
         except Exception as e:
             logger.warning(f"❌ FETCH_TICKER ERROR [{sym_eff}] type={type(e).__name__} repr={repr(e)} args={getattr(e,'args',None)}")
             return None
@@ -1036,75 +1146,29 @@ async def fetch_ticker_price(symbol: str) -> Optional[float]:
 async def fetch_spread_pct(symbol: str) -> Optional[float]:
     """
     يعيد (ask - bid) / mid إن توفّر bid/ask.
-    تحسينات:
-    - يمرّر instType إلى OKX: SWAP للرموز التي تحتوي ':USDT' وإلا SPOT.
-    - فولباك ذكي: جرّب عكس النوع (SPOT↔SWAP) ثم بدون بارامترات.
+    - لقطة التيكرات أولاً، ثم تيكر فردي بصيغ جدول التوجيه (instType الصحيح ← العكس ← بدون بارامترات).
     - إن لم تتوفر bid/ask من ticker، نحاول order_book (أفضل عرض/طلب).
     """
-    def _guess_inst_type(sym: str) -> str:
-        return "SWAP" if ":USDT" in (sym or "") else "SPOT"
+    sym_eff = _maybe_adapt_symbol_for_fetch(symbol)
 
-    async def _fetch_ticker_any(sym: str) -> Optional[dict]:
-        # 1) بالـ instType المتوقّع
-        try:
-            await RATE.wait()
-            loop = asyncio.get_event_loop()
-            return await loop.run_in_executor(
-                None, lambda: exchange.fetch_ticker(sym, params={"instType": _guess_inst_type(sym)})
-            )
-        except Exception:
-            pass
-        # 2) عكس النوع
-        try:
-            await RATE.wait()
-            loop = asyncio.get_event_loop()
-            alt = "SPOT" if _guess_inst_type(sym) == "SWAP" else "SWAP"
-            return await loop.run_in_executor(None, lambda: exchange.fetch_ticker(sym, params={"instType": alt}))
-        except Exception:
-            pass
-        # 3) بدون أي بارامترات
-        try:
-            await RATE.wait()
-            loop = asyncio.get_event_loop()
-            return await loop.run_in_executor(None, lambda: exchange.fetch_ticker(sym))
-        except Exception:
-            return None
+    snap = TICKERS.bid_ask(sym_eff)
+    if snap is not None:
+        bid, ask = snap
+        mid = (ask + bid) / 2.0
+        return (ask - bid) / max(mid, 1e-9)
 
-    async def _fetch_book_any(sym: str) -> Optional[tuple[float, float]]:
-        # نحاول بعمق صغير لتقليل الضغط
-        for params in (
-            {"instType": _guess_inst_type(sym)},
-            {"instType": "SPOT" if _guess_inst_type(sym) == "SWAP" else "SWAP"},
-            None,
-        ):
-            try:
-                await RATE.wait()
-                loop = asyncio.get_event_loop()
-                if params is not None:
-                    book = await loop.run_in_executor(None, lambda: exchange.fetch_order_book(sym, limit=5, params=params))
-                else:
-                    book = await loop.run_in_executor(None, lambda: exchange.fetch_order_book(sym, limit=5))
-                bids = book.get("bids") or []
-                asks = book.get("asks") or []
-                best_bid = float(bids[0][0]) if bids and bids[0] and bids[0][0] is not None else None
-                best_ask = float(asks[0][0]) if asks and asks[0] and asks[0][0] is not None else None
-                if best_bid and best_ask and best_bid > 0 and best_ask > 0:
-                    return best_bid, best_ask
-            except Exception:
-                continue
+    if ROUTES.is_quarantined(sym_eff):
         return None
 
-    sym_eff = _maybe_adapt_symbol_for_fetch(symbol)
-
     try:
         # 1) جرّب التيكر مع الفولباكات
-        ticker = await _fetch_ticker_any(sym_eff)
+        ticker = await _fetch_ticker_routed(sym_eff)
         bid = (ticker or {}).get("bid")
         ask = (ticker or {}).get("ask")
 
         # 2) إن كان التيكر غير كافٍ، استخدم دفتر الأوامر
         if bid is None or ask is None or bid <= 0 or ask <= 0:
-            book_pair = await _fetch_book_any(sym_eff)
+            book_pair = await _fetch_book_routed(sym_eff)
             if not book_pair:
                 return None
             bid, ask = book_pair
@@ -1113,26 +1177,6 @@ async def fetch_spread_pct(symbol: str) -> Optional[float]:
         if mid <= 0:
             return None
         return (float(ask) - float(bid)) / max(mid, 1e-9)
-
-    except ccxt.BadSymbol:
-        # محاولة أخيرة بالرمز الأصلي غير المكيّف
-        if sym_eff != symbol:
-            try:
-                ticker = await _fetch_ticker_any(symbol)
-                bid = (ticker or {}).get("bid")
-                ask = (ticker or {}).get("ask")
-                if bid is None or ask is None or bid <= 0 or ask <= 0:
-                    book_pair = await _fetch_book_any(symbol)
-                    if not book_pair:
-                        return None
-                    bid, ask = book_pair
-                mid = (float(ask) + float(bid)) / 2.0
-                if mid <= 0:
-                    return None
-                return (float(ask) - float(bid)) / max(mid, 1e-9)
-            except Exception:
-                return None
-        return None
     except Exception:
         return None
 
@@ -1164,127 +1208,323 @@ SCAN_LOCK = asyncio.Lock()
 async def _send_signal_to_channel(sig: dict, audit_id: Optional[str]) -> None:
     await send_channel(format_signal_text_basic(sig))
 
-async def _scan_one_symbol(sym: str) -> Optional[dict]:
-    data = await fetch_ohlcv(sym)
+LTF_PRECHECK = os.getenv("LTF_PRECHECK", "1") == "1"
+SCAN_STATS = {"pre_rejected": 0, "htf_fetched": 0, "skipped_unchanged": 0, "skipped_after_fetch": 0,
+              "bar_scans": 0, "retry_scans": 0, "carried": 0, "carried_total": 0,
+              "stale_max_sec": 0.0, "stale_p95_sec": 0.0,
+              "batch_cycles": 0, "batch_syms": 0, "batch_ms": 0.0, "batch_used": 0}
+# BATCH_FEATURES=1 (بدون STRATEGY_POOL): LTF للرموز المستحقة يُجلب أولاً ثم تُحسب مؤشرات/بوابات
+# الكون كله في تمريرة مصفوفية واحدة؛ _fetch_stage يأخذ (data, feats) من هنا بدل الجلب
+BATCH_LTF: Dict[str, tuple] = {}
+# آخر شمعة مغلقة (ts) قُيّمت لكل رمز — نفس الشمعة لا تُقيَّم مرتين
+BAR_SEEN: Dict[str, int] = {}
+# آخر وقت وصل فيه الفحص لكل رمز (أو تأكد أنه محدّث) — للترتيب الأقدم أولاً وقياس التقادم
+SCAN_REACHED: Dict[str, float] = {}
+
+def _scan_budget_sec() -> float:
+    if SCAN_CYCLE_BUDGET_SEC > 0:
+        return SCAN_CYCLE_BUDGET_SEC
+    if SCAN_SCHEDULE == "interval":
+        return 0.9 * SIGNAL_SCAN_INTERVAL_SEC
+    return 0.8 * tf_to_ms(TIMEFRAME) / 1000.0
+
+def _staleness(symbols: List[str]) -> Tuple[float, float, int]:
+    """(أقصى، p95) ثواني منذ آخر وصول + عدد الرموز التي لم يُصل إليها إطلاقًا."""
+    now = time.time()
+    ages = sorted(now - SCAN_REACHED[x] for x in symbols if x in SCAN_REACHED)
+    never = len(symbols) - len(ages)
+    if not ages:
+        return 0.0, 0.0, never
+    return ages[-1], ages[min(len(ages) - 1, int(0.95 * len(ages)))], never
+# SCAN_TIERS=1: hot كل شمعة، warm/cold أقل تكرارًا (ترتيب من البيانات المجلوبة أصلاً)
+TIERS: Optional[ScanTiers] = ScanTiers() if SCAN_TIERS else None
+
+def _closed_bar_ts(now_ms: Optional[int] = None) -> int:
+    """بداية آخر شمعة TIMEFRAME مغلقة حسب محاذاة المنصة."""
+    tf_ms = tf_to_ms(TIMEFRAME)
+    off = okx_bar_offset_ms(TIMEFRAME, exchange.bar_of(TIMEFRAME))
+    now_ms = int(time.time() * 1000) if now_ms is None else int(now_ms)
+    cur_open = (now_ms - off) // tf_ms * tf_ms + off
+    return cur_open - tf_ms
+
+def _mark_bar_seen(sym: str, data: list):
+    try:
+        BAR_SEEN[sym] = int(data[-2][0])
+    except Exception:
+        pass
+
+async def _run_strategy(fn, *args, **kwargs):
+    """كل استدعاءات strategy على خيط واحد مخصص: حالتها (holdout/ملف الحالة) عامة وغير آمنة للتوازي،
+    وحسابات pandas لا تحجز حلقة الأحداث عن الجلب."""
+    return await asyncio.get_running_loop().run_in_executor(STRATEGY_EXECUTOR, partial(fn, *args, **kwargs))
+
+async def _batch_prefetch(symbols: List[str], deadline: Optional[float]) -> None:
+    """جلب LTF للدفعة (بنفس توازي عمّال الجلب) + جدول ميزات الكون مرة واحدة على خيط strategy."""
+    sem = asyncio.Semaphore(max(1, SCAN_FETCH_WORKERS))
+
+    async def _one(x: str):
+        async with sem:
+            if deadline is not None and time.monotonic() >= deadline:
+                return x, None, False
+            try:
+                return x, await fetch_ohlcv(x), True
+            except Exception:
+                return x, None, True
+
+    got = await asyncio.gather(*(_one(x) for x in symbols))
+    rows = {x: d for x, d, _ in got if d}
+    t0 = time.perf_counter()
+    feats = await _run_strategy(ltf_batch_features, rows) if rows else {}
+    SCAN_STATS["batch_cycles"] += 1
+    SCAN_STATS["batch_syms"] = len(feats)
+    SCAN_STATS["batch_ms"] = round((time.perf_counter() - t0) * 1000.0, 1)
+    BATCH_LTF.clear()
+    for x, d, fetched in got:
+        if fetched:   # ما قطعته المهلة يُجلب فرديًا إن وصل إليه الخط
+            BATCH_LTF[x] = (d, feats.get(x))
+
+async def _fetch_stage(sym: str) -> Optional[tuple]:
+    SCAN_REACHED[sym] = time.time()
+    hit = BATCH_LTF.pop(sym, None)
+    data, feats = hit if hit is not None else (await fetch_ohlcv(sym), None)
     if not data:
+        if TIERS is not None:
+            TIERS.gate(sym, 0)
         return None
+    if SCAN_SKIP_UNCHANGED and len(data) >= 2 and BAR_SEEN.get(sym) == int(data[-2][0]):
+        # المنصة لم تنشر الشمعة الجديدة بعد — لا حاجة لأي حساب
+        SCAN_STATS["skipped_after_fetch"] += 1
+        return None
+    if TIERS is not None:
+        TIERS.observe(sym, data)
+    # مرحلتان: بوابات LTF الرخيصة أولاً، ولا نجلب HTF إلا للناجين (LTF_PRECHECK=0 للتعطيل)
+    pre = None
+    if LTF_PRECHECK:
+        if STRATEGY_PROCS is not None:
+            passed = await STRATEGY_PROCS.precheck(sym, data)
+        else:
+            pre = await _run_strategy(ltf_precheck, sym, data, feats=feats)
+            passed = pre is not None
+            if feats is not None:
+                SCAN_STATS["batch_used"] += 1
+        if not passed:
+            SCAN_STATS["pre_rejected"] += 1
+            _mark_bar_seen(sym, data)
+            if TIERS is not None:
+                TIERS.gate(sym, 1)
+            return None
+    SCAN_STATS["htf_fetched"] += 1
     htf = await fetch_ohlcv_htf(sym)
-    sig = check_signal(sym, data, htf if htf else None)
-    return sig if sig else None
+    return sym, data, htf, pre
 
-async def scan_and_dispatch():
-    async with AVAILABLE_SYMBOLS_LOCK:
-        symbols_snapshot = list(AVAILABLE_SYMBOLS)
-    if not symbols_snapshot:
-        return
+async def _compute_stage(item: tuple) -> Optional[dict]:
+    sym, data, htf, pre = item
+    if STRATEGY_PROCS is not None:
+        sig = await STRATEGY_PROCS.check_signal(sym, data, htf if htf else None)
+    else:
+        sig = await _run_strategy(check_signal, sym, data, htf if htf else None, pre=pre)
+    _mark_bar_seen(sym, data)
+    if TIERS is not None:
+        TIERS.gate(sym, 3 if sig else 2)
+    return sig if sig else None
 
-    async with SCAN_LOCK:
-        sem = asyncio.Semaphore(MAX_CONCURRENCY)
+async def _dispatch_signal(sig: dict) -> Optional[dict]:
+    # === Extra safety gates BEFORE persisting/sending ===
+    # 1) Strict MTF gate (require full MTF points)
+    try:
+        bd = ((sig.get('features') or {}).get('score_breakdown') or {})
+        mtf_points = float(bd.get('mtf', 0))
+        if STRICT_MTF_GATE and mtf_points < 13:
+            logger.info(f"⛔ MTF_STRICT skip {sig['symbol']} (mtf_points={mtf_points})")
+            return None
+    except Exception:
+        if STRICT_MTF_GATE:
+            return None
 
-        async def _guarded_scan(sym: str) -> Optional[dict]:
-            async with sem:
-                try:
-                    return await _scan_one_symbol(sym)
-                except Exception as e:
-                    logger.warning(f"⚠️ Scan error [{sym}]: {e}")
-                    return None
+    # 2) Spread sanity
+    try:
+        sp = await fetch_spread_pct(sig["symbol"])  # None = can't measure → allow
+        if sp is not None and sp > SPREAD_MAX_PCT:
+            logger.info(f"⛔ Spread>{SPREAD_MAX_PCT:.4f} skip {sig['symbol']} (spread={sp:.4f})")
+            return None
+    except Exception:
+        pass
 
-        for i in range(0, len(symbols_snapshot), SCAN_BATCH_SIZE):
-            batch = symbols_snapshot[i:i + SCAN_BATCH_SIZE]
-            sigs = await asyncio.gather(*[_guarded_scan(s) for s in batch])
+    if _should_skip_duplicate(sig):
+        logger.info(f"⏱️ DEDUPE SKIP {sig['symbol']}")
+        return None
 
-            for sig in filter(None, sigs):
-                # === Extra safety gates BEFORE persisting/sending ===
-                # 1) Strict MTF gate (require full MTF points)
-                try:
-                    bd = ((sig.get('features') or {}).get('score_breakdown') or {})
-                    mtf_points = float(bd.get('mtf', 0))
-                    if STRICT_MTF_GATE and mtf_points < 13:
-                        logger.info(f"⛔ MTF_STRICT skip {sig['symbol']} (mtf_points={mtf_points})")
-                        continue
-                except Exception:
-                    if STRICT_MTF_GATE:
-                        continue
+    with get_session() as s:
+        allowed, reason = can_open_new_trade(s)
+        if not allowed:
+            logger.info(f"❌ SKIP SIGNAL {sig['symbol']}: {reason}")
+            return None
 
-                # 2) Spread sanity
-                try:
-                    sp = await fetch_spread_pct(sig["symbol"])  # None = can't measure → allow
-                    if sp is not None and sp > SPREAD_MAX_PCT:
-                        logger.info(f"⛔ Spread>{SPREAD_MAX_PCT:.4f} skip {sig['symbol']} (spread={sp:.4f})")
-                        continue
-                except Exception:
-                    pass
+        if has_open_trade_on_symbol(s, sig["symbol"]):
+            logger.info(f"🔁 SKIP {sig['symbol']}: already open")
+            return None
 
-                if _should_skip_duplicate(sig):
-                    logger.info(f"⏱️ DEDUPE SKIP {sig['symbol']}")
-                    continue
+        # audit id + fallback-safe entry
+        entry_for_id = sig.get("entry")
+        if entry_for_id is None:
+            try:
+                entry_for_id = (sig.get("entries") or [None])[0]
+            except Exception:
+                entry_for_id = None
 
-                with get_session() as s:
-                    allowed, reason = can_open_new_trade(s)
-                    if not allowed:
-                        logger.info(f"❌ SKIP SIGNAL {sig['symbol']}: {reason}")
-                        continue
+        audit_id = _make_audit_id(sig["symbol"], entry_for_id or 0.0, sig.get("score", 0))
 
-                    if has_open_trade_on_symbol(s, sig["symbol"]):
-                        logger.info(f"🔁 SKIP {sig['symbol']}: already open")
-                        continue
+        try:
+            trade_id = add_trade_sig(s, sig, audit_id=audit_id, qty=None)
+        except Exception as e:
+            logger.exception(f"⚠️ add_trade_sig failed, fallback: {e}")
+            # fallback: احفظ صفقة أساسية بأقل الحقول
+            trade_id = add_trade(
+                s,
+                sig["symbol"], sig.get("side", "buy"),
+                entry_for_id or 0.0,
+                sig.get("sl", 0.0),
+                sig.get("tp1", 0.0), sig.get("tp2", 0.0)
+            )
 
-                    # audit id + fallback-safe entry
-                    entry_for_id = sig.get("entry")
-                    if entry_for_id is None:
-                        try:
-                            entry_for_id = (sig.get("entries") or [None])[0]
-                        except Exception:
-                            entry_for_id = None
+        AUDIT_IDS[trade_id] = audit_id
 
-                    audit_id = _make_audit_id(sig["symbol"], entry_for_id or 0.0, sig.get("score", 0))
+        if sig.get("messages"):
+            try:
+                MESSAGES_CACHE[trade_id] = dict(sig["messages"])
+            except Exception:
+                pass
 
-                    try:
-                        trade_id = add_trade_sig(s, sig, audit_id=audit_id, qty=None)
-                    except Exception as e:
-                        logger.exception(f"⚠️ add_trade_sig failed, fallback: {e}")
-                        # fallback: احفظ صفقة أساسية بأقل الحقول
-                        trade_id = add_trade(
-                            s,
-                            sig["symbol"], sig.get("side", "buy"),
-                            entry_for_id or 0.0,
-                            sig.get("sl", 0.0),
-                            sig.get("tp1", 0.0), sig.get("tp2", 0.0)
-                        )
+        try:
+            await _send_signal_to_channel(sig, audit_id)
 
-                    AUDIT_IDS[trade_id] = audit_id
+            entry_msg = (sig.get("messages") or {}).get("entry")
+            if entry_msg:
+                await notify_subscribers(entry_msg)
 
-                    if sig.get("messages"):
-                        try:
-                            MESSAGES_CACHE[trade_id] = dict(sig["messages"])
-                        except Exception:
-                            pass
+            note = (
+                "🚀 <b>إشارة جديدة وصلت!</b>\n"
+                "🔔 الهدوء أفضل من مطاردة الشمعة — التزم بالخطة."
+            )
+            for uid in list_active_user_ids():
+                try:
+                    await bot.send_message(uid, note, parse_mode="HTML", disable_web_page_preview=True)
+                    await asyncio.sleep(0.02)
+                except Exception:
+                    pass
 
-                    try:
-                        await _send_signal_to_channel(sig, audit_id)
+            logger.info(f"✅ SIGNAL SENT: {sig['symbol']} audit={audit_id}")
+            return sig
+        except Exception as e:
+            logger.exception(f"❌ SEND SIGNAL ERROR: {e}")
+            return None
 
-                        entry_msg = (sig.get("messages") or {}).get("entry")
-                        if entry_msg:
-                            await notify_subscribers(entry_msg)
+# ---------------------------
+# Sharding (SHARD_MODE=1): كل عامل يفحص نطاق هاش من الرموز؛ القائد وحده يرسل
+# ---------------------------
 
-                        note = (
-                            "🚀 <b>إشارة جديدة وصلت!</b>\n"
-                            "🔔 الهدوء أفضل من مطاردة الشمعة — التزم بالخطة."
-                        )
-                        for uid in list_active_user_ids():
-                            try:
-                                await bot.send_message(uid, note, parse_mode="HTML", disable_web_page_preview=True)
-                                await asyncio.sleep(0.02)
-                            except Exception:
-                                pass
+WORKER_ID = f"{os.getenv('SERVICE_NAME', 'svc')}:{os.getpid()}"
+SHARDS: Optional[ShardCoordinator] = ShardCoordinator(WORKER_ID) if SHARD_MODE else None
+IS_LEADER = not SHARD_MODE   # بدون تقسيم: العملية الوحيدة هي القائد (بعد قفل القائد في main)
+DISPATCH_LOCK = asyncio.Lock()
+SHARD_STATS = {"outboxed": 0, "drained": 0}
 
-                        logger.info(f"✅ SIGNAL SENT: {sig['symbol']} audit={audit_id}")
-                    except Exception as e:
-                        logger.exception(f"❌ SEND SIGNAL ERROR: {e}")
+def _json_default(o):
+    try:
+        return float(o)
+    except Exception:
+        return str(o)
+
+async def _dispatch_stage(sig: dict) -> Optional[dict]:
+    if not IS_LEADER:
+        # عامل فحص فقط: الإشارة إلى signal_outbox ليرسلها القائد (spread/dedupe/DB/بث هناك)
+        payload = json.dumps(sig, default=_json_default)
+        await asyncio.to_thread(outbox_put, sig["symbol"], payload, WORKER_ID)
+        SHARD_STATS["outboxed"] += 1
+        logger.info(f"📮 OUTBOX {sig['symbol']} → leader")
+        return sig
+    async with DISPATCH_LOCK:
+        return await _dispatch_signal(sig)
+
+async def drain_signal_outbox():
+    n = 0
+    while True:
+        try:
+            rows = await asyncio.to_thread(outbox_take, 20)
+            for rid, payload, wid in rows:
+                try:
+                    sig = json.loads(payload)
+                except Exception:
+                    continue
+                SHARD_STATS["drained"] += 1
+                logger.info(f"📬 OUTBOX #{rid} {sig.get('symbol')} from {wid}")
+                async with DISPATCH_LOCK:
+                    await _dispatch_signal(sig)
+            n += 1
+            if n % 1800 == 0:
+                await asyncio.to_thread(outbox_prune, 7)
+        except Exception as e:
+            logger.warning(f"⚠️ outbox drain error: {e}")
+        await asyncio.sleep(SHARD_OUTBOX_POLL_SEC)
+
+SCAN_PIPELINE = Pipeline([
+    Stage("fetch", _fetch_stage, workers=SCAN_FETCH_WORKERS, queue_size=SCAN_QUEUE_SIZE),
+    Stage("compute", _compute_stage, workers=STRATEGY_PROCS.workers if STRATEGY_PROCS else 1,
+          queue_size=SCAN_QUEUE_SIZE),
+    Stage("dispatch", _dispatch_stage, workers=1, queue_size=SCAN_QUEUE_SIZE),
+])
+
+async def scan_and_dispatch() -> int:
+    """يفحص الرموز ويعيد عدد الرموز التي لم تُقيَّم شمعتها المغلقة الأخيرة بعد."""
+    async with AVAILABLE_SYMBOLS_LOCK:
+        symbols_snapshot = list(AVAILABLE_SYMBOLS)
+    if SHARDS is not None:
+        symbols_snapshot = SHARDS.filter(symbols_snapshot)
+    universe = symbols_snapshot
+    expected = _closed_bar_ts()
+    if TIERS is not None:
+        # hot كل شمعة؛ warm/cold حسب دورها في هذه الشمعة
+        symbols_snapshot = TIERS.due(symbols_snapshot, expected // tf_to_ms(TIMEFRAME))
+    if SCAN_SKIP_UNCHANGED:
+        # قبل أي جلب: ما قُيّمت شمعته المغلقة الحالية يُتخطى
+        fresh = [x for x in symbols_snapshot if BAR_SEEN.get(x, 0) >= expected]
+        now = time.time()
+        for x in fresh:
+            SCAN_REACHED[x] = now
+        symbols_snapshot = [x for x in symbols_snapshot if BAR_SEEN.get(x, 0) < expected]
+        SCAN_STATS["skipped_unchanged"] += len(fresh)
+    if not symbols_snapshot:
+        return 0
 
-            await asyncio.sleep(0.1)
+    async with SCAN_LOCK:
+        # الأقدم وصولاً أولاً: ما قطعته مهلة الدورة السابقة يتصدر هذه الدورة (لا رمز يُجوَّع)
+        symbols_snapshot.sort(key=lambda x: SCAN_REACHED.get(x, 0.0))
+        # fetch → compute → dispatch بطوابير محدودة: الشبكة والحساب يتداخلان،
+        # والرمز البطيء يشغل عامل جلب واحدًا فقط بدل تعطيل دفعة كاملة
+        budget = _scan_budget_sec()
+        deadline = time.monotonic() + budget if budget > 0 else None
+        if BATCH_FEATURES and LTF_PRECHECK and STRATEGY_PROCS is None:
+            await _batch_prefetch(symbols_snapshot, deadline)
+        try:
+            snap = await SCAN_PIPELINE.run(symbols_snapshot, deadline=deadline)
+        finally:
+            BATCH_LTF.clear()
+        if STRATEGY_PROFILE.on:
+            STRATEGY_PROFILE.cycle()
+        SCAN_STATS["carried"] = snap["unfed"]
+        SCAN_STATS["carried_total"] += snap["unfed"]
+        st_max, st_p95, never = _staleness(universe)
+        SCAN_STATS["stale_max_sec"], SCAN_STATS["stale_p95_sec"] = round(st_max, 1), round(st_p95, 1)
+        logger.info(
+            f"🔎 scan done: {snap['items']} symbols in {snap['elapsed_sec']:.1f}s | "
+            f"fetched={snap['fetch']['out']} computed={snap['compute']['in']} "
+            f"signals={snap['compute']['out']} sent={snap['dispatch']['out']}"
+            + (f" | ⏱️ budget {budget:.0f}s hit, carried={snap['unfed']}" if snap["unfed"] else "")
+            + f" | stale max={st_max:.0f}s p95={st_p95:.0f}s" + (f" never={never}" if never else "")
+        )
+    return sum(1 for x in symbols_snapshot if BAR_SEEN.get(x, 0) < expected)
 
-async def loop_signals():
+async def _loop_signals_interval():
     while True:
         started = time.time()
         try:
@@ -1294,6 +1534,43 @@ async def loop_signals():
         elapsed = time.time() - started
         await asyncio.sleep(max(1.0, SIGNAL_SCAN_INTERVAL_SEC - elapsed))
 
+async def _loop_signals_bar():
+    tf_ms = tf_to_ms(TIMEFRAME)
+    last_bar = _closed_bar_ts()
+    while True:
+        bar = _closed_bar_ts()
+        if bar == last_bar:
+            # انتظر إغلاق الشمعة التالية + مهلة نشر المنصة
+            wait = (bar + 2 * tf_ms) / 1000.0 + SCAN_BAR_CLOSE_DELAY_SEC - time.time()
+            await asyncio.sleep(max(0.5, wait))
+            continue
+        # فحص تجاوز إغلاقًا (أطول من شمعة) ⇒ نفحص فورًا بدل تفويت الشمعة
+        last_bar = bar
+        try:
+            SCAN_STATS["bar_scans"] += 1
+            lagging = await scan_and_dispatch()
+            for _ in range(SCAN_BAR_RETRIES):
+                if not lagging:
+                    break
+                await asyncio.sleep(SCAN_BAR_RETRY_SEC)
+                SCAN_STATS["retry_scans"] += 1
+                lagging = await scan_and_dispatch()
+            if lagging:
+                logger.info(f"⏳ {lagging} symbols still without the new {TIMEFRAME} bar after retries")
+        except Exception as e:
+            logger.exception(f"🔥 SCAN_LOOP ERROR: {e}")
+
+async def loop_signals():
+    if SCAN_SCHEDULE == "interval":
+        await _loop_signals_interval()
+    else:
+        # أول فحص فورًا ثم متزامن مع إغلاق الشموع
+        try:
+            await scan_and_dispatch()
+        except Exception as e:
+            logger.exception(f"🔥 SCAN_LOOP ERROR: {e}")
+        await _loop_signals_bar()
+
 # ---------------------------
 # Monitor open trades (multi-target + dynamic stop + time exit)
 # ---------------------------
@@ -1420,7 +1697,7 @@ async def _calc_trailing_stop_if_any(t: Trade, last_hit_idx: int) -> Optional[fl
         if not math.isfinite(atr) or atr <= 0:
             return None
 
-        price = await fetch_ticker_price(t.symbol)
+        price = await fetch_ticker_price(t.symbol, max_age_sec=MONITOR_PRICE_MAX_AGE_SEC)
         if price is None:
             return None
         price = float(price)
@@ -1449,7 +1726,7 @@ async def monitor_open_trades():
             with get_session() as s:
                 open_trades = s.query(Trade).filter(Trade.status == "open").all()
                 for t in open_trades:
-                    price = await fetch_ticker_price(t.symbol)
+                    price = await fetch_ticker_price(t.symbol, max_age_sec=MONITOR_PRICE_MAX_AGE_SEC)
                     if price is None:
                         continue
                     price = float(price)
@@ -1704,18 +1981,15 @@ def _report_card(stats_24: dict, stats_7: dict) -> str:
     except Exception:
         part2 = ""
 
-    # “منذ آخر إشارة” + مستوى Auto-Relax (من strategy_state.json)
+    # “منذ آخر إشارة” + مستوى Auto-Relax (حالة strategy في الذاكرة — الملف يُكتب متأخرًا)
     try:
-        st_path = os.getenv("STRATEGY_STATE_FILE", "strategy_state.json")
-        if Path(st_path).exists():
-            st = json.loads(Path(st_path).read_text(encoding="utf-8") or "{}")
-            last_ts = _safe_float(st.get("last_signal_ts", 0))
-            if last_ts > 0:
-                hours = max(0.0, (time.time() - last_ts) / 3600.0)
-                h1 = _safe_int(os.getenv("AUTO_RELAX_AFTER_HRS_1", "6"), 6)
-                h2 = _safe_int(os.getenv("AUTO_RELAX_AFTER_HRS_2", "12"), 12)
-                lvl = 2 if hours >= h2 else (1 if hours >= h1 else 0)
-                part2 += f"\n⏳ منذ آخر إشارة: <b>{hours:.1f} ساعة</b> | Auto-Relax: <b>L{lvl}</b>"
+        last_ts = _safe_float(STRATEGY_STATE.data.get("last_signal_ts", 0))
+        if last_ts > 0:
+            hours = max(0.0, (time.time() - last_ts) / 3600.0)
+            h1 = _safe_int(os.getenv("AUTO_RELAX_AFTER_HRS_1", "6"), 6)
+            h2 = _safe_int(os.getenv("AUTO_RELAX_AFTER_HRS_2", "12"), 12)
+            lvl = 2 if hours >= h2 else (1 if hours >= h1 else 0)
+            part2 += f"\n⏳ منذ آخر إشارة: <b>{hours:.1f} ساعة</b> | Auto-Relax: <b>L{lvl}</b>"
     except Exception:
         pass
 
@@ -2219,6 +2493,9 @@ async def cmd_admin_help(m: Message):
             "• <code>/refstats &lt;user_id&gt;</code>\n"
             "• <code>/debug_sig SYMBOL</code>\n"
             "• <code>/relax_status</code>\n"
+            "• <code>/data_stats</code> – كاش الشموع (LTF/HTF)\n"
+            "• <code>/funnel [pre]</code> – قمع الرفض لكل بوابة\n"
+            "• <code>/profile [on|off|total|reset]</code> – زمن كل بوابة في الاستراتيجية\n"
         )
     await m.answer(txt, parse_mode="HTML")
 
@@ -2453,7 +2730,10 @@ async def cmd_debug_sig(m: Message, command: CommandObject):
         if not data:
             return await m.answer("لم أستطع جلب OHLCV.")
         htf = await fetch_ohlcv_htf(sym)
-        sig = check_signal(sym, data, htf if htf else None)
+        if STRATEGY_PROCS is not None:
+            sig = await STRATEGY_PROCS.check_signal(sym, data, htf if htf else None)
+        else:
+            sig = await _run_strategy(check_signal, sym, data, htf if htf else None)
         if sig:
             txt = format_signal_text_basic(sig)
             return await m.answer("✅ إشارة متاحة:\n\n" + txt, parse_mode="HTML", disable_web_page_preview=True)
@@ -2479,8 +2759,7 @@ async def cmd_relax(m: Message):
     if m.from_user.id not in ADMIN_USER_IDS:
         return
     try:
-        st_path = os.getenv("STRATEGY_STATE_FILE", "strategy_state.json")
-        last_ts = (json.loads(Path(st_path).read_text(encoding="utf-8")).get("last_signal_ts") or 0)
+        last_ts = (STRATEGY_STATE.data.get("last_signal_ts") or 0)
         h1 = int(os.getenv("AUTO_RELAX_AFTER_HRS_1", "24"))
         h2 = int(os.getenv("AUTO_RELAX_AFTER_HRS_2", "48"))
         hours = 1e9 if not last_ts else max(0, (time.time() - float(last_ts)) / 3600.0)
@@ -2489,6 +2768,158 @@ async def cmd_relax(m: Message):
     except Exception as e:
         await m.answer(f"تعذر قراءة الحالة: {e}")
 
+@dp.message(Command("funnel"))
+async def cmd_funnel(m: Message):
+    if m.from_user.id not in ADMIN_USER_IDS:
+        return
+    try:
+        args = (m.text or "").split()
+        phase = "pre" if len(args) > 1 and args[1].lower().startswith("pre") else "check"
+        snap = STRATEGY_REJECTS.snapshot()
+        rows = STRATEGY_REJECTS.funnel(phase)
+        txt = (f"🔻 <b>Funnel ({phase})</b> {snap['day']} UTC\n"
+               f"evaluated={snap['evaluated'][phase]} passed={snap['passed'][phase]} "
+               f"log_dropped={snap['log_dropped']}")
+        for r in rows:
+            txt += (f"\n• <b>{r['stage']}</b> in={r['entered']} ✗{r['rejected']} "
+                    f"pass={r['pass_pct']}% share={r['share_pct']}%")
+            if r["mode"]:
+                lo, hi = r["mode"]
+                txt += f" | mode [{'-∞' if lo is None else f'{lo:g}'}, {'∞' if hi is None else f'{hi:g}'})"
+            if r["top"]:
+                txt += " | " + ", ".join(f"{_h(k)}×{n}" for k, n in r["top"])
+        if not rows:
+            txt += "\nلا رفض مسجّل اليوم."
+        # بوابات السلسلة يتغير ترتيبها (rate/cost) ⇒ نسبتها الدقيقة من عدّاداتها هي
+        ch = (PRE_GATES if phase == "pre" else CHECK_GATES).snapshot()
+        txt += f"\n⚙️ <b>gate order</b> ({'adaptive' if ch['adaptive'] else 'static'}, reorders={ch['reorders']}): "
+        txt += " → ".join(f"{g} {ch['gates'][g]['rate']*100:.0f}%/{ch['gates'][g]['avg_us']:.0f}µs"
+                          + (f"+{ch['gates'][g]['lazy_us']:.0f}µs mtf" if ch['gates'][g]['lazy_us'] >= 1 else "")
+                          for g in ch["order"])
+        await m.answer(txt, parse_mode="HTML")
+    except Exception as e:
+        await m.answer(f"تعذر قراءة القمع: {e}")
+
+@dp.message(Command("profile"))
+async def cmd_profile(m: Message):
+    if m.from_user.id not in ADMIN_USER_IDS:
+        return
+    args = (m.text or "").split()
+    arg = args[1].lower() if len(args) > 1 else ""
+    if arg in ("on", "off"):
+        if arg == "on" and not STRATEGY_PROFILE.wrapped:
+            await m.answer("⏱️ Gate profiler: غير مركّب — شغّل البوت بـ STRATEGY_PROFILE=1 (المسار المعطّل بلا غلاف)")
+            return
+        STRATEGY_PROFILE.on = (arg == "on")
+        await m.answer(f"⏱️ Gate profiler: {'ON' if STRATEGY_PROFILE.on else 'OFF'}")
+        return
+    if arg == "reset":
+        STRATEGY_PROFILE.reset()
+        await m.answer("⏱️ Gate profiler: reset")
+        return
+    try:
+        if arg == "total":
+            title, rows = "cumulative", STRATEGY_PROFILE.cumulative()
+        else:
+            last = STRATEGY_PROFILE.last()
+            title = (f"last cycle {datetime.utcfromtimestamp(last['ts']).strftime('%H:%M:%S')} UTC ({last['sec']}s)"
+                     if last else "current cycle")
+            rows = last["stages"] if last else STRATEGY_PROFILE.rows(STRATEGY_PROFILE.cur)
+        txt = f"⏱️ <b>Gate profiler</b> {'ON' if STRATEGY_PROFILE.on else 'OFF'} | {title}"
+        for phase in ("pre", "check"):
+            ph = sorted((r for r in rows if r["phase"] == phase), key=lambda r: -r["ms"])
+            if not ph:
+                continue
+            txt += f"\n<b>{phase}</b>"
+            for r in ph:
+                txt += (f"\n• {r['stage']}: n={r['calls']} ✓{r['pass']} ✗{r['fail']} "
+                        f"{r['ms']:.0f}ms avg={r['avg_us']:.0f}µs max={r['max_ms']:.1f}ms")
+        if not rows:
+            txt += "\nلا قياسات بعد" + ("" if STRATEGY_PROFILE.on else
+                                        " — فعّله بـ /profile on" if STRATEGY_PROFILE.wrapped else
+                                        " — يتطلب STRATEGY_PROFILE=1 عند الإقلاع")
+        await m.answer(txt, parse_mode="HTML")
+    except Exception as e:
+        await m.answer(f"تعذر قراءة البروفايلر: {e}")
+
+@dp.message(Command("data_stats"))
+async def cmd_data_stats(m: Message):
+    if m.from_user.id not in ADMIN_USER_IDS:
+        return
+    def _fmt(name: str, store: CandleStore) -> str:
+        st = store.stats
+        return (f"<b>{name}</b> keys={len(store)} | hit={st['hit']} miss={st['miss']} "
+                f"({store.hit_rate()*100:.0f}%)\n"
+                f"full={st['full']} delta={st['delta']} resync={st['resync']} "
+                f"bars={st['bars_fetched']} err={st['errors']}")
+    txt = (
+        "📦 <b>Data cache</b>\n"
+        f"{_fmt('LTF ' + TIMEFRAME, CANDLES)}{'' if CANDLE_CACHE else ' (off)'}\n"
+        f"{_fmt('HTF', HTF_CANDLES)}{'' if HTF_CACHE else ' (off)'}\n"
+        f"<b>Tickers</b> symbols={len(TICKERS)} | hit={TICKERS.stats['hit']} miss={TICKERS.stats['miss']} "
+        f"bulk={TICKERS.stats['refresh']} err={TICKERS.stats['errors']}\n"
+        f"<b>Single-flight</b> calls={OKX_FLIGHTS.stats['calls']} shared={OKX_FLIGHTS.stats['shared']} "
+        f"cached={OKX_FLIGHTS.stats['cached']}"
+    )
+    lines = []
+    for fam, st in RATE.snapshot().items():
+        if not st["acquired"]:
+            continue
+        lines.append(f"• {fam}: {st['rate']}/s x{st['factor']} q={st['queue']}/{st['queue_max']} "
+                     f"wait avg={st['wait_avg_ms']}ms max={st['wait_max_ms']}ms 429={st['penalties']}")
+    if lines:
+        txt += "\n⏱️ <b>Rate limiter</b>\n" + "\n".join(lines)
+    txt += (f"\n🕯️ <b>Scheduler</b> {SCAN_SCHEDULE} bar_scans={SCAN_STATS['bar_scans']} "
+            f"retries={SCAN_STATS['retry_scans']} skip_unchanged={SCAN_STATS['skipped_unchanged']} "
+            f"skip_after_fetch={SCAN_STATS['skipped_after_fetch']}\n"
+            f"• budget={_scan_budget_sec():.0f}s carried(last/total)={SCAN_STATS['carried']}/"
+            f"{SCAN_STATS['carried_total']} stale max={SCAN_STATS['stale_max_sec']}s "
+            f"p95={SCAN_STATS['stale_p95_sec']}s")
+    if TIERS is not None:
+        tv = TIERS.snapshot()
+        txt += (f"\n🔥 <b>Tiers</b> hot={tv['hot']} warm={tv['warm']} cold={tv['cold']} "
+                f"due={tv['due']} deferred={tv['deferred']} | top: {', '.join(tv['top_hot']) or '—'}")
+    if LTF_PRECHECK:
+        txt += (f"\n🧮 <b>LTF precheck</b> rejected={SCAN_STATS['pre_rejected']} "
+                f"htf_fetched={SCAN_STATS['htf_fetched']}")
+        if BATCH_FEATURES and STRATEGY_PROCS is None:
+            txt += (f"\n• batch: cycles={SCAN_STATS['batch_cycles']} last={SCAN_STATS['batch_syms']} symbols "
+                    f"in {SCAN_STATS['batch_ms']}ms used={SCAN_STATS['batch_used']}")
+    if PIVOT_INDEX and STRATEGY_PROCS is None:
+        pv = PIVOT_INDEXES.snapshot()
+        txt += (f"\n📍 <b>Pivot index</b> keys={pv['keys']} stepped={pv['stepped']} same_bar={pv['same_bar']} "
+                f"full={pv['full']} mismatch={pv['mismatch']} evicted={pv['evicted']}")
+    if STRATEGY_PROCS is not None:
+        sp = STRATEGY_PROCS.snapshot()
+        txt += (f"\n🧠 <b>Strategy pool</b> x{sp['workers']} pre={sp['pre']} check={sp['check']} "
+                f"signals={sp['signals']} cpu={sp['cpu_sec']}s err={sp['errors']}")
+    if SHARDS is not None:
+        sh = SHARDS.snapshot()
+        try:
+            pending = await asyncio.to_thread(outbox_pending_count)
+        except Exception:
+            pending = "?"
+        txt += (f"\n🧩 <b>Shards</b> {sh['worker_id']} {'👑' if IS_LEADER else ''} workers={sh['workers']} "
+                f"share={sh['share_pct']}% owned={sh['owned']} rebalances={sh['rebalances']} "
+                f"hb_err={sh['errors']}\n• outbox: sent_to={SHARD_STATS['outboxed']} "
+                f"drained={SHARD_STATS['drained']} pending={pending}")
+    ps = SCAN_PIPELINE.snapshot()
+    if ps["items"]:
+        txt += f"\n🧵 <b>Scan pipeline</b> last={ps['items']} symbols in {ps['elapsed_sec']}s"
+        for name in ("fetch", "compute", "dispatch"):
+            st = ps[name]
+            txt += (f"\n• {name} x{st['workers']}: in={st['in']} out={st['out']} err={st['errors']} "
+                    f"busy={st['busy_sec']}s q_max={st['queue_max']}")
+    if HTF_DERIVED:
+        rs = RESAMPLE_STATS
+        txt += (f"\n🔁 <b>Resample</b> {'+'.join(HTF_DERIVED)} ← H1 x{HTF_BASE_DEPTH} | built={rs['built']} "
+                f"memo={rs['memo']} verified={rs['verified']} mismatch={rs['mismatch']}")
+    q = ROUTES.quarantined()
+    txt += f"\n🧭 <b>Routes</b> markets={len(ROUTES)} v{ROUTES.version} | quarantined={len(q)}"
+    if q:
+        txt += ": " + ", ".join(sorted(q)[:10])
+    await m.answer(txt, parse_mode="HTML")
+
 # ---------------------------
 # Startup checks & polling
 # ---------------------------
@@ -2530,6 +2961,10 @@ async def resilient_polling():
 
 async def main():
     init_db()
+    if STRATEGY_PROCS is not None:
+        # fork العمّال قبل أي خيوط/مهام
+        STRATEGY_PROCS.start()
+        logger.info(f"🧠 Strategy pool started: {STRATEGY_PROCS.workers} processes")
     hb_task = None
     holder = f"{os.getenv('SERVICE_NAME', 'svc')}:{os.getpid()}"
 
@@ -2572,60 +3007,110 @@ async def main():
             except Exception:
                 ENABLE_DB_LOCK = False
 
+    global IS_LEADER
+
+    async def _leader_heartbeat_task(name: str, holder: str):
+        while True:
+            try:
+                ok = heartbeat_leader_lock(name, holder)
+                if not ok:
+                    logger.error("Leader lock lost! Exiting worker loop.")
+                    os._exit(1)
+            except Exception as e:
+                logger.warning(f"Heartbeat error: {e}")
+            await asyncio.sleep(max(10, LEADER_TTL // 2))
+
     if ENABLE_DB_LOCK and acquire_or_steal_leader_lock:
         got = False
-        for attempt in range(20):
-            ok = acquire_or_steal_leader_lock(LEADER_LOCK_NAME, holder, ttl_seconds=LEADER_TTL)
-            if ok:
-                got = True; break
-            wait_s = 15
-            logger.error(f"Another instance holds the leader DB lock. Retrying in {wait_s}s… (try {attempt+1})")
-            await asyncio.sleep(wait_s)
-        if not got:
-            logger.error("Timeout waiting for leader lock. Exiting.")
-            return
-
-        async def _leader_heartbeat_task(name: str, holder: str):
-            while True:
-                try:
-                    ok = heartbeat_leader_lock(name, holder)
-                    if not ok:
-                        logger.error("Leader lock lost! Exiting worker loop.")
-                        os._exit(1)
-                except Exception as e:
-                    logger.warning(f"Heartbeat error: {e}")
-                await asyncio.sleep(max(10, LEADER_TTL // 2))
-        hb_task = asyncio.create_task(_leader_heartbeat_task(LEADER_LOCK_NAME, holder))
+        if SHARD_MODE:
+            # وضع التقسيم: لا ننتظر القفل — غير القائد يفحص نطاقه ويبقى احتياطيًا للقيادة
+            got = acquire_or_steal_leader_lock(LEADER_LOCK_NAME, holder, ttl_seconds=LEADER_TTL)
+            IS_LEADER = got
+            logger.info(f"🧩 Shard worker {WORKER_ID} started as {'LEADER' if got else 'scanner (standby)'}")
+        else:
+            for attempt in range(20):
+                ok = acquire_or_steal_leader_lock(LEADER_LOCK_NAME, holder, ttl_seconds=LEADER_TTL)
+                if ok:
+                    got = True; break
+                wait_s = 15
+                logger.error(f"Another instance holds the leader DB lock. Retrying in {wait_s}s… (try {attempt+1})")
+                await asyncio.sleep(wait_s)
+            if not got:
+                logger.error("Timeout waiting for leader lock. Exiting.")
+                return
+
+        if got:
+            hb_task = asyncio.create_task(_leader_heartbeat_task(LEADER_LOCK_NAME, holder))
+    elif SHARD_MODE:
+        IS_LEADER = True
+        logger.warning("SHARD_MODE without DB leader lock → this worker acts as leader")
 
     # ✅ تحميل أسواق OKX عبر اللودر الآمن ثم تهيئة AVAILABLE_SYMBOLS
     await load_okx_markets_and_filter()
 
+    # ✅ شموع محفوظة من التشغيل السابق — أول فحص يحتاج الفروقات فقط
+    load_persisted_candles()
+
     # بناء أولي بالقائمة الحالية من symbols.py (مع الميتا) — يستخدم تكييف السواب داخليًا
     try:
         await rebuild_available_symbols((SYMBOLS, getattr(symbols_mod, "SYMBOLS_META", {}) or {}))
     except Exception as e:
         logger.warning(f"init rebuild_available_symbols warn: {e}")
 
-    # حذف أي Webhook سابق قبل polling
-    try:
-        await bot.delete_webhook(drop_pending_updates=True)
-        logger.info("Webhook deleted; starting polling.")
-    except Exception as e:
-        logger.warning(f"DELETE_WEBHOOK WARN: {e}")
+    async def _leader_prelude():
+        # حذف أي Webhook سابق قبل polling
+        try:
+            await bot.delete_webhook(drop_pending_updates=True)
+            logger.info("Webhook deleted; starting polling.")
+        except Exception as e:
+            logger.warning(f"DELETE_WEBHOOK WARN: {e}")
+
+        await check_channel_and_admin_dm()
+
+    async def _leader_role():
+        # مهام القائد فقط: Telegram + المراقبة + التقارير (+ تفريغ صندوق الإشارات في وضع التقسيم)
+        jobs = [resilient_polling(), daily_report_loop(), monitor_open_trades(),
+                kick_expired_members_loop(), notify_trial_expiring_soon_loop()]
+        if SHARD_MODE:
+            jobs.append(drain_signal_outbox())
+        await asyncio.gather(*jobs)
+
+    async def _standby_until_leader():
+        global IS_LEADER
+        nonlocal hb_task
+        while True:
+            await asyncio.sleep(max(10, LEADER_TTL // 4))
+            try:
+                if acquire_or_steal_leader_lock(LEADER_LOCK_NAME, holder, ttl_seconds=LEADER_TTL):
+                    break
+            except Exception as e:
+                logger.warning(f"leader acquire warn: {e}")
+        IS_LEADER = True
+        logger.info(f"👑 {WORKER_ID} promoted to LEADER")
+        hb_task = asyncio.create_task(_leader_heartbeat_task(LEADER_LOCK_NAME, holder))
+        if SHARDS is not None:
+            await SHARDS.sync(True)
+        await _leader_prelude()
+        await _leader_role()
+
+    if IS_LEADER:
+        await _leader_prelude()
 
-    await check_channel_and_admin_dm()
+    if SHARDS is not None:
+        await SHARDS.sync(IS_LEADER)
 
     # مهام الخلفية
-    t1 = asyncio.create_task(resilient_polling())
+    t1 = asyncio.create_task(_leader_role() if IS_LEADER else _standby_until_leader())
     t2 = asyncio.create_task(loop_signals())
-    t3 = asyncio.create_task(daily_report_loop())
-    t4 = asyncio.create_task(monitor_open_trades())
-    t5 = asyncio.create_task(kick_expired_members_loop())
-    t6 = asyncio.create_task(notify_trial_expiring_soon_loop())
     t_symbols = asyncio.create_task(refresh_symbols_periodically())  # NEW: تحديث الرموز كل 4 ساعات
+    t_tickers = asyncio.create_task(TICKERS.run())
+    t_candles = asyncio.create_task(persist_candles_loop())
+    tasks = [t1, t2, t_symbols, t_tickers, t_candles]
+    if SHARDS is not None:
+        tasks.append(asyncio.create_task(SHARDS.run(lambda: IS_LEADER)))
 
     try:
-        await asyncio.gather(t1, t2, t3, t4, t5, t6, t_symbols)
+        await asyncio.gather(*tasks)
     except TelegramConflictError:
         logger.error("❌ Conflict: يبدو أن نسخة أخرى من البوت تعمل وتستخدم getUpdates. أوقف النسخة الأخرى أو غيّر التوكن.")
         return
@@ -2645,6 +3130,20 @@ async def main():
                 pass
         if hb_task:
             hb_task.cancel()
+        if SHARDS is not None:
+            await SHARDS.leave()
+        try:
+            await flush_persisted_candles()
+        except Exception:
+            pass
+        try:
+            await exchange.close()
+        except Exception:
+            pass
+        STRATEGY_EXECUTOR.shutdown(wait=False)
+        if STRATEGY_PROCS is not None:
+            STRATEGY_PROCS.close()
+        STRATEGY_STATE.flush()   # atexit يغطي الخروج العادي أيضًا
 
 if __name__ == "__main__":
     asyncio.run(main())
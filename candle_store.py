@@ -0,0 +1,274 @@
+# -*- coding: utf-8 -*-
+"""
+candle_store.py — مخزن شموع في الذاكرة لكل (symbol, timeframe) مع جلب الفروقات فقط.
+
+الفكرة:
+- حلقة ثابتة الطول (deque بـ maxlen) لكل مفتاح تحفظ صفوف ccxt: [ts, o, h, l, c, v].
+  إن كانت السعة أكبر من 300 (سقف OKX) يتم الجلب الكامل على صفحات.
+- أول طلب = جلب كامل (limit). بعده نجلب فقط من آخر شمعة مخزّنة (since) —
+  تلك الشمعة كانت "قيد التكوين" وقت الجلب السابق فنستبدلها بنسختها الأحدث.
+- إن لم تتصل الدفعة الجديدة بالمخزّن (فجوة/انقطاع طويل/بيانات غير متتالية) ⇒ إعادة مزامنة كاملة.
+- وضع until_close (لإطارات HTF): نخدم من الذاكرة بلا أي طلب حتى تُغلق الشمعة الجارية
+  (ts آخر صف + مدة الإطار)، ثم نجلب الفرق. مناسب فقط لمن يقرأ الشموع المغلقة (iloc[-2]).
+
+حفظ على القرص (إعادة تشغيل دافئة): save_dir/load_dir يكتبان ملف .npy مضغوط (float64 n×6)
+لكل مفتاح مع كتابة ذرّية (tmp + os.replace) وفقط للمفاتيح المتغيّرة منذ آخر حفظ.
+بعد التحميل يكفي جلب الفرق؛ وإن كانت البيانات أقدم من السعة أو أقصر من العمق المطلوب يحدث جلب كامل تلقائيًا.
+
+المخزن لا يعرف شيئًا عن OKX: يستقبل fetcher غير متزامن بالتوقيع
+    await fetcher(symbol, timeframe, limit, since) -> list[rows]
+ويعيد [] عند الفشل (نفس عقد bot.fetch_ohlcv).
+"""
+
+from __future__ import annotations
+import asyncio
+import os
+import time
+from collections import deque
+from pathlib import Path
+from typing import Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+from urllib.parse import quote, unquote
+
+import numpy as np
+
+from resample import tf_to_ms
+
+CANDLE_STORE_CAPACITY = int(os.getenv("CANDLE_STORE_CAPACITY", "300"))  # طول الحلقة لكل مفتاح
+OKX_MAX_CANDLES_PER_CALL = 300                                          # سقف OKX لطلب واحد
+
+Row = List[float]
+Fetcher = Callable[[str, str, int, Optional[int]], Awaitable[List[Row]]]
+
+
+class _Series:
+    __slots__ = ("rows", "depth", "last_fetch", "lock", "dirty")
+
+    def __init__(self, capacity: int):
+        self.rows: Deque[Row] = deque(maxlen=capacity)
+        self.depth = 0            # العمق المطلوب في آخر جلب كامل (الرموز الجديدة قد تعيد أقل)
+        self.last_fetch = 0.0
+        self.lock = asyncio.Lock()
+        self.dirty = False        # تغيّر منذ آخر حفظ على القرص
+
+
+class CandleStore:
+    def __init__(self, fetcher: Fetcher, capacity: int | None = None):
+        self.fetcher = fetcher
+        self.capacity = int(capacity or CANDLE_STORE_CAPACITY)
+        self._series: Dict[Tuple[str, str], _Series] = {}
+        self.stats = {"hit": 0, "miss": 0, "full": 0, "delta": 0, "resync": 0, "bars_fetched": 0, "errors": 0}
+
+    # ---------- داخلي ----------
+    def _get_series(self, symbol: str, timeframe: str) -> _Series:
+        key = (symbol, timeframe)
+        s = self._series.get(key)
+        if s is None:
+            s = self._series[key] = _Series(self.capacity)
+        return s
+
+    async def _paged(self, symbol: str, timeframe: str, limit: int) -> List[Row]:
+        """عمق أكبر من سقف الطلب الواحد: صفحات متتالية للأمام عبر since حتى الشمعة الحالية."""
+        tf_ms = tf_to_ms(timeframe)
+        now_ms = int(time.time() * 1000)
+        since = now_ms - limit * tf_ms
+        out: List[Row] = []
+        for _ in range(limit // OKX_MAX_CANDLES_PER_CALL + 3):
+            page = await self.fetcher(symbol, timeframe, OKX_MAX_CANDLES_PER_CALL, since)
+            if not page:
+                break
+            last = int(out[-1][0]) if out else -1
+            out.extend(r for r in page if int(r[0]) > last)
+            if not out:
+                break
+            last = int(out[-1][0])
+            if len(page) < OKX_MAX_CANDLES_PER_CALL or last + tf_ms > now_ms:
+                break
+            since = last + tf_ms
+        return out[-limit:]
+
+    async def _full(self, s: _Series, symbol: str, timeframe: str, limit: int) -> bool:
+        limit = min(limit, self.capacity)
+        if limit > OKX_MAX_CANDLES_PER_CALL:
+            rows = await self._paged(symbol, timeframe, limit)
+        else:
+            rows = await self.fetcher(symbol, timeframe, limit, None)
+        self.stats["full"] += 1
+        if not rows:
+            self.stats["errors"] += 1
+            return False
+        s.rows.clear()
+        s.rows.extend(rows[-self.capacity:])
+        s.depth = limit
+        s.dirty = True
+        s.last_fetch = time.time()
+        self.stats["bars_fetched"] += len(rows)
+        return True
+
+    async def _delta(self, s: _Series, symbol: str, timeframe: str) -> Optional[bool]:
+        """True = دُمج بنجاح | False = يحتاج إعادة مزامنة | None = فشل الشبكة."""
+        tf_ms = tf_to_ms(timeframe)
+        last_ts = int(s.rows[-1][0])
+        now_ms = int(time.time() * 1000)
+        need = (now_ms - last_ts) // tf_ms + 2     # الشمعة الأخيرة + الجديدة + هامش
+        if need >= OKX_MAX_CANDLES_PER_CALL or need >= self.capacity:
+            return False                           # انقطاع طويل: الجلب الكامل أرخص وأضمن
+        rows = await self.fetcher(symbol, timeframe, int(need), last_ts)
+        self.stats["delta"] += 1
+        if not rows:
+            self.stats["errors"] += 1
+            return None
+        first_ts = int(rows[0][0])
+        if first_ts > last_ts:
+            return False                           # فجوة: لم تعد الشمعة المرجعية ضمن الدفعة
+        prev = None
+        for r in rows:
+            ts = int(r[0])
+            if prev is not None and ts - prev != tf_ms:
+                return False                       # بيانات غير متتالية
+            prev = ts
+        # استبدل الذيل المتداخل (الشمعة التي كانت قيد التكوين) ثم ألحق الجديد
+        while s.rows and int(s.rows[-1][0]) >= first_ts:
+            s.rows.pop()
+        if s.rows and first_ts - int(s.rows[-1][0]) != tf_ms:
+            return False
+        s.rows.extend(rows)
+        s.dirty = True
+        s.last_fetch = time.time()
+        self.stats["bars_fetched"] += len(rows)
+        return True
+
+    # ---------- الواجهة ----------
+    async def get(self, symbol: str, timeframe: str, limit: int = 300, until_close: bool = False) -> List[Row]:
+        """
+        يعيد آخر `limit` صفًا (بما فيها الشمعة قيد التكوين) بعد تحديث المخزن بالفرق فقط.
+        until_close=True: لا جلب إطلاقًا قبل حدّ إغلاق الشمعة الجارية.
+        عند الفشل يعيد [] كما كان bot.fetch_ohlcv يفعل.
+        """
+        limit = int(limit)
+        s = self._get_series(symbol, timeframe)
+        async with s.lock:
+            if until_close and s.rows and limit <= s.depth:
+                next_close_ms = int(s.rows[-1][0]) + tf_to_ms(timeframe)
+                if time.time() * 1000 < next_close_ms:
+                    self.stats["hit"] += 1
+                    return list(s.rows)[-limit:]
+            self.stats["miss"] += 1
+            if limit > self.capacity or not s.rows or limit > s.depth:
+                ok = await self._full(s, symbol, timeframe, max(limit, s.depth))
+                if not ok:
+                    return []
+            else:
+                res = await self._delta(s, symbol, timeframe)
+                if res is None:
+                    return []
+                if res is False:
+                    self.stats["resync"] += 1
+                    if not await self._full(s, symbol, timeframe, max(limit, s.depth)):
+                        return []
+            return list(s.rows)[-limit:]
+
+    def hit_rate(self) -> float:
+        h, m = self.stats["hit"], self.stats["miss"]
+        return (h / (h + m)) if (h + m) else 0.0
+
+    def peek(self, symbol: str, timeframe: str) -> List[Row]:
+        """نسخة من المخزّن بدون أي جلب."""
+        s = self._series.get((symbol, timeframe))
+        return list(s.rows) if s else []
+
+    # ---------- الحفظ على القرص ----------
+    @staticmethod
+    def _fname(symbol: str, timeframe: str) -> str:
+        return f"{quote(symbol, safe='')}__{timeframe}.npy"
+
+    def snapshot_dirty(self) -> Dict[Tuple[str, str], np.ndarray]:
+        """ينسخ المفاتيح المتغيّرة إلى مصفوفات (داخل اللوب) ويصفّر علامة التغيير."""
+        out = {}
+        for key, s in self._series.items():
+            if not s.dirty or not s.rows:
+                continue
+            try:
+                arr = np.asarray(list(s.rows), dtype=np.float64)
+            except Exception:
+                arr = self._clean_rows(s.rows)     # صف تالف نادر من المنصة (طول/نوع خاطئ)
+            # None ⇒ NaN؛ صف بلا ts صالح لا يُحفظ (الباقي يُحفظ ولا يُعاد المحاولة كل دورة)
+            if arr.ndim == 2 and arr.shape[1] == 6:
+                arr = arr[np.isfinite(arr[:, 0])]
+                if len(arr):
+                    out[key] = arr
+            s.dirty = False
+        return out
+
+    @staticmethod
+    def _clean_rows(rows) -> np.ndarray:
+        good = []
+        for r in rows:
+            try:
+                if len(r) == 6:
+                    good.append([float("nan") if x is None else float(x) for x in r])
+            except Exception:
+                continue
+        return np.asarray(good, dtype=np.float64).reshape(-1, 6)
+
+    @classmethod
+    def write_snapshot(cls, directory, snap: Dict[Tuple[str, str], np.ndarray]) -> int:
+        """كتابة ذرّية لكل مفتاح (آمنة للتشغيل داخل thread)."""
+        d = Path(directory)
+        d.mkdir(parents=True, exist_ok=True)
+        n = 0
+        for (symbol, timeframe), arr in snap.items():
+            final = d / cls._fname(symbol, timeframe)
+            tmp = final.with_name(final.name + ".tmp")
+            try:
+                with open(tmp, "wb") as f:
+                    np.save(f, arr, allow_pickle=False)
+                os.replace(tmp, final)
+                n += 1
+            except Exception:
+                try:
+                    tmp.unlink()
+                except Exception:
+                    pass
+        return n
+
+    def save_dir(self, directory) -> int:
+        return self.write_snapshot(directory, self.snapshot_dirty())
+
+    def load_dir(self, directory, max_age_sec: float | None = None) -> int:
+        """
+        يحمّل كل ملفات .npy؛ يتجاهل الملفات التالفة أو الأقدم من max_age_sec.
+        العمق = عدد الصفوف المحمّلة ⇒ ملف أقصر من الطلب (سعة زادت منذ الحفظ مثلاً) يسبب جلبًا كاملًا
+        (على صفحات) عند أول get بدل إرجاع صفوف أقل من المطلوب. الفروقات تضيف للأمام فقط.
+        """
+        d = Path(directory)
+        if not d.is_dir():
+            return 0
+        now = time.time()
+        n = 0
+        for fp in d.glob("*.npy"):
+            try:
+                if max_age_sec is not None and now - fp.stat().st_mtime > max_age_sec:
+                    continue
+                sym_q, tf = fp.stem.rsplit("__", 1)
+                arr = np.load(fp, allow_pickle=False)
+                if arr.ndim != 2 or arr.shape[1] != 6 or not len(arr):
+                    continue
+                s = self._get_series(unquote(sym_q), tf)
+                s.rows.clear()
+                s.rows.extend([int(r[0]), *map(float, r[1:])] for r in arr.tolist())
+                s.depth = len(s.rows)
+                s.dirty = False
+                n += 1
+            except Exception:
+                continue
+        return n
+
+    def drop(self, symbol: str | None = None):
+        if symbol is None:
+            self._series.clear()
+            return
+        for k in [k for k in self._series if k[0] == symbol]:
+            self._series.pop(k, None)
+
+    def __len__(self) -> int:
+        return len(self._series)
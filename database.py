@@ -117,6 +117,30 @@ class Lock(Base):
     created_at = Column(DateTime, default=_utcnow, nullable=False)
 
 
+class ScanWorker(Base):
+    """عامل فحص مسجّل (وضع التقسيم SHARD_MODE): نطاق الهاش الذي يطالب به + نبض القلب."""
+    __tablename__ = "scan_workers"
+    worker_id = Column(String(128), primary_key=True)
+    range_lo = Column(BigInteger, nullable=True)
+    range_hi = Column(BigInteger, nullable=True)
+    symbols = Column(Integer, default=0, nullable=False)
+    is_leader = Column(Boolean, default=False, nullable=False)
+    started_at = Column(DateTime, default=_utcnow, nullable=False)
+    heartbeat_at = Column(DateTime, default=_utcnow, nullable=False)
+
+
+class SignalOutbox(Base):
+    """إشارات من عمّال الفحص غير القائدين بانتظار أن يرسلها القائد."""
+    __tablename__ = "signal_outbox"
+    id = Column(Integer, primary_key=True)
+    symbol = Column(String(32), index=True, nullable=False)
+    payload = Column(Text, nullable=False)          # JSON للإشارة كاملة
+    worker_id = Column(String(128), nullable=True)
+    status = Column(String(8), index=True, default="pending", nullable=False)  # pending | taken
+    created_at = Column(DateTime, default=_utcnow, nullable=False)
+    taken_at = Column(DateTime, nullable=True)
+
+
 # ---------- SQL helpers ----------
 def _add_column_sql(table: str, col: str, dialect: str) -> str:
     if table == "users":
@@ -761,3 +785,109 @@ def release_leader_lock(name: str, holder: str) -> None:
                 s.commit()
             except Exception:
                 s.rollback()
+
+
+# ---------- Scan workers (sharding) ----------
+def heartbeat_scan_worker(worker_id: str, range_lo: Optional[int] = None, range_hi: Optional[int] = None,
+                          symbols: int = 0, is_leader: bool = False) -> None:
+    now = _utcnow()
+    with SessionLocal() as s:
+        row = s.get(ScanWorker, worker_id)
+        if row is None:
+            row = ScanWorker(worker_id=worker_id, started_at=now)
+            s.add(row)
+        row.range_lo, row.range_hi = range_lo, range_hi
+        row.symbols = int(symbols)
+        row.is_leader = bool(is_leader)
+        row.heartbeat_at = now
+        try:
+            s.commit()
+        except Exception:
+            s.rollback()
+            raise
+
+def list_live_scan_workers(ttl_seconds: int = 90) -> List[Dict[str, Any]]:
+    """العمّال الذين نبضوا خلال ttl_seconds (مرتبين بالمعرّف)."""
+    expiry = _utcnow() - timedelta(seconds=int(ttl_seconds))
+    out: List[Dict[str, Any]] = []
+    with SessionLocal() as s:
+        for w in s.execute(select(ScanWorker).order_by(ScanWorker.worker_id)).scalars():
+            hb = _as_aware(w.heartbeat_at)
+            if hb is None or hb < expiry:
+                continue
+            out.append({"worker_id": w.worker_id, "range_lo": w.range_lo, "range_hi": w.range_hi,
+                        "symbols": w.symbols, "is_leader": bool(w.is_leader), "heartbeat_at": hb})
+    return out
+
+def remove_scan_worker(worker_id: str) -> None:
+    with SessionLocal() as s:
+        row = s.get(ScanWorker, worker_id)
+        if row:
+            s.delete(row)
+            try:
+                s.commit()
+            except Exception:
+                s.rollback()
+
+def prune_scan_workers(ttl_seconds: int = 90) -> int:
+    """حذف عمّال ماتوا منذ فترة (أقدم من 10×ttl) حتى لا يكبر الجدول."""
+    expiry = _utcnow() - timedelta(seconds=int(ttl_seconds) * 10)
+    n = 0
+    with SessionLocal() as s:
+        for w in s.execute(select(ScanWorker)).scalars().all():
+            hb = _as_aware(w.heartbeat_at)
+            if hb is not None and hb < expiry:
+                s.delete(w)
+                n += 1
+        try:
+            s.commit()
+        except Exception:
+            s.rollback()
+            return 0
+    return n
+
+
+# ---------- Signal outbox ----------
+def outbox_put(symbol: str, payload: str, worker_id: Optional[str] = None) -> int:
+    with SessionLocal() as s:
+        row = SignalOutbox(symbol=symbol, payload=payload, worker_id=worker_id, status="pending")
+        s.add(row)
+        s.commit()
+        return int(row.id)
+
+def outbox_take(limit: int = 20) -> List[Tuple[int, str, Optional[str]]]:
+    """يحجز حتى limit إشارة معلّقة (الأقدم أولاً). الحجز شرطي (status='pending')
+    فلا تُرسل إشارة مرتين حتى لو سحب قائدان في نفس اللحظة أثناء انتقال القيادة."""
+    taken: List[Tuple[int, str, Optional[str]]] = []
+    with SessionLocal() as s:
+        rows = s.execute(
+            select(SignalOutbox.id, SignalOutbox.payload, SignalOutbox.worker_id)
+            .where(SignalOutbox.status == "pending")
+            .order_by(SignalOutbox.id)
+            .limit(int(limit))
+        ).all()
+        for rid, payload, wid in rows:
+            res = s.execute(
+                text("UPDATE signal_outbox SET status='taken', taken_at=:now WHERE id=:id AND status='pending'"),
+                {"now": _utcnow(), "id": rid},
+            )
+            if res.rowcount == 1:
+                taken.append((int(rid), payload, wid))
+        s.commit()
+    return taken
+
+def outbox_prune(days: int = 7) -> int:
+    since = _utcnow() - timedelta(days=int(days))
+    with SessionLocal() as s:
+        res = s.execute(
+            text("DELETE FROM signal_outbox WHERE status='taken' AND created_at < :since"),
+            {"since": since},
+        )
+        s.commit()
+        return int(res.rowcount or 0)
+
+def outbox_pending_count() -> int:
+    with SessionLocal() as s:
+        return int(s.execute(
+            select(func.count()).select_from(SignalOutbox).where(SignalOutbox.status == "pending")
+        ).scalar() or 0)
@@ -0,0 +1,363 @@
+# -*- coding: utf-8 -*-
+"""
+fake_okx_server.py — خادم OKX وهمي محلي (REST v5 العام فقط) لقياس الإنتاجية بدون إنترنت.
+
+يحاكي المسارات التي يستخدمها البوت عبر ccxt:
+  /api/v5/public/instruments, /api/v5/market/candles, /api/v5/market/history-candles,
+  /api/v5/market/ticker, /api/v5/market/tickers, /api/v5/market/books
+
+البيانات اصطناعية لكنها حتمية: كل رمز له سلسلة دقائق ثابتة، والأطر الأعلى
+تُجمَّع من وحدات أصغر (لذلك 4H/1D = تجميع 1H بالضبط، مثل البورصة).
+
+تشغيل كخادم:
+    python fake_okx_server.py --port 8089 --symbols 150 --latency-ms 25
+    OKX_REST_BASE_URL=http://127.0.0.1:8089 python bot.py
+
+قياس سريع (الخادم + العميل في نفس العملية):
+    python fake_okx_server.py --bench --symbols 120 --concurrency 16 --latency-ms 25 --mode both
+"""
+
+from __future__ import annotations
+import argparse
+import asyncio
+import hashlib
+import math
+import time
+from collections import deque
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from aiohttp import web
+
+_MAJORS = ["BTC", "ETH", "SOL", "BNB", "XRP", "DOGE", "ADA", "TRX", "TON", "AVAX",
+           "DOT", "LINK", "NEAR", "APT", "ARB", "OP", "ATOM", "ETC", "XLM", "LTC"]
+_MIN_MS = 60_000
+_DAY_MIN = 1440
+_HK_OFFSET_MS = 8 * 3600 * 1000  # OKX: أطر 6H فما فوق بدون utc تبدأ بتوقيت هونغ كونغ
+
+
+def _bases(n: int) -> List[str]:
+    out = list(_MAJORS[:n])
+    i = 1
+    while len(out) < n:
+        out.append(f"C{i:03d}")
+        i += 1
+    return out
+
+
+def _seed(inst: str, salt: int = 0) -> int:
+    return int(hashlib.md5(f"{inst}|{salt}".encode()).hexdigest()[:12], 16)
+
+
+def _base_price(inst: str) -> float:
+    return 0.05 + (_seed(inst) % 50_000) / 10.0
+
+
+@lru_cache(maxsize=16384)
+def _unit_block(inst: str, day_idx: int, unit: int) -> Tuple[np.ndarray, ...]:
+    """
+    يوم UTC كامل لرمز بوحدة unit دقيقة (1 أو 60): open/high/low/close/volume.
+    الأطر ≥ 1H تُجمَّع من وحدة الساعة، وما دونها من وحدة الدقيقة.
+    """
+    n = _DAY_MIN // unit
+    rng = np.random.default_rng(_seed(inst, day_idx * 100 + unit))
+    base = _base_price(inst)
+    t = (day_idx * _DAY_MIN + np.arange(n + 1) * unit).astype("float64")
+    ph = (_seed(inst, -1) % 1000) / 1000.0 * 2 * math.pi
+    # سعر سلس يعتمد على الزمن فقط (مستمر عبر حدود الأيام) + ظلال وأحجام عشوائية حتمية
+    level = base * np.exp(0.06 * np.sin(t / 2900.0 + ph) + 0.02 * np.sin(t / 170.0 + 2 * ph)
+                          + 0.004 * np.sin(t / 7.0 + 3 * ph))
+    opens = level[:-1]
+    closes = level[1:]
+    wick = np.abs(rng.normal(0.0, 0.0008 * math.sqrt(unit), size=(2, n)))
+    highs = np.maximum(opens, closes) * (1.0 + wick[0])
+    lows = np.minimum(opens, closes) * (1.0 - wick[1])
+    vols = rng.gamma(2.0, 50.0 * unit, size=n) * (1.0 + 0.5 * np.sin(t[:-1] / 60.0 + ph) ** 2)
+    return opens, highs, lows, closes, vols
+
+
+def _units(inst: str, m0: int, m1: int, unit: int) -> Tuple[np.ndarray, ...]:
+    """وحدات الفترة [m0, m1) (بالدقائق، مضاعفات unit) كمصفوفات متصلة."""
+    per_day = _DAY_MIN // unit
+    u0, u1 = m0 // unit, -(-m1 // unit)
+    parts: List[Tuple[np.ndarray, ...]] = []
+    u = u0
+    while u < u1:
+        d = u // per_day
+        a = u - d * per_day
+        b = min(per_day, u1 - d * per_day)
+        blk = _unit_block(inst, d, unit)
+        parts.append(tuple(x[a:b] for x in blk))
+        u = d * per_day + b
+    if not parts:
+        return tuple(np.empty(0) for _ in range(5))
+    return tuple(np.concatenate([p[i] for p in parts]) for i in range(5))
+
+
+def _parse_bar(bar: str) -> Tuple[int, int]:
+    """'5m' / '1H' / '4H' / '1D' / '1Dutc' → (duration_ms, offset_ms)."""
+    utc = bar.endswith("utc")
+    b = bar[:-3] if utc else bar
+    n, unit = int(b[:-1]), b[-1]
+    dur = n * {"m": 60, "H": 3600, "D": 86400, "W": 604800}[unit] * 1000
+    off = 0
+    if not utc and dur >= 6 * 3600 * 1000:
+        off = (-_HK_OFFSET_MS) % dur
+    return dur, off
+
+
+def _candles(inst: str, bar: str, limit: int, before: Optional[int], after: Optional[int],
+             now_ms: int) -> List[list]:
+    dur, off = _parse_bar(bar)
+    cur_start = (now_ms - off) // dur * dur + off
+    hi = cur_start if after is None else min(cur_start, ((after - 1 - off) // dur) * dur + off)
+    lo = None if before is None else ((before - off) // dur + 1) * dur + off
+    n = max(0, min(limit, ((hi - lo) // dur + 1) if lo is not None else limit))
+    if n == 0:
+        return []
+    first = hi - (n - 1) * dur
+    m0 = first // _MIN_MS
+    m1 = min((hi + dur) // _MIN_MS, now_ms // _MIN_MS + 1)
+    unit = 60 if dur >= 3600 * 1000 else 1
+    o, h, l, c, v = _units(inst, m0, m1, unit)
+    per = dur // (_MIN_MS * unit)
+    idx = np.arange(0, len(o), per)
+    if not len(idx):
+        return []
+    ends = np.minimum(idx + per, len(o)) - 1
+    bo, bc = o[idx], c[ends]
+    bh, bl = np.maximum.reduceat(h, idx), np.minimum.reduceat(l, idx)
+    bv = np.add.reduceat(v, idx)
+    rows = []
+    for k in range(len(idx)):
+        ts = first + k * dur
+        confirm = "1" if ts + dur <= now_ms else "0"
+        rows.append([str(ts), f"{bo[k]:.8g}", f"{bh[k]:.8g}", f"{bl[k]:.8g}", f"{bc[k]:.8g}",
+                     f"{bv[k]:.6g}", f"{bv[k]:.6g}", f"{bv[k] * bc[k]:.6g}", confirm])
+    rows.reverse()  # OKX: الأحدث أولًا
+    return rows
+
+
+class FakeOKX:
+    def __init__(self, n_symbols: int = 150, latency_ms: float = 0.0, rate_max: int = 0,
+                 rate_window: float = 2.0):
+        self.bases = _bases(n_symbols)
+        self.latency = latency_ms / 1000.0
+        self.rate_max = rate_max
+        self.rate_window = rate_window
+        self._hits: deque = deque()
+        self.requests: Dict[str, int] = {}
+
+    # ---------- أدوات ----------
+    @staticmethod
+    def _ok(data) -> web.Response:
+        return web.json_response({"code": "0", "msg": "", "data": data})
+
+    async def _gate(self, request: web.Request) -> Optional[web.Response]:
+        path = request.path.rsplit("/api/v5/", 1)[-1]
+        self.requests[path] = self.requests.get(path, 0) + 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if self.rate_max:
+            now = time.monotonic()
+            while self._hits and now - self._hits[0] > self.rate_window:
+                self._hits.popleft()
+            if len(self._hits) >= self.rate_max:
+                return web.json_response({"code": "50011", "msg": "Too Many Requests", "data": []}, status=429)
+            self._hits.append(now)
+        return None
+
+    def _inst_ids(self, inst_type: str) -> List[str]:
+        if inst_type == "SWAP":
+            return [f"{b}-USDT-SWAP" for b in self.bases]
+        return [f"{b}-USDT" for b in self.bases]
+
+    @staticmethod
+    def _spread_bps(inst: str) -> float:
+        return 1.0 + (_seed(inst, 7) % 90) / 10.0
+
+    def _ticker(self, inst: str, inst_type: str, now_ms: int) -> dict:
+        rows = _candles(inst, "1m", 1, None, None, now_ms)
+        last = float(rows[0][4]) if rows else _base_price(inst)
+        half = last * self._spread_bps(inst) / 20000.0
+        day = _candles(inst, "1Dutc", 1, None, None, now_ms)
+        vol24 = float(day[0][5]) if day else 0.0
+        return {
+            "instType": inst_type, "instId": inst,
+            "last": f"{last:.8g}", "lastSz": "1",
+            "askPx": f"{last + half:.8g}", "askSz": "10",
+            "bidPx": f"{last - half:.8g}", "bidSz": "10",
+            "open24h": day[0][1] if day else f"{last:.8g}",
+            "high24h": day[0][2] if day else f"{last:.8g}",
+            "low24h": day[0][3] if day else f"{last:.8g}",
+            "volCcy24h": f"{vol24 * last:.6g}", "vol24h": f"{vol24:.6g}",
+            "sodUtc0": f"{last:.8g}", "sodUtc8": f"{last:.8g}",
+            "ts": str(now_ms),
+        }
+
+    @staticmethod
+    def _inst_type_of(inst: str) -> str:
+        return "SWAP" if inst.endswith("-SWAP") else "SPOT"
+
+    # ---------- المسارات ----------
+    async def instruments(self, request: web.Request) -> web.Response:
+        if (r := await self._gate(request)) is not None:
+            return r
+        inst_type = request.query.get("instType", "SPOT").upper()
+        out = []
+        for b, inst in zip(self.bases, self._inst_ids(inst_type)):
+            item = {
+                "instType": inst_type, "instId": inst, "uly": "", "instFamily": "",
+                "baseCcy": b if inst_type == "SPOT" else "", "quoteCcy": "USDT" if inst_type == "SPOT" else "",
+                "settleCcy": "USDT" if inst_type == "SWAP" else "",
+                "ctVal": "1" if inst_type == "SWAP" else "", "ctMult": "1" if inst_type == "SWAP" else "",
+                "ctValCcy": b if inst_type == "SWAP" else "", "ctType": "linear" if inst_type == "SWAP" else "",
+                "alias": "", "category": "1", "expTime": "", "lever": "20", "listTime": "1600000000000",
+                "lotSz": "1", "minSz": "1", "optType": "", "state": "live", "stk": "", "tickSz": "0.0001",
+                "maxLmtSz": "100000000", "maxMktSz": "1000000",
+            }
+            if inst_type == "SWAP":
+                item["uly"] = item["instFamily"] = f"{b}-USDT"
+            out.append(item)
+        return self._ok(out)
+
+    async def candles(self, request: web.Request) -> web.Response:
+        if (r := await self._gate(request)) is not None:
+            return r
+        q = request.query
+        inst = q.get("instId", "")
+        limit = min(int(q.get("limit", "100")), 300)
+        before = int(q["before"]) if q.get("before") else None
+        after = int(q["after"]) if q.get("after") else None
+        return self._ok(_candles(inst, q.get("bar", "1m"), limit, before, after, int(time.time() * 1000)))
+
+    async def ticker(self, request: web.Request) -> web.Response:
+        if (r := await self._gate(request)) is not None:
+            return r
+        inst = request.query.get("instId", "")
+        return self._ok([self._ticker(inst, self._inst_type_of(inst), int(time.time() * 1000))])
+
+    async def tickers(self, request: web.Request) -> web.Response:
+        if (r := await self._gate(request)) is not None:
+            return r
+        inst_type = request.query.get("instType", "SPOT").upper()
+        now_ms = int(time.time() * 1000)
+        return self._ok([self._ticker(i, inst_type, now_ms) for i in self._inst_ids(inst_type)])
+
+    async def books(self, request: web.Request) -> web.Response:
+        if (r := await self._gate(request)) is not None:
+            return r
+        inst = request.query.get("instId", "")
+        sz = int(request.query.get("sz", "5"))
+        t = self._ticker(inst, self._inst_type_of(inst), int(time.time() * 1000))
+        bid, ask = float(t["bidPx"]), float(t["askPx"])
+        step = max(ask - bid, 1e-9)
+        asks = [[f"{ask + k * step:.8g}", "10", "0", "1"] for k in range(sz)]
+        bids = [[f"{bid - k * step:.8g}", "10", "0", "1"] for k in range(sz)]
+        return self._ok([{"asks": asks, "bids": bids, "ts": t["ts"]}])
+
+    def app(self) -> web.Application:
+        a = web.Application()
+        a.router.add_get("/api/v5/public/instruments", self.instruments)
+        a.router.add_get("/api/v5/market/candles", self.candles)
+        a.router.add_get("/api/v5/market/history-candles", self.candles)
+        a.router.add_get("/api/v5/market/ticker", self.ticker)
+        a.router.add_get("/api/v5/market/tickers", self.tickers)
+        a.router.add_get("/api/v5/market/books", self.books)
+        return a
+
+
+async def start_fake_okx(port: int = 0, **kw) -> Tuple[web.AppRunner, str, FakeOKX]:
+    """يشغّل الخادم داخل اللوب الحالي ويعيد (runner, base_url, server)."""
+    srv = FakeOKX(**kw)
+    runner = web.AppRunner(srv.app(), access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", port)
+    await site.start()
+    sock = site._server.sockets[0]  # noqa: SLF001 — نحتاج المنفذ الفعلي عند port=0
+    return runner, f"http://127.0.0.1:{sock.getsockname()[1]}", srv
+
+
+# ============== القياس ==============
+_BENCH_TFS = (("5m", 300), ("1h", 220), ("4h", 220), ("1d", 220))
+
+
+async def _bench_async(base_url: str, symbols: List[str], concurrency: int) -> Tuple[int, float]:
+    from okx_async import OKXAsync
+    ex = OKXAsync(base_url=base_url, pool_size=max(concurrency, 4))
+    try:
+        await ex.load_markets_by_types(["spot", "swap"])
+        sem = asyncio.Semaphore(concurrency)
+
+        async def _one(sym: str, tf: str, lim: int):
+            async with sem:
+                return await ex.fetch_ohlcv(sym, tf, limit=lim)
+
+        t0 = time.perf_counter()
+        res = await asyncio.gather(*[_one(s, tf, lim) for s in symbols for tf, lim in _BENCH_TFS])
+        dt = time.perf_counter() - t0
+        return sum(1 for r in res if r), dt
+    finally:
+        await ex.close()
+
+
+async def _bench_executor(base_url: str, symbols: List[str], concurrency: int) -> Tuple[int, float]:
+    """المسار القديم للمقارنة: ccxt.okx المتزامن داخل run_in_executor(None, ...)."""
+    import ccxt
+    ex = ccxt.okx({"enableRateLimit": False})
+    ex.urls["api"] = {"rest": base_url}
+    loop = asyncio.get_running_loop()
+    mk = []
+    for t in ("spot", "swap"):
+        mk += await loop.run_in_executor(None, ex.fetch_markets_by_type, t, {})
+    ex.set_markets(mk)
+    sem = asyncio.Semaphore(concurrency)
+
+    async def _one(sym: str, tf: str, lim: int):
+        async with sem:
+            return await loop.run_in_executor(None, lambda: ex.fetch_ohlcv(sym, timeframe=tf, limit=lim))
+
+    t0 = time.perf_counter()
+    res = await asyncio.gather(*[_one(s, tf, lim) for s in symbols for tf, lim in _BENCH_TFS])
+    dt = time.perf_counter() - t0
+    return sum(1 for r in res if r), dt
+
+
+async def _bench(args) -> None:
+    runner, base_url, srv = await start_fake_okx(0, n_symbols=args.symbols, latency_ms=args.latency_ms)
+    symbols = [f"{b}/USDT:USDT" for b in srv.bases]
+    try:
+        modes = ("async", "executor") if args.mode == "both" else (args.mode,)
+        for mode in modes:
+            fn = _bench_async if mode == "async" else _bench_executor
+            ok, dt = await fn(base_url, symbols, args.concurrency)
+            print(f"[bench] mode={mode:<8} symbols={len(symbols)} tfs={len(_BENCH_TFS)} "
+                  f"requests={ok} elapsed={dt:.2f}s rate={ok / max(dt, 1e-9):.1f} req/s "
+                  f"(concurrency={args.concurrency}, latency={args.latency_ms}ms)")
+    finally:
+        await runner.cleanup()
+
+
+def main():
+    p = argparse.ArgumentParser(description="Local fake OKX v5 public REST server")
+    p.add_argument("--port", type=int, default=8089)
+    p.add_argument("--symbols", type=int, default=150)
+    p.add_argument("--latency-ms", type=float, default=0.0, help="تأخير مصطنع لكل طلب")
+    p.add_argument("--rate-max", type=int, default=0, help="أقصى طلبات لكل نافذة (0 = بلا حد) ثم 429/50011")
+    p.add_argument("--rate-window", type=float, default=2.0)
+    p.add_argument("--bench", action="store_true", help="تشغيل قياس داخلي ثم الخروج")
+    p.add_argument("--concurrency", type=int, default=16)
+    p.add_argument("--mode", choices=("async", "executor", "both"), default="both")
+    args = p.parse_args()
+
+    if args.bench:
+        asyncio.run(_bench(args))
+        return
+    srv = FakeOKX(args.symbols, args.latency_ms, args.rate_max, args.rate_window)
+    print(f"[fake-okx] http://127.0.0.1:{args.port} symbols={args.symbols} latency={args.latency_ms}ms")
+    web.run_app(srv.app(), host="127.0.0.1", port=args.port, access_log=None, print=None)
+
+
+if __name__ == "__main__":
+    main()
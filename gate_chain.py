@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+"""
+gate_chain.py — سلسلة بوابات تصريحية بكلفة تقديرية تُرتَّب حسب (نسبة الرفض ÷ الكلفة) المرصودة.
+
+- Gate(name, fn, cost_us): fn(ctx) تعيد None عند النجاح أو (رسالة الرفض، قيمة) عند الرفض،
+  ويمكنها إضافة مخرجات إلى ctx تستخدمها الدالة بعد السلسلة (rvol، نطاق ATR، ...).
+- مدخل كسول مشترك (MTF في check_signal) تحسبه أول بوابة تحتاجه: الدالة تضيف زمنه إلى
+  ctx["lazy_sec"] فيُسجَّل في Gate.lazy_sec لا في زمن البوابة نفسها (lazy_us = الكلفة المعلنة له).
+  الترتيب يستخدم المجموع لأن البوابة تدفعه فعلًا حين تسبق غيرها.
+- شرط الدخول في سلسلة: البوابة نقية بالنسبة للقرار — لا تغيّر حالة تقرؤها بوابة أخرى أو ما بعد
+  الرفض (ملف الحالة، holdout). عندها نتيجة السلسلة (نجاح كل البوابات) لا تتغير بأي ترتيب؛
+  الذي يتغير فقط هو أي بوابة تُسجَّل سببًا للرفض وكم يكلّف الوصول إليه.
+- GATE_ORDER=adaptive (الافتراضي): كل GATE_REORDER_EVERY تقييمًا تُرتَّب البوابات تنازليًا بـ
+  rate/cost، وكلاهما متوسط منعَّم بالقيم التصريحية (rate مبدئي GATE_PRIOR_RATE بوزن GATE_PRIOR_N)
+  ⇒ بداية بالترتيب المعلن ثم تتكيّف مع السوق. GATE_ORDER=static ⇒ الترتيب المعلن دائمًا.
+"""
+
+from __future__ import annotations
+import os
+import time
+from typing import Callable, List, Optional, Tuple
+
+GATE_ORDER = os.getenv("GATE_ORDER", "adaptive").strip().lower()
+GATE_REORDER_EVERY = int(os.getenv("GATE_REORDER_EVERY", "200"))
+GATE_PRIOR_RATE = float(os.getenv("GATE_PRIOR_RATE", "0.05"))
+GATE_PRIOR_N = float(os.getenv("GATE_PRIOR_N", "50"))
+
+Reject = Tuple[str, Optional[float]]
+
+
+class Gate:
+    __slots__ = ("name", "fn", "cost_us", "lazy_us", "calls", "rejects", "sec", "lazy_sec")
+
+    def __init__(self, name: str, fn: Callable[[dict], Optional[Reject]], cost_us: float, lazy_us: float = 0.0):
+        self.name = name
+        self.fn = fn
+        self.cost_us = float(cost_us)
+        self.lazy_us = float(lazy_us)
+        self.calls = 0
+        self.rejects = 0
+        self.sec = 0.0
+        self.lazy_sec = 0.0
+
+    def rate(self) -> float:
+        return (self.rejects + GATE_PRIOR_RATE * GATE_PRIOR_N) / (self.calls + GATE_PRIOR_N)
+
+    def own_cost(self) -> float:
+        """µs لكل استدعاء للبوابة نفسها (منعَّمة بالكلفة المعلنة)."""
+        return (self.sec * 1e6 + self.cost_us * GATE_PRIOR_N) / (self.calls + GATE_PRIOR_N)
+
+    def lazy_cost(self) -> float:
+        return (self.lazy_sec * 1e6 + self.lazy_us * GATE_PRIOR_N) / (self.calls + GATE_PRIOR_N)
+
+    def cost(self) -> float:
+        return self.own_cost() + self.lazy_cost()
+
+    def score(self) -> float:
+        return self.rate() / max(self.cost(), 1e-3)
+
+
+class GateChain:
+    def __init__(self, name: str, gates: List[Gate], adaptive: bool = (GATE_ORDER == "adaptive"),
+                 reorder_every: int = GATE_REORDER_EVERY, stage: Optional[Callable[[str], None]] = None):
+        self.name = name
+        self.gates = list(gates)
+        self.order = list(gates)
+        self.adaptive = bool(adaptive)
+        self.reorder_every = max(1, int(reorder_every))
+        self.stage = stage
+        self.runs = 0
+        self.reorders = 0
+
+    def run(self, ctx: dict) -> Optional[Reject]:
+        """أول رفض (رسالة، قيمة) أو None إن نجحت كل البوابات."""
+        self.runs += 1
+        if self.adaptive and self.runs % self.reorder_every == 0:
+            self.reorder()
+        stage = self.stage
+        for g in self.order:
+            if stage is not None:
+                stage(g.name)
+            lz = ctx.get("lazy_sec", 0.0)
+            t = time.perf_counter()
+            r = g.fn(ctx)
+            dt = time.perf_counter() - t
+            lz = ctx.get("lazy_sec", 0.0) - lz
+            g.sec += dt - lz
+            g.lazy_sec += lz
+            g.calls += 1
+            if r is not None:
+                g.rejects += 1
+                return r
+        return None
+
+    def reorder(self):
+        # sorted مستقر ⇒ التعادل يحفظ الترتيب المعلن
+        order = sorted(self.gates, key=lambda g: -g.score())
+        if [g.name for g in order] != [g.name for g in self.order]:
+            self.reorders += 1
+        self.order = order
+
+    def snapshot(self) -> dict:
+        return {"name": self.name, "adaptive": self.adaptive, "runs": self.runs, "reorders": self.reorders,
+                "order": [g.name for g in self.order],
+                "gates": {g.name: {"calls": g.calls, "rejects": g.rejects, "rate": round(g.rate(), 3),
+                                   "avg_us": round(g.own_cost(), 1), "lazy_us": round(g.lazy_cost(), 1)} for g in self.gates}}
+
@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+"""
+gate_profiler.py — زمن كل مرحلة (بوابة) في ltf_precheck/check_signal ونجاحها/فشلها.
+
+- stage(name) = "بدأت المرحلة name" ⇒ تُغلق المرحلة السابقة كناجحة ويُحسب زمنها.
+- wrap(phase) حول الدالة: عند العودة تُغلق المرحلة الجارية — ناجحة إن أعادت الدالة نتيجة،
+  وفاشلة إن أعادت None/رمت استثناء (أي أنها البوابة التي أوقفت الرمز).
+- sub(name) مرحلة متداخلة (مدخل كسول مشترك مثل mtf داخل atr_band): زمنها يُسجَّل لـ name ويُستثنى
+  من المرحلة الجارية التي تستمر بعده.
+- التجميع لكل دورة فحص: (phase, stage) ⇒ calls/pass/fail/sum/max؛ cycle() يغلق الدورة ويضيفها
+  لسلسلة محدودة (STRATEGY_PROFILE_HISTORY) ويكتبها سطر JSON في STRATEGY_PROFILE_EXPORT إن عُيّن.
+- معطّل عند الإقلاع (STRATEGY_PROFILE=0، الافتراضي): wrap تعيد الدالة نفسها بلا غلاف (صفر كلفة)
+  و stage فحص علم واحد؛ لذا التشغيل اللاحق (/profile on) يتطلب STRATEGY_PROFILE=1 عند الإقلاع
+  (wrapped > 0)، وعندها on=False يجعل الغلاف فحص علم واحد.
+- عمّال strategy_pool: drain() ترجع فروقات الطلب وتُدمج بـ merge() في العملية الرئيسية.
+"""
+
+from __future__ import annotations
+import functools
+import json
+import os
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Tuple
+
+STRATEGY_PROFILE = os.getenv("STRATEGY_PROFILE", "0").strip().lower() in ("1", "true", "yes", "on")
+STRATEGY_PROFILE_HISTORY = int(os.getenv("STRATEGY_PROFILE_HISTORY", "288"))
+STRATEGY_PROFILE_EXPORT = os.getenv("STRATEGY_PROFILE_EXPORT", "").strip()
+
+# [calls, passed, failed, sum_sec, max_sec]
+_Agg = Dict[Tuple[str, str], List[float]]
+
+
+def _add(agg: _Agg, key: Tuple[str, str], dt: float, ok: bool, n: int = 1):
+    a = agg.get(key)
+    if a is None:
+        a = agg[key] = [0, 0, 0, 0.0, 0.0]
+    a[0] += n
+    a[1 if ok else 2] += n
+    a[3] += dt
+    if dt > a[4]:
+        a[4] = dt
+
+
+def _merge_agg(dst: _Agg, src: _Agg):
+    for key, (c, p, f, s, mx) in src.items():
+        a = dst.get(key)
+        if a is None:
+            dst[key] = [c, p, f, s, mx]
+        else:
+            a[0] += c; a[1] += p; a[2] += f; a[3] += s
+            a[4] = max(a[4], mx)
+
+
+class GateProfiler:
+    def __init__(self, enabled: bool = STRATEGY_PROFILE, history: int = STRATEGY_PROFILE_HISTORY,
+                 export_path: str = STRATEGY_PROFILE_EXPORT):
+        self.on = bool(enabled)
+        self.export_path = export_path
+        self.series: deque = deque(maxlen=max(1, int(history)))
+        self.cur: _Agg = {}
+        self.total: _Agg = {}
+        self._phase: Optional[str] = None
+        self._stage: Optional[str] = None
+        self._t = 0.0
+        self._cycle_t0 = time.time()
+        self.wrapped = 0          # دوال مغلّفة فعلًا (0 ⇒ on=True لا يقيس شيئًا)
+
+    # ---------- داخل الدوال ----------
+    def stage(self, name: str):
+        if not self.on or self._phase is None:
+            return
+        t = time.perf_counter()
+        if self._stage is not None:
+            _add(self.cur, (self._phase, self._stage), t - self._t, True)
+        self._stage, self._t = name, t
+
+    @contextmanager
+    def sub(self, name: str):
+        if not self.on or self._phase is None:
+            yield
+            return
+        t = time.perf_counter()
+        try:
+            yield
+        finally:
+            dt = time.perf_counter() - t
+            _add(self.cur, (self._phase, name), dt, True)
+            self._t += dt
+
+    def wrap(self, phase: str) -> Callable:
+        def deco(fn):
+            if not self.on:
+                return fn
+            self.wrapped += 1
+
+            @functools.wraps(fn)
+            def inner(*a, **kw):
+                if not self.on or self._phase is not None:
+                    return fn(*a, **kw)
+                self._phase, self._stage = phase, None
+                t0 = self._t = time.perf_counter()
+                res = None
+                try:
+                    res = fn(*a, **kw)
+                    return res
+                finally:
+                    t = time.perf_counter()
+                    ok = res is not None and res is not False
+                    if self._stage is not None:
+                        _add(self.cur, (phase, self._stage), t - self._t, ok)
+                    _add(self.cur, (phase, "total"), t - t0, ok)
+                    self._phase = self._stage = None
+            return inner
+        return deco
+
+    # ---------- الدورات ----------
+    def cycle(self) -> Optional[dict]:
+        """يغلق دورة الفحص الحالية ⇒ سطر في السلسلة (و ملف التصدير)."""
+        if not self.cur:
+            self._cycle_t0 = time.time()
+            return None
+        row = {"ts": int(time.time()), "sec": round(time.time() - self._cycle_t0, 1), "stages": self.rows(self.cur)}
+        _merge_agg(self.total, self.cur)
+        self.cur = {}
+        self._cycle_t0 = time.time()
+        self.series.append(row)
+        if self.export_path:
+            try:
+                with open(self.export_path, "a") as f:
+                    f.write(json.dumps(row) + "\n")
+            except Exception:
+                pass
+        return row
+
+    def reset(self):
+        self.cur, self.total = {}, {}
+        self.series.clear()
+        self._cycle_t0 = time.time()
+
+    @staticmethod
+    def rows(agg: _Agg) -> List[dict]:
+        out = []
+        for (phase, stage), (c, p, f, s, mx) in agg.items():
+            out.append({"phase": phase, "stage": stage, "calls": int(c), "pass": int(p), "fail": int(f),
+                        "ms": round(s * 1e3, 2), "avg_us": round(s / c * 1e6, 1) if c else 0.0,
+                        "max_ms": round(mx * 1e3, 2)})
+        return out
+
+    def last(self) -> Optional[dict]:
+        return self.series[-1] if self.series else None
+
+    def cumulative(self) -> List[dict]:
+        agg: _Agg = {}
+        _merge_agg(agg, self.total)
+        _merge_agg(agg, self.cur)
+        return self.rows(agg)
+
+    # ---------- عمّال strategy_pool ----------
+    def drain(self) -> _Agg:
+        out, self.cur = self.cur, {}
+        return out
+
+    def merge(self, agg: Optional[_Agg]):
+        if agg:
+            _merge_agg(self.cur, agg)
+
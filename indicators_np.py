@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+"""
+indicators_np.py — نواة NumPy لمؤشرات strategy.add_indicators (نفس الأعمدة ونفس الترتيب).
+
+- EWM (adjust=False) بلا حلقة بايثون على الشموع (scipy ليست من الاعتماديات): مسح بالكتل —
+  y_k = Σ_{j≤k} β^(k-j)·z_j (z = α·x، z_0 = x_0، β = 1-α) يُحسب داخل كتل بطول EWM_BLOCK بضرب
+  مصفوفة B×B، ثم تُحمل قيمة نهاية كل كتلة للكتل التالية ⇒ O(n·B) بدل مصفوفات n×n (O(n²)).
+  كل الأوزان ≤ 1 فلا تضخيم للخطأ، والضرب يحفظ الأصفار التامة (loss=0 ⇒ replace(0→1e-9) في RSI).
+  مرور واحد لـ 9 سلاسل (EMAs الإغلاق 9/21/50/200/12/26 + gain/loss + TR) ثم MACD signal.
+- rolling: متوسط/انحراف الحجم من نافذة sliding_window_view واحدة (بمرورين، بدون تراكم cumsum)،
+  و min لـ NR4/NR7 عبر إزاحات.
+- حالات pandas الخاصة محفوظة: replace(0→1e-9) في RSI، replace(0→NaN) في VWAP و z-score،
+  min_periods، وشرط NR بعد اكتمال النافذة.
+- مدخلات فيها NaN ⇒ ValueError (المستدعي يرجع لمسار pandas).
+
+التطابق مع مسار pandas في strategy (≤ 1e-9 نسبيًا): tests/test_indicators_np.py.
+"""
+
+from __future__ import annotations
+from functools import lru_cache
+from typing import Dict, Tuple
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+CLOSE_SPANS = (9, 21, 50, 200, 12, 26)     # ema9/21/50/200 + macd fast/slow
+CLOSE_ALPHAS = tuple(2.0 / (s + 1.0) for s in CLOSE_SPANS)
+
+
+EWM_BLOCK = 16
+
+
+@lru_cache(maxsize=16)
+def _ewm_scan_mats(alphas: Tuple[float, ...], block: int, nb: int):
+    """لكل α: T[m, j] = β^(m-j) (j ≤ m) داخل الكتلة، C[i, j] = β^(B·(i-j)) بين الكتل، و β^(m+1)."""
+    b = 1.0 - np.asarray(alphas, dtype=np.float64)[:, None, None]
+    m = np.arange(block)
+    d = m[:, None] - m[None, :]
+    tri = np.where(d >= 0, b ** np.maximum(d, 0), 0.0)
+    j = np.arange(nb)
+    dj = j[:, None] - j[None, :]
+    carry = np.where(dj >= 0, (b ** block) ** np.maximum(dj, 0), 0.0)
+    tri_t, carry_t = np.ascontiguousarray(tri.transpose(0, 2, 1)), np.ascontiguousarray(carry.transpose(0, 2, 1))
+    pw = b[:, :, 0] ** (m + 1)
+    for a in (tri_t, carry_t, pw):
+        a.setflags(write=False)
+    return tri_t, carry_t, pw
+
+
+def _ewm_scan(x: np.ndarray, alphas: Tuple[float, ...]) -> np.ndarray:
+    """(K, ..., n) سلاسل، α لكل K ⇒ EWM adjust=False على المحور الأخير في O(n·B):
+    z = α·x (z_0 = x_0)، y_k = Σ_{j≤k} β^(k-j)·z_j — داخل كل كتلة بطول B ضرب بمصفوفة B×B،
+    ثم قيمة نهاية كل كتلة تُحمل للكتل التالية (تكرار قصير بطول n/B بمصفوفة صغيرة).
+    المحاور الوسطى (رموز batch_features مثلاً) تُحسب مع K في نفس الضرب."""
+    K, n = x.shape[0], x.shape[-1]
+    xr = x.reshape(K, -1, n)
+    S = xr.shape[1]
+    nb = -(-n // EWM_BLOCK)
+    tri_t, carry_t, pw = _ewm_scan_mats(alphas, EWM_BLOCK, nb)
+    z = np.zeros((K, S, nb * EWM_BLOCK))
+    z[..., :n] = np.asarray(alphas)[:, None, None] * xr
+    z[..., 0] = xr[..., 0]
+    y = z.reshape(K, S, nb, EWM_BLOCK) @ tri_t[:, None]              # داخل الكتلة (بدءًا من صفر)
+    if nb > 1:
+        ends = (y[:, :, None, :, -1] @ carry_t[:, None])[:, :, 0, :]  # y في نهاية كل كتلة
+        y[:, :, 1:, :] += ends[:, :, :-1, None] * pw[:, None, None, :]
+    return y.reshape(K, S, -1)[..., :n].reshape(x.shape)
+
+
+def _rolling_mean_std0(x: np.ndarray, win: int, min_periods: int):
+    """rolling mean (min_periods) و std(ddof=0) بنافذة كاملة.
+    المجموع/min/max عبر إزاحات، والانحراف بمرور ثانٍ على sliding_window_view.
+    std لنافذة ثابتة (max==min) = 0 تمامًا كما في pandas (المرور المزدوج قد يترك ~1e-12)."""
+    n = len(x)
+    mean = np.full(n, np.nan)
+    std = np.full(n, np.nan)
+    if n >= win:
+        k = n - win + 1
+        s = x[:k].copy()
+        lo, hi = s.copy(), s.copy()
+        for j in range(1, win):
+            xj = x[j: k + j]
+            s += xj
+            np.minimum(lo, xj, out=lo)
+            np.maximum(hi, xj, out=hi)
+        m = s / win
+        d = sliding_window_view(x, win) - m[:, None]
+        sd = np.sqrt(np.einsum("ij,ij->i", d, d) / win)
+        sd[lo == hi] = 0.0
+        mean[win - 1:] = m
+        std[win - 1:] = sd
+    head = min(win - 1, n)
+    if head and min_periods < win:
+        cnt = np.arange(1, head + 1)
+        hm = np.cumsum(x[:head]) / cnt
+        hm[cnt < min_periods] = np.nan
+        mean[:head] = hm
+    return mean, std
+
+
+def _rolling_min(x: np.ndarray, win: int) -> np.ndarray:
+    """نوافذ قصيرة (NR4/NR7): min عبر إزاحات متتالية أرخص من sliding_window_view."""
+    n = len(x)
+    out = np.full(n, np.nan)
+    if n >= win:
+        m = x[: n - win + 1].copy()
+        for k in range(1, win):
+            np.minimum(m, x[k: n - win + 1 + k], out=m)
+        out[win - 1:] = m
+    return out
+
+
+def compute(o: np.ndarray, h: np.ndarray, l: np.ndarray, c: np.ndarray, v: np.ndarray,
+            atr_period: int = 14, vol_ma: int = 20) -> Dict[str, np.ndarray]:
+    """المؤشرات كمصفوفات بنفس أسماء أعمدة add_indicators."""
+    h, l, c, v = (np.ascontiguousarray(a, dtype=np.float64) for a in (h, l, c, v))
+    if np.isnan(h.sum() + l.sum() + c.sum() + v.sum()):
+        raise ValueError("NaN in OHLCV input")
+    n = len(c)
+    if n == 0:
+        raise ValueError("empty input")
+
+    d = np.empty(n); d[0] = np.nan; d[1:] = c[1:] - c[:-1]
+    gain = np.where(d > 0, d, 0.0)
+    loss = -np.where(d < 0, d, 0.0)
+    hl = np.abs(h - l)
+    tr = hl.copy()
+    if n > 1:
+        cp = c[:-1]
+        tr[1:] = np.maximum(hl[1:], np.maximum(np.abs(h[1:] - cp), np.abs(l[1:] - cp)))
+
+    # مرور واحد: EMAs الإغلاق ×6 + RSI(gain/loss) + ATR
+    x = np.empty((9, n))
+    x[:6] = c
+    x[6], x[7], x[8] = gain, loss, tr
+    e9, e21, e50, e200, efast, eslow, ag, al, atr = _ewm_scan(
+        x, CLOSE_ALPHAS + (1.0 / 14, 1.0 / 14, 1.0 / atr_period))
+    al = np.where(al == 0, 1e-9, al)
+    rsi = 100 - (100 / (1 + ag / al))
+
+    macd = efast - eslow
+    macd_signal = _ewm_scan(macd[None, :], (CLOSE_ALPHAS[0],))[0]      # span 9
+    macd_hist = macd - macd_signal
+
+    tp = (h + l + c) / 3.0
+    denom = np.cumsum(v)
+    denom = np.where(denom == 0, np.nan, denom)
+    vwap = np.cumsum(tp * v) / denom
+
+    rng = hl
+    nr7 = rng == _rolling_min(rng, 7)
+    nr4 = rng == _rolling_min(rng, 4)
+
+    m20, sd20 = _rolling_mean_std0(v, 20, 1)
+    sd20[sd20 == 0] = np.nan
+    vol_z20 = (v - m20) / sd20                 # قبل النافذة الكاملة sd=NaN ⇒ NaN كما في pandas
+    vma = m20 if vol_ma == 20 else _rolling_mean_std0(v, vol_ma, 1)[0]
+
+    return {
+        "ema9": e9, "ema21": e21, "ema50": e50, "ema200": e200, "rsi": rsi,
+        "vol_ma20": vma,
+        "ema_fast": efast, "ema_slow": eslow, "macd": macd, "macd_signal": macd_signal, "macd_hist": macd_hist,
+        "atr": atr, "vwap": vwap, "nr7": nr7, "nr4": nr4, "vol_z20": vol_z20,
+    }
+
+
+def add_indicators_np(df: pd.DataFrame, atr_period: int = 14, vol_ma: int = 20) -> pd.DataFrame:
+    """DataFrame جديد بنفس index والأعمدة الأصلية + أعمدة المؤشرات (بنفس ترتيب add_indicators)."""
+    cols = {k: s.to_numpy() for k, s in df.items()}
+    cols.update(compute(cols["open"], cols["high"], cols["low"], cols["close"], cols["volume"],
+                        atr_period=atr_period, vol_ma=vol_ma))
+    return pd.DataFrame(cols, index=df.index, copy=False)
+
@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+"""
+okx_async.py — محوّل OKX غير متزامن (asyncio) فوق جلسة HTTP مشتركة بنمط keep-alive.
+
+بدلاً من لفّ ccxt.okx المتزامن داخل run_in_executor (خيط لكل طلب)، نستخدم
+ccxt.async_support.okx مع aiohttp.ClientSession واحدة ومجمّع اتصالات محدود.
+كل الجلب في bot.py يمر عبر هذه الواجهة:
+
+    ex = OKXAsync()
+    await ex.load_markets_by_types(["spot", "swap"], logger)
+    rows = await ex.fetch_ohlcv("BTC/USDT:USDT", "5m", limit=300)
+    await ex.close()
+
+للاختبار/القياس بدون إنترنت: اضبط OKX_REST_BASE_URL على خادم fake_okx_server.py.
+"""
+
+from __future__ import annotations
+import asyncio
+import os
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional
+
+import aiohttp
+import ccxt.async_support as ccxt_async
+
+# ============== إعدادات عبر البيئة ==============
+OKX_REST_BASE_URL = os.getenv("OKX_REST_BASE_URL", "").strip().rstrip("/")  # فارغ = www.okx.com
+OKX_HTTP_POOL_SIZE = int(os.getenv("OKX_HTTP_POOL_SIZE", "32"))              # أقصى اتصالات مفتوحة
+OKX_HTTP_KEEPALIVE_SEC = float(os.getenv("OKX_HTTP_KEEPALIVE_SEC", "30"))     # إبقاء الاتصال الخامل
+OKX_HTTP_TIMEOUT_MS = int(os.getenv("OKX_HTTP_TIMEOUT_MS", "10000"))
+# ccxt لديه منظّم معدل داخلي؛ نعطّله افتراضيًا لأن bot.py يطبّق محدّده الخاص (RATE)
+OKX_CCXT_THROTTLE = os.getenv("OKX_CCXT_THROTTLE", "0") == "1"
+
+
+class OKXAsync:
+    """
+    غلاف رفيع حول ccxt.async_support.okx:
+    - جلسة aiohttp واحدة تُنشأ كسولًا داخل اللوب الجاري.
+    - نفس أسماء دوال ccxt (fetch_ohlcv/fetch_ticker/...) لكنها coroutines.
+    - markets/markets_by_id متاحة كخصائص للقراءة المتزامنة (بدون await).
+    """
+
+    def __init__(self, base_url: str | None = None, pool_size: int | None = None,
+                 keepalive_sec: float | None = None, timeout_ms: int | None = None,
+                 throttle: bool | None = None):
+        self.base_url = (base_url if base_url is not None else OKX_REST_BASE_URL) or ""
+        self.pool_size = int(pool_size or OKX_HTTP_POOL_SIZE)
+        self.keepalive_sec = float(keepalive_sec if keepalive_sec is not None else OKX_HTTP_KEEPALIVE_SEC)
+        self.timeout_ms = int(timeout_ms or OKX_HTTP_TIMEOUT_MS)
+        self.throttle = OKX_CCXT_THROTTLE if throttle is None else bool(throttle)
+        self._ex: Optional[ccxt_async.okx] = None
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._open_lock: Optional[asyncio.Lock] = None
+
+    # ---------- دورة الحياة ----------
+    async def _ensure(self) -> ccxt_async.okx:
+        if self._ex is not None:
+            return self._ex
+        if self._open_lock is None:
+            self._open_lock = asyncio.Lock()
+        async with self._open_lock:
+            if self._ex is None:
+                connector = aiohttp.TCPConnector(
+                    limit=self.pool_size,
+                    limit_per_host=self.pool_size,
+                    keepalive_timeout=self.keepalive_sec,
+                    ttl_dns_cache=300,
+                    enable_cleanup_closed=True,
+                )
+                self._session = aiohttp.ClientSession(connector=connector)
+                ex = ccxt_async.okx({
+                    "enableRateLimit": self.throttle,
+                    "timeout": self.timeout_ms,
+                    "session": self._session,
+                })
+                if self.base_url:
+                    ex.urls["api"] = {"rest": self.base_url}
+                self._ex = ex
+        return self._ex
+
+    async def close(self):
+        ex, sess = self._ex, self._session
+        self._ex = None
+        self._session = None
+        try:
+            if ex is not None:
+                await ex.close()
+        except Exception:
+            pass
+        try:
+            if sess is not None and not sess.closed:
+                await sess.close()
+        except Exception:
+            pass
+
+    # ---------- الأسواق ----------
+    @property
+    def markets(self) -> Dict[str, dict]:
+        return (self._ex.markets if self._ex is not None else None) or {}
+
+    @property
+    def markets_by_id(self) -> Dict[str, Any]:
+        return (self._ex.markets_by_id if self._ex is not None else None) or {}
+
+    async def fetch_markets_by_type(self, market_type: str, params: dict | None = None) -> List[dict]:
+        ex = await self._ensure()
+        return await ex.fetch_markets_by_type(market_type, params or {})
+
+    async def load_markets_by_types(self, types: Iterable[str], logger=None,
+                                    call: Optional[Callable[..., Awaitable[Any]]] = None) -> set:
+        """
+        يجلب الأسواق نوعًا بنوع مع فلترة المعطوبين (base/quote/symbol) ثم يحقنها عبر set_markets.
+        call(method, *args): مسار الطلب — bot يمرّر _okx_call (محدّد المعدل، عائلة instruments، AIMD)؛
+        الافتراضي استدعاء مباشر. يعيد set بالـ symbols الصحيحة.
+        """
+        ex = await self._ensure()
+        if call is None:
+            call = lambda method, *a: getattr(self, method)(*a)
+        types = list(types)
+        all_markets: List[dict] = []
+        total_bad = 0
+        for t in types:
+            try:
+                raw = await call("fetch_markets_by_type", t, {})
+            except Exception as e:
+                if logger: logger.warning(f"[okx] skip type {t}: {e}")
+                continue
+            good = [m for m in raw if m.get("base") and m.get("quote") and m.get("symbol")]
+            bad = len(raw) - len(good)
+            total_bad += bad
+            if bad and logger:
+                logger.info(f"[okx] filtered {bad} malformed {t} markets")
+            all_markets.extend(good)
+
+        if all_markets:
+            ex.set_markets(all_markets)
+        if logger:
+            logger.info(f"[okx] loaded {len(all_markets)} markets (filtered={total_bad}) from types={types}")
+        return set(self.markets.keys())
+
+    async def load_markets(self, reload: bool = False) -> Dict[str, dict]:
+        ex = await self._ensure()
+        return await ex.load_markets(reload)
+
+    def bar_of(self, timeframe: str) -> str:
+        """
+        صيغة bar التي يرسلها ccxt لـ OKX لهذا الإطار (مثل '4H' أو '1Dutc').
+        إصدارات ccxt الحديثة تضيف 'utc' للإطارات ≥ 6h عند options.fetchOHLCV.timezone == 'UTC'.
+        """
+        if self._ex is None:
+            return ""
+        bar = (self._ex.timeframes or {}).get(timeframe, "")
+        tz = ((self._ex.options or {}).get("fetchOHLCV") or {}).get("timezone")
+        try:
+            if bar and tz == "UTC" and self._ex.parse_timeframe(timeframe) >= 6 * 3600:
+                bar += "utc"
+        except Exception:
+            pass
+        return bar
+
+    # ---------- البيانات العامة ----------
+    async def fetch_ohlcv(self, symbol: str, timeframe: str = "5m", since: int | None = None,
+                          limit: int | None = None, params: dict | None = None) -> list:
+        ex = await self._ensure()
+        return await ex.fetch_ohlcv(symbol, timeframe=timeframe, since=since, limit=limit, params=params or {})
+
+    async def fetch_ticker(self, symbol: str, params: dict | None = None) -> dict:
+        ex = await self._ensure()
+        return await ex.fetch_ticker(symbol, params=params or {})
+
+    async def fetch_tickers(self, symbols: list[str] | None = None, params: dict | None = None) -> Dict[str, dict]:
+        ex = await self._ensure()
+        return await ex.fetch_tickers(symbols, params=params or {})
+
+    async def fetch_order_book(self, symbol: str, limit: int | None = None, params: dict | None = None) -> dict:
+        ex = await self._ensure()
+        return await ex.fetch_order_book(symbol, limit=limit, params=params or {})
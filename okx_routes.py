@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+"""
+okx_routes.py — جدول توجيه الرموز لـ OKX يُبنى مرة واحدة لكل تحميل أسواق.
+
+لكل رمز مُعدّ نحفظ:
+- الرمز الفعلي في ccxt (تفضيل السواب :USDT) و instType الصحيح (SWAP/SPOT) من بيانات السوق.
+- أيّ صيغة (variant) نجحت آخر مرة لكل نوع طلب (ticker/book) لتُجرَّب أولاً في المرة القادمة.
+- حجر صحي (quarantine) للرموز التي ترجع BadSymbol بدل إعادة المحاولة في كل دورة:
+  أول فشل ⇒ OKX_ROUTE_FIRST_STRIKE_SEC فقط (قد يكون عابرًا)، وتكراره خلال OKX_ROUTE_QUARANTINE_SEC
+  ⇒ الحجر الكامل OKX_ROUTE_QUARANTINE_SEC؛ أي نجاح يمسح العدّاد.
+  المفتاح دائمًا الرمز الفعلي (resolve) ⇒ مسارات OHLCV/التيكر/الدفتر ترى نفس الحجر.
+"""
+
+from __future__ import annotations
+import os
+import time
+from typing import Callable, Dict, List, Optional
+
+OKX_ROUTE_QUARANTINE_SEC = int(os.getenv("OKX_ROUTE_QUARANTINE_SEC", "3600"))
+OKX_ROUTE_FIRST_STRIKE_SEC = int(os.getenv("OKX_ROUTE_FIRST_STRIKE_SEC", "120"))
+
+
+def guess_inst_type(sym: str) -> str:
+    return "SWAP" if ":USDT" in (sym or "") else "SPOT"
+
+
+def other_inst_type(inst: str) -> str:
+    return "SPOT" if inst == "SWAP" else "SWAP"
+
+
+class SymbolRouter:
+    def __init__(self, adapt: Callable[[str, set], Optional[str]]):
+        self.adapt = adapt
+        self._keys: set = set()
+        self._markets: Dict[str, dict] = {}
+        self._effective: Dict[str, str] = {}
+        self._inst: Dict[str, str] = {}
+        self._winner: Dict[tuple, int] = {}        # (sym_eff, kind) -> index داخل variants
+        self._quarantine: Dict[str, float] = {}    # sym_eff -> حتى متى
+        self._strikes: Dict[str, tuple] = {}       # sym_eff -> (عدد مرات BadSymbol، وقت آخرها)
+        self.version = 0
+
+    # ---------- البناء ----------
+    def rebuild(self, markets: Dict[str, dict] | None):
+        self._markets = dict(markets or {})
+        self._keys = set(self._markets.keys())
+        self._effective.clear()
+        self._inst.clear()
+        self._winner.clear()
+        self.version += 1
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    # ---------- الرمز و instType ----------
+    def resolve(self, sym: str) -> str:
+        """الرمز الفعلي للجلب (بدون أي await). بدون أسواق محمّلة نعيد الرمز كما هو."""
+        eff = self._effective.get(sym)
+        if eff is not None:
+            return eff
+        if not self._keys:
+            return sym
+        try:
+            eff = self.adapt(sym, self._keys) or sym
+        except Exception:
+            eff = sym
+        self._effective[sym] = eff
+        return eff
+
+    def inst_type(self, sym_eff: str) -> str:
+        inst = self._inst.get(sym_eff)
+        if inst is not None:
+            return inst
+        inst = guess_inst_type(sym_eff)
+        m = self._markets.get(sym_eff)
+        if m:
+            if m.get("contract") or m.get("type") == "swap":
+                inst = "SWAP"
+            elif m.get("spot") or m.get("type") == "spot":
+                inst = "SPOT"
+        self._inst[sym_eff] = inst
+        return inst
+
+    # ---------- الصيغ (variants) ----------
+    def variants(self, sym_eff: str, kind: str) -> List[Optional[dict]]:
+        """instType الصحيح ثم العكس ثم بدون بارامترات؛ الصيغة الناجحة سابقًا أولاً."""
+        inst = self.inst_type(sym_eff)
+        base: List[Optional[dict]] = [{"instType": inst}, {"instType": other_inst_type(inst)}, None]
+        w = self._winner.get((sym_eff, kind))
+        if w:
+            base.insert(0, base.pop(w))
+        return base
+
+    def remember(self, sym_eff: str, kind: str, params: Optional[dict]):
+        self.forgive(sym_eff)
+        inst = self.inst_type(sym_eff)
+        order: List[Optional[dict]] = [{"instType": inst}, {"instType": other_inst_type(inst)}, None]
+        try:
+            self._winner[(sym_eff, kind)] = order.index(params)
+        except ValueError:
+            pass
+
+    # ---------- الحجر الصحي ----------
+    def quarantine(self, sym: str, ttl_sec: int | None = None) -> float:
+        """BadSymbol على sym (خام أو فعلي) ⇒ حجر قصير أول مرة، كامل عند التكرار. يعيد المدة."""
+        key = self.resolve(sym)
+        now = time.time()
+        if ttl_sec is None:
+            n, last = self._strikes.get(key, (0, 0.0))
+            n = n + 1 if now - last <= OKX_ROUTE_QUARANTINE_SEC else 1
+            self._strikes[key] = (n, now)
+            ttl_sec = OKX_ROUTE_FIRST_STRIKE_SEC if n <= 1 else OKX_ROUTE_QUARANTINE_SEC
+        self._quarantine[key] = now + ttl_sec
+        return float(ttl_sec)
+
+    def forgive(self, sym: str):
+        """طلب ناجح ⇒ لا يُحسب فشل سابق ضمن التكرار."""
+        if self._strikes:
+            self._strikes.pop(self.resolve(sym), None)
+
+    def is_quarantined(self, sym: str) -> bool:
+        key = self.resolve(sym)
+        until = self._quarantine.get(key)
+        if until is None:
+            return False
+        if time.time() >= until:
+            self._quarantine.pop(key, None)
+            return False
+        return True
+
+    def quarantined(self) -> Dict[str, float]:
+        now = time.time()
+        return {s: u - now for s, u in self._quarantine.items() if u > now}
@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+"""
+pivot_index.py — كشف القمم/القيعان المحورية (pivots) بنوافذ منزلقة + فهرس تراكمي لكل رمز.
+
+- pivot_mask: i محوري إذا x[i] == max(x[i-left : i+right+1]) (أو min للقيعان) — نفس تعريف
+  حلقة strategy._pivot_highs/_pivot_lows لكن بعملية sliding_window_view واحدة.
+- PivotIndexes: لكل رمز قمم الشموع المغلقة المؤكَّدة (نافذتها كلها مغلقة) مخزّنة مع طوابعها؛
+  مع كل شمعة مغلقة جديدة يُحسب فقط ذيل قصير (new + left + right) بدل إعادة المسح.
+  القمم التي تلمس الشمعة الجارية (آخر right مواضع) تُقيَّم لحظيًا في كل استدعاء لأنها تتغير.
+- أي عدم تطابق (فجوة، تعديل شمعة مغلقة، قفزة أكبر من PIVOT_INDEX_MAX_STEP) ⇒ إعادة بناء.
+
+tests/test_pivot_index.py: تغذية متتالية ومقارنة resistance_above بمسح النوافذ في strategy.
+"""
+
+from __future__ import annotations
+import os
+from collections import OrderedDict
+from typing import Hashable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+PIVOT_INDEX_MAX_STEP = int(os.getenv("PIVOT_INDEX_MAX_STEP", "8"))
+PIVOT_INDEX_MAX_KEYS = int(os.getenv("PIVOT_INDEX_MAX_KEYS", "2000"))
+
+
+def pivot_mask(x: np.ndarray, left: int = 2, right: int = 2, lows: bool = False) -> np.ndarray:
+    n = len(x)
+    out = np.zeros(n, dtype=bool)
+    if n >= left + right + 1:
+        w = sliding_window_view(x, left + right + 1)
+        ext = w.min(axis=1) if lows else w.max(axis=1)
+        out[left: n - right] = x[left: n - right] == ext
+    return out
+
+
+def pivots(x: np.ndarray, left: int = 2, right: int = 2, lows: bool = False) -> List[Tuple[int, float]]:
+    """[(موضع، قيمة)] بنفس ترتيب وناتج الحلقة القديمة."""
+    idx = np.flatnonzero(pivot_mask(x, left, right, lows))
+    return [(int(i), float(x[i])) for i in idx]
+
+
+class _Pivots:
+    __slots__ = ("ts", "high", "mask")
+
+    def __init__(self, ts: np.ndarray, high: np.ndarray, left: int, right: int):
+        self.ts = ts.copy()
+        self.high = high.copy()
+        self.mask = pivot_mask(self.high, left, right)
+
+
+class PivotIndexes:
+    """resistance_above(key, df, price, lookback) = nearest_resistance_above من الفهرس المخزّن."""
+
+    def __init__(self, left: int = 2, right: int = 2, max_step: int = PIVOT_INDEX_MAX_STEP,
+                 max_keys: int = PIVOT_INDEX_MAX_KEYS):
+        self.left, self.right = int(left), int(right)
+        self.max_step = max(1, int(max_step))
+        self.max_keys = max(1, int(max_keys))
+        self._st: "OrderedDict[Hashable, _Pivots]" = OrderedDict()
+        self.stats = {"full": 0, "same_bar": 0, "stepped": 0, "mismatch": 0, "evicted": 0}
+
+    def _advance(self, st: _Pivots, ts: np.ndarray, high: np.ndarray) -> bool:
+        m, m2 = len(st.ts), len(ts)
+        j = int(np.searchsorted(st.ts, ts[0]))
+        if j >= m or st.ts[j] != ts[0]:
+            return False
+        overlap = m - j
+        new = m2 - overlap
+        if new < 0 or new > self.max_step or j > self.max_step:
+            return False
+        if not (np.array_equal(st.ts[j:], ts[:overlap]) and np.array_equal(st.high[j:], high[:overlap])):
+            return False
+        if new == 0 and j == 0:
+            self.stats["same_bar"] += 1
+            return True
+        # نوافذ المواضع < overlap-right داخل الشموع القديمة ⇒ قيمتها ثابتة؛ الباقي يُحسب من ذيل قصير
+        start = max(0, overlap - self.right)
+        s0 = max(0, start - self.left)
+        mask = np.empty(m2, dtype=bool)
+        mask[:start] = st.mask[j: j + start]
+        mask[start:] = pivot_mask(high[s0:], self.left, self.right)[start - s0:]
+        st.ts, st.high, st.mask = ts.copy(), high.copy(), mask
+        self.stats["stepped"] += 1
+        return True
+
+    def _state(self, key: Hashable, ts: np.ndarray, high: np.ndarray) -> _Pivots:
+        st = self._st.get(key)
+        if st is not None:
+            self._st.move_to_end(key)
+            if self._advance(st, ts, high):
+                return st
+            self.stats["mismatch"] += 1
+        else:
+            self.stats["full"] += 1
+        st = self._st[key] = _Pivots(ts, high, self.left, self.right)
+        while len(self._st) > self.max_keys:
+            self._st.popitem(last=False)
+            self.stats["evicted"] += 1
+        return st
+
+    def resistance_above(self, key: Hashable, df: pd.DataFrame, price: float, lookback: int = 60) -> Optional[float]:
+        """أدنى قمة محورية فوق price ضمن df.tail(lookback+5) (الشمعة الجارية = آخر صف)."""
+        ts = df["timestamp"].to_numpy().astype(np.int64, copy=False)
+        high = df["high"].to_numpy(dtype=np.float64)
+        n = len(high)
+        if n < 2:
+            return None
+        st = self._state(key, ts[:-1], high[:-1])
+        lo_pos = max(0, n - (lookback + 5)) + self.left      # أول موضع مؤهل داخل الـ tail
+        hi_pos = n - self.right                               # حصري
+        cut = max(lo_pos, min(hi_pos, n - 1 - self.right))    # مواضع نافذتها مغلقة بالكامل < cut
+        vals = st.high[lo_pos:cut][st.mask[lo_pos:cut]]
+        # المواضع التي تلمس نافذتها الشمعة الجارية
+        live = [high[i] for i in range(cut, hi_pos)
+                if high[i] == high[i - self.left: i + self.right + 1].max()]
+        above = vals[vals > price]
+        best = float(above.min()) if len(above) else None
+        for v in live:
+            if v > price and (best is None or v < best):
+                best = float(v)
+        return best
+
+    def drop(self, key: Hashable = None):
+        if key is None:
+            self._st.clear()
+        else:
+            self._st.pop(key, None)
+
+    def snapshot(self) -> dict:
+        return dict(self.stats, keys=len(self._st))
+
@@ -0,0 +1,196 @@
+# -*- coding: utf-8 -*-
+"""
+rate_limiter.py — محدّد معدل Token-Bucket لكل عائلة endpoints في OKX مع تكيّف AIMD وطابور FIFO.
+
+- لكل عائلة (candles/tickers/ticker/books/instruments/...) ميزانية مستقلة: N طلب لكل W ثانية
+  كما في توثيق OKX (حدود عامة لكل IP)، مضروبة في OKX_RATE_SAFETY كهامش أمان.
+- كل طلب يكلّف وزنًا (weight) من التوكنات.
+- بعد RateLimitExceeded/DDoSProtection: المعدل يُضرب في OKX_RATE_BACKOFF (تقليص ضربي)،
+  ثم يتعافى خطيًا بمقدار OKX_RATE_RECOVER_PER_SEC من المعدل الأساسي كل ثانية.
+- المنتظرون يُوقظون بالترتيب (FIFO) عبر مؤقت واحد call_later — بدون polling.
+- stats: زمن الانتظار (مجموع/أقصى)، عمق الطابور الحالي والأقصى، عامل المعدل الحالي.
+"""
+
+from __future__ import annotations
+import asyncio
+import os
+import time
+from collections import deque
+from typing import Deque, Dict, Optional, Tuple
+
+from resample import tf_to_ms
+
+
+def _spec(env: str, default: str) -> Tuple[float, float]:
+    """'40/2' → (40 طلب, 2 ثانية)."""
+    raw = os.getenv(env, default)
+    try:
+        n, w = raw.split("/")
+        return float(n), float(w)
+    except Exception:
+        n, w = default.split("/")
+        return float(n), float(w)
+
+
+OKX_RATE_SAFETY = float(os.getenv("OKX_RATE_SAFETY", "0.85"))
+OKX_RATE_BACKOFF = float(os.getenv("OKX_RATE_BACKOFF", "0.5"))
+OKX_RATE_MIN_FACTOR = float(os.getenv("OKX_RATE_MIN_FACTOR", "0.1"))
+OKX_RATE_RECOVER_PER_SEC = float(os.getenv("OKX_RATE_RECOVER_PER_SEC", "0.02"))
+
+# حدود OKX v5 العامة (طلب/نافذة) — قابلة للتعديل عبر البيئة
+OKX_FAMILY_LIMITS: Dict[str, Tuple[float, float]] = {
+    "candles":         _spec("OKX_RATE_CANDLES", "40/2"),
+    "history_candles": _spec("OKX_RATE_HISTORY_CANDLES", "20/2"),
+    "ticker":          _spec("OKX_RATE_TICKER", "20/2"),
+    "tickers":         _spec("OKX_RATE_TICKERS", "20/2"),
+    "books":           _spec("OKX_RATE_BOOKS", "40/2"),
+    "instruments":     _spec("OKX_RATE_INSTRUMENTS", "20/2"),
+}
+
+# OKX يخدم /market/candles لآخر 1440 شمعة فقط؛ since أقدم ⇒ ccxt يستخدم /market/history-candles
+# (نفس الحد في ccxt.okx.fetch_ohlcv) وهو بميزانية مستقلة أصغر
+OKX_RECENT_CANDLES = int(os.getenv("OKX_RECENT_CANDLES", "1440"))
+
+def ohlcv_family(timeframe: str = "5m", since: Optional[int] = None, now_ms: Optional[int] = None) -> str:
+    """candles أو history_candles حسب أي endpoint سيخدم الطلب فعليًا."""
+    if since is None:
+        return "candles"
+    now_ms = int(time.time() * 1000) if now_ms is None else int(now_ms)
+    border = now_ms - (OKX_RECENT_CANDLES - 1) * tf_to_ms(timeframe or "5m")
+    return "history_candles" if int(since) < border else "candles"
+
+
+# method → (family, weight)؛ fetch_ohlcv يُعاد تصنيفه حسب since (ohlcv_family)
+METHOD_FAMILY: Dict[str, Tuple[str, float]] = {
+    "fetch_ohlcv":           ("candles", 1.0),
+    "fetch_ticker":          ("ticker", 1.0),
+    "fetch_tickers":         ("tickers", 1.0),
+    "fetch_order_book":      ("books", 1.0),
+    "load_markets":          ("instruments", 2.0),   # spot + swap
+    "fetch_markets_by_type": ("instruments", 1.0),   # load_markets_by_types: طلب لكل نوع
+}
+
+
+class TokenBucket:
+    def __init__(self, max_calls: float, window_sec: float, safety: float = 1.0):
+        self.base_rate = max(0.01, float(max_calls) * float(safety) / float(window_sec))  # توكن/ثانية
+        self.capacity = max(1.0, float(max_calls) * float(safety))
+        self.factor = 1.0
+        self.tokens = self.capacity
+        self._last = time.monotonic()
+        self._waiters: Deque[Tuple[float, asyncio.Future]] = deque()
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self.stats = {"acquired": 0, "waited": 0, "wait_total_sec": 0.0, "wait_max_sec": 0.0,
+                      "queue_max": 0, "penalties": 0}
+
+    @property
+    def rate(self) -> float:
+        return self.base_rate * self.factor
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._waiters)
+
+    def _refill(self):
+        now = time.monotonic()
+        dt = now - self._last
+        self._last = now
+        if dt <= 0:
+            return
+        if self.factor < 1.0:
+            self.factor = min(1.0, self.factor + OKX_RATE_RECOVER_PER_SEC * dt)
+        self.tokens = min(self.capacity, self.tokens + dt * self.rate)
+
+    def _drain(self):
+        self._timer = None
+        self._refill()
+        while self._waiters:
+            cost, fut = self._waiters[0]
+            if fut.done():                      # أُلغي المنتظر
+                self._waiters.popleft()
+                continue
+            if self.tokens < cost:
+                break
+            self.tokens -= cost
+            self._waiters.popleft()
+            fut.set_result(None)
+        if self._waiters:
+            cost = self._waiters[0][0]
+            delay = max(0.005, (cost - self.tokens) / self.rate)
+            self._timer = asyncio.get_running_loop().call_later(delay, self._drain)
+
+    async def acquire(self, cost: float = 1.0) -> float:
+        """ينتظر حتى تتوفر التوكنات ويعيد زمن الانتظار بالثواني."""
+        cost = min(float(cost), self.capacity)
+        self._refill()
+        self.stats["acquired"] += 1
+        if not self._waiters and self.tokens >= cost:
+            self.tokens -= cost
+            return 0.0
+        t0 = time.monotonic()
+        fut = asyncio.get_running_loop().create_future()
+        self._waiters.append((cost, fut))
+        self.stats["queue_max"] = max(self.stats["queue_max"], len(self._waiters))
+        if self._timer is None:
+            self._drain()
+        try:
+            await fut
+        except asyncio.CancelledError:
+            # إن كان قد مُنح التوكن قبل الإلغاء نعيده للسلة
+            if fut.done() and not fut.cancelled():
+                self.tokens = min(self.capacity, self.tokens + cost)
+            raise
+        waited = time.monotonic() - t0
+        self.stats["waited"] += 1
+        self.stats["wait_total_sec"] += waited
+        self.stats["wait_max_sec"] = max(self.stats["wait_max_sec"], waited)
+        return waited
+
+    def penalize(self):
+        """تقليص ضربي بعد 429/حماية DDoS + تفريغ السلة."""
+        self._refill()
+        self.factor = max(OKX_RATE_MIN_FACTOR, self.factor * OKX_RATE_BACKOFF)
+        self.tokens = min(self.tokens, 0.0)
+        self.stats["penalties"] += 1
+
+
+class EndpointRateLimiter:
+    def __init__(self, limits: Dict[str, Tuple[float, float]] | None = None,
+                 default: Tuple[float, float] = (18, 2), safety: float | None = None):
+        safety = OKX_RATE_SAFETY if safety is None else float(safety)
+        self.buckets: Dict[str, TokenBucket] = {
+            fam: TokenBucket(n, w, safety) for fam, (n, w) in (limits or OKX_FAMILY_LIMITS).items()
+        }
+        self.buckets.setdefault("default", TokenBucket(default[0], default[1], 1.0))
+
+    @staticmethod
+    def family_of(method: str, kwargs: Optional[dict] = None) -> Tuple[str, float]:
+        fam, weight = METHOD_FAMILY.get(method, ("default", 1.0))
+        if method == "fetch_ohlcv" and kwargs:
+            fam = ohlcv_family(kwargs.get("timeframe") or "5m", kwargs.get("since"))
+        return fam, weight
+
+    def bucket(self, family: str) -> TokenBucket:
+        return self.buckets.get(family) or self.buckets["default"]
+
+    async def wait(self, family: str = "default", weight: float = 1.0) -> float:
+        return await self.bucket(family).acquire(weight)
+
+    def penalize(self, family: str):
+        self.bucket(family).penalize()
+
+    def snapshot(self) -> Dict[str, dict]:
+        out = {}
+        for fam, b in self.buckets.items():
+            st = b.stats
+            out[fam] = {
+                "rate": round(b.rate, 2),
+                "factor": round(b.factor, 2),
+                "queue": b.queue_depth,
+                "queue_max": st["queue_max"],
+                "acquired": st["acquired"],
+                "wait_avg_ms": round(1000 * st["wait_total_sec"] / st["waited"], 1) if st["waited"] else 0.0,
+                "wait_max_ms": round(1000 * st["wait_max_sec"], 1),
+                "penalties": st["penalties"],
+            }
+        return out
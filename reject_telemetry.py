@@ -0,0 +1,196 @@
+# -*- coding: utf-8 -*-
+"""
+reject_telemetry.py — تيليمتري أسباب الرفض بعدد مفاتيح محدود (مرحلة × رمز × قيمة رقمية).
+
+- كل رفض = (phase, stage, symbol, value): phase = pre (ltf_precheck) أو check (check_signal)،
+  stage من قائمة ثابتة بترتيب البوابات (STAGES) تُستنتج من بادئة الرسالة، و value رقم اختياري
+  (atr_pct، rvol، score، ...) يدخل مدرّجًا تكراريًا ثابت الحدود لكل مرحلة.
+- العدّادات مصفوفات ثابتة الحجم (phase × stage) + عدد التقييمات لكل phase ⇒ قمع التحويل لكل بوابة:
+  entered = evaluated - مرفوضات المراحل السابقة، pass% = 1 - rejected/entered.
+- أكثر الرموز رفضًا لكل مرحلة: عدّاد بحد أقصى REJECT_TOP_SYMBOLS مفتاحًا (الزائد في "_other").
+- الطباعة مقيّدة: عيّنة 1 من REJECT_LOG_SAMPLE + حد REJECT_LOG_PER_MIN لكل مرحلة في الدقيقة.
+- تصفير يومي (UTC)؛ عمّال strategy_pool يُرجعون drain() (فروقات صغيرة) تُدمج بـ merge().
+"""
+
+from __future__ import annotations
+import os
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+REJECT_LOG_SAMPLE = max(1, int(os.getenv("REJECT_LOG_SAMPLE", "20")))
+REJECT_LOG_PER_MIN = int(os.getenv("REJECT_LOG_PER_MIN", "30"))
+REJECT_TOP_SYMBOLS = int(os.getenv("REJECT_TOP_SYMBOLS", "500"))
+
+PHASES = ("pre", "check")
+# بترتيب البوابات في check_signal (precheck يستخدم أول جزء منها بنفس الترتيب)
+STAGES = ("data", "outlier", "parabolic", "duplicate", "holdout", "liquidity", "atr_band", "rvol",
+          "market_guard", "close_open", "align", "runup", "setup", "exhaustion", "risk", "t1_gap",
+          "bounds", "resistance", "score", "other")
+_STAGE_IDX = {s: i for i, s in enumerate(STAGES)}
+
+# بادئة الرسالة ⇒ المرحلة (أطول البادئات أولاً حيث تتداخل)
+_PREFIXES: Tuple[Tuple[str, str], ...] = (
+    ("insufficient_bars", "data"), ("after_", "data"),
+    ("bar_outlier", "outlier"),
+    ("parabolic_macd", "parabolic"), ("parabolic_runup", "runup"),
+    ("duplicate_", "duplicate"), ("holdout<", "holdout"),
+    ("low_quote_vol", "liquidity"),
+    ("atr_pct_outside", "atr_band"), ("atr_band_invalid", "atr_band"),
+    ("rvol<", "rvol"), ("market_guard", "market_guard"), ("close<=open", "close_open"),
+    ("ema/vwap/avwap_align", "align"), ("no_setup_match", "setup"), ("exhaustion_guard", "exhaustion"),
+    ("R_too_small", "risk"), ("t1_entry_gap", "t1_gap"), ("bounds_invalid", "bounds"),
+    ("near_resistance", "resistance"), ("score<", "score"),
+)
+
+# حدود المدرّج لكل مرحلة لها قيمة (القيمة خارج الحدود تذهب للطرفين)
+HIST_EDGES: Dict[str, np.ndarray] = {
+    "atr_band": np.array([0.001, 0.002, 0.003, 0.005, 0.0075, 0.01, 0.015, 0.02, 0.03, 0.05]),   # ATR%
+    "rvol": np.array([0.25, 0.5, 0.6, 0.7, 0.8, 0.9, 1.0, 1.2, 1.5]),                            # rvol
+    "parabolic": np.array([0.02, 0.03, 0.04, 0.06, 0.1]),                                          # ATR%
+    "exhaustion": np.array([60, 65, 70, 75, 80, 85, 90]),                                          # RSI
+    "resistance": np.array([0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7]),                                   # R
+    "t1_gap": np.array([0.001, 0.002, 0.004, 0.006, 0.008, 0.01]),                                 # (t1-entry)/entry
+    "score": np.array([30, 40, 45, 50, 55, 60, 65, 70, 75]),                                       # score
+}
+_HIST_IDX = {i: HIST_EDGES[s] for i, s in enumerate(STAGES) if s in HIST_EDGES}
+_HIST_BINS = max(len(e) for e in HIST_EDGES.values()) + 1
+
+
+def stage_of(msg: str) -> str:
+    for p, stage in _PREFIXES:
+        if msg.startswith(p):
+            return stage
+    return "other"
+
+
+def _day() -> str:
+    return datetime.utcnow().strftime("%Y-%m-%d")
+
+
+class RejectTelemetry:
+    def __init__(self, log_sample: int = REJECT_LOG_SAMPLE, log_per_min: int = REJECT_LOG_PER_MIN,
+                 top_symbols: int = REJECT_TOP_SYMBOLS):
+        self.log_sample = max(1, int(log_sample))
+        self.log_per_min = int(log_per_min)
+        self.top_symbols = max(1, int(top_symbols))
+        self.phase = 0
+        self._log_n = 0
+        self._log_win = np.zeros(len(STAGES), dtype=np.int64)
+        self._log_min = 0
+        self.reset()
+
+    def reset(self):
+        self.day = _day()
+        self.evaluated = np.zeros(len(PHASES), dtype=np.int64)
+        self.passed = np.zeros(len(PHASES), dtype=np.int64)
+        self.rejected = np.zeros((len(PHASES), len(STAGES)), dtype=np.int64)
+        self.hist = np.zeros((len(PHASES), len(STAGES), _HIST_BINS), dtype=np.int64)
+        self.by_symbol: List[Dict[str, int]] = [dict() for _ in STAGES]
+        self.log_dropped = 0
+
+    def _roll(self):
+        d = _day()
+        if d != self.day:
+            self.reset()
+
+    # ---------- التسجيل ----------
+    def begin(self, phase: str):
+        """بداية تقييم رمز (pre أو check)."""
+        self._roll()
+        self.phase = PHASES.index(phase)
+        self.evaluated[self.phase] += 1
+
+    def passed_one(self):
+        self.passed[self.phase] += 1
+
+    def record(self, symbol: str, msg: str, value: Optional[float] = None) -> int:
+        """يعيد رقم المرحلة."""
+        self._roll()
+        si = _STAGE_IDX[stage_of(msg)]
+        self._add(self.phase, si, symbol, value, 1)
+        return si
+
+    def _add(self, ph: int, si: int, symbol: str, value: Optional[float], n: int):
+        self.rejected[ph, si] += n
+        if value is not None and si in _HIST_IDX:
+            try:
+                b = int(np.searchsorted(_HIST_IDX[si], float(value), side="right"))
+                self.hist[ph, si, b] += n
+            except Exception:
+                pass
+        bs = self.by_symbol[si]
+        key = symbol if (symbol in bs or len(bs) < self.top_symbols) else "_other"
+        bs[key] = bs.get(key, 0) + n
+
+    def should_log(self, stage_idx: int) -> bool:
+        """عيّنة 1/N + حد لكل مرحلة في الدقيقة."""
+        self._log_n += 1
+        if self._log_n % self.log_sample:
+            return False
+        m = int(time.time() // 60)
+        if m != self._log_min:
+            self._log_min = m
+            self._log_win[:] = 0
+        if self.log_per_min > 0 and self._log_win[stage_idx] >= self.log_per_min:
+            self.log_dropped += 1
+            return False
+        self._log_win[stage_idx] += 1
+        return True
+
+    # ---------- عمّال strategy_pool ----------
+    def drain(self) -> dict:
+        """الفروقات منذ آخر drain (صغيرة: مصفوفات ثابتة + رموز هذا الطلب فقط) ثم تصفير."""
+        out = {"day": self.day, "evaluated": self.evaluated, "passed": self.passed, "rejected": self.rejected,
+               "hist": self.hist, "by_symbol": [(i, d) for i, d in enumerate(self.by_symbol) if d]}
+        self.reset()
+        return out
+
+    def merge(self, d: dict):
+        self._roll()
+        if not d or d.get("day") != self.day:
+            return
+        self.evaluated += d["evaluated"]
+        self.passed += d["passed"]
+        self.rejected += d["rejected"]
+        self.hist += d["hist"]
+        for si, syms in d["by_symbol"]:
+            for sym, n in syms.items():
+                bs = self.by_symbol[si]
+                key = sym if (sym in bs or len(bs) < self.top_symbols) else "_other"
+                bs[key] = bs.get(key, 0) + n
+
+    # ---------- العرض ----------
+    def funnel(self, phase: str = "check") -> List[dict]:
+        """لكل مرحلة: entered / rejected / pass% / share% من كل الرفض + أكثر الرموز وأكثر خانة في المدرّج."""
+        self._roll()
+        ph = PHASES.index(phase)
+        entered = int(self.evaluated[ph])
+        total = int(self.rejected[ph].sum()) or 1
+        rows = []
+        for si, stage in enumerate(STAGES):
+            r = int(self.rejected[ph, si])
+            if r == 0:
+                continue
+            top = sorted(self.by_symbol[si].items(), key=lambda kv: -kv[1])[:3]
+            mode = None
+            if stage in HIST_EDGES and self.hist[ph, si].any():
+                b = int(self.hist[ph, si].argmax())
+                e = HIST_EDGES[stage]
+                mode = (None if b == 0 else float(e[b - 1]), None if b >= len(e) else float(e[b]))
+            rows.append({"stage": stage, "entered": entered, "rejected": r,
+                         "pass_pct": round(100.0 * (1 - r / entered), 1) if entered else 0.0,
+                         "share_pct": round(100.0 * r / total, 1), "top": top, "mode": mode})
+            entered -= r
+        return rows
+
+    def snapshot(self) -> dict:
+        self._roll()
+        return {"day": self.day, "evaluated": dict(zip(PHASES, self.evaluated.tolist())),
+                "passed": dict(zip(PHASES, self.passed.tolist())),
+                "rejected": {p: {s: int(n) for s, n in zip(STAGES, self.rejected[i]) if n}
+                             for i, p in enumerate(PHASES)},
+                "log_dropped": self.log_dropped}
+
@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+"""
+resample.py — بناء شموع الإطارات الأعلى (H4/D1) محليًا من إطار أساس مخزّن (H1).
+
+- المحاذاة على حدود المنصة: بداية الشمعة = floor((ts - offset) / T) * T + offset.
+  شموع OKX من 6H فأعلى بدون لاحقة "utc" (مثل "1D") تبدأ بتوقيت هونغ كونغ (UTC+8)
+  ⇒ offset = 16:00 UTC لليومي. H4 تتطابق في الحالتين (8 يقبل القسمة على 4).
+- open أول شمعة، high أعلى، low أدنى، close آخر شمعة، volume مجموع.
+- الدلو الأول الناقص (تاريخ مقطوع) يُحذف؛ الدلو الأخير يُبقى كشمعة "قيد التكوين"
+  تمامًا كما تعيدها المنصة.
+- compare_bars للتحقق: يقارن الشموع المغلقة المشتركة مع شموع المنصة.
+"""
+
+from __future__ import annotations
+from typing import List, Optional
+
+import numpy as np
+
+HK_OFFSET_MS = 8 * 3600 * 1000
+
+
+_TF_UNIT_MS = {"s": 1000, "m": 60_000, "h": 3_600_000, "H": 3_600_000, "d": 86_400_000, "D": 86_400_000,
+               "w": 604_800_000, "W": 604_800_000, "M": 2_592_000_000}
+
+
+def tf_to_ms(tf: str) -> int:
+    """مدة الإطار بصيغة ccxt/OKX ("5m", "1h"/"1H", "1D", "1M" = شهر) — المحلل الوحيد (candle_store،
+    rate_limiter، bot). صيغة غير معروفة ⇒ ValueError."""
+    tf = (tf or "").strip()
+    try:
+        return int(tf[:-1]) * _TF_UNIT_MS[tf[-1]]
+    except (ValueError, KeyError, IndexError):
+        raise ValueError(f"bad timeframe: {tf!r}") from None
+
+
+def okx_bar_offset_ms(tf: str, bar: Optional[str]) -> int:
+    """إزاحة بداية الشمعة عن UTC حسب صيغة bar التي يرسلها ccxt لـ OKX."""
+    dur = tf_to_ms(tf)
+    if bar and bar.endswith("utc"):
+        return 0
+    if dur >= 6 * 3_600_000:
+        return (-HK_OFFSET_MS) % dur
+    return 0
+
+
+def resample_ohlcv(rows: List[list], base_tf: str, target_tf: str, offset_ms: int = 0) -> List[list]:
+    """rows بصيغة ccxt مرتبة تصاعديًا → شموع target_tf بنفس الصيغة."""
+    if not rows:
+        return []
+    base_ms, tgt_ms = tf_to_ms(base_tf), tf_to_ms(target_tf)
+    if tgt_ms % base_ms:
+        raise ValueError(f"{target_tf} is not a multiple of {base_tf}")
+    per = tgt_ms // base_ms
+    a = np.asarray(rows, dtype=np.float64)
+    ts = a[:, 0].astype(np.int64)
+    bucket = (ts - offset_ms) // tgt_ms * tgt_ms + offset_ms
+    starts = np.flatnonzero(np.r_[True, bucket[1:] != bucket[:-1]])
+    ends = np.r_[starts[1:], len(a)] - 1
+    counts = ends - starts + 1
+
+    o = a[starts, 1]
+    h = np.maximum.reduceat(a[:, 2], starts)
+    l = np.minimum.reduceat(a[:, 3], starts)
+    c = a[ends, 4]
+    v = np.add.reduceat(a[:, 5], starts)
+    bts = bucket[starts]
+
+    keep = np.ones(len(starts), dtype=bool)
+    # أول دلو ناقص = تاريخ مقطوع لا يمثل شمعة المنصة
+    if len(starts) > 1 and (counts[0] < per or ts[0] != bts[0]):
+        keep[0] = False
+    out = []
+    for i in np.flatnonzero(keep):
+        out.append([int(bts[i]), float(o[i]), float(h[i]), float(l[i]), float(c[i]), float(v[i])])
+    return out
+
+
+def compare_bars(local: List[list], remote: List[list], rtol_px: float = 1e-9, rtol_vol: float = 1e-4) -> dict:
+    """يقارن الشموع المغلقة المشتركة (يستبعد آخر شمعة من كل جانب)."""
+    lm = {int(r[0]): r for r in local[:-1]}
+    checked = mismatched = 0
+    first_bad = None
+    for r in remote[:-1]:
+        lr = lm.get(int(r[0]))
+        if lr is None:
+            continue
+        checked += 1
+        ok = all(abs(float(lr[k]) - float(r[k])) <= rtol_px * max(1.0, abs(float(r[k]))) for k in (1, 2, 3, 4))
+        rv = float(r[5] or 0.0)
+        ok = ok and abs(float(lr[5]) - rv) <= rtol_vol * max(1.0, abs(rv))
+        if not ok:
+            mismatched += 1
+            if first_bad is None:
+                first_bad = (int(r[0]), list(lr), list(r))
+    return {"checked": checked, "mismatched": mismatched, "first_bad": first_bad}
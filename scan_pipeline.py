@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+"""
+scan_pipeline.py — خط معالجة مرحلي (fetch → compute → dispatch) بطوابير محدودة بين المراحل.
+
+- كل مرحلة لها عدد عمّال مستقل (حد التوازي) وطابور دخل بحجم أقصى (maxsize)؛
+  إن امتلأ طابور مرحلة لاحقة ينتظر عمّال المرحلة السابقة ⇒ ضغط عكسي (back-pressure)
+  بدل تكديس النتائج في الذاكرة.
+- دالة المرحلة async تأخذ العنصر وتعيد العنصر التالي، أو None لإسقاطه (رفض/لا إشارة).
+- استثناء داخل دالة المرحلة يُسجَّل ويُسقط العنصر فقط؛ لا يوقف الخط.
+- لا دفعات (batches): رمز بطيء يشغل عاملاً واحدًا فقط والبقية تتابع.
+- stats لكل مرحلة: in/out/dropped/errors، زمن الانشغال، وأقصى عمق للطابور.
+- deadline اختياري (time.monotonic): بعده لا يُغذّى عنصر جديد، وما دخل الخط يكتمل؛
+  عدد العناصر غير المُغذّاة في snapshot()["unfed"] ليحملها المستدعي للدورة التالية.
+"""
+
+from __future__ import annotations
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Iterable, List, Optional
+
+logger = logging.getLogger("scan_pipeline")
+
+_DONE = object()
+
+
+class Stage:
+    def __init__(self, name: str, fn: Callable[[Any], Awaitable[Optional[Any]]],
+                 workers: int = 1, queue_size: int = 0):
+        self.name = name
+        self.fn = fn
+        self.workers = max(1, int(workers))
+        self.queue_size = max(0, int(queue_size))
+        self.stats = {"in": 0, "out": 0, "dropped": 0, "errors": 0,
+                      "busy_sec": 0.0, "queue_max": 0}
+
+    def reset_stats(self):
+        for k in self.stats:
+            self.stats[k] = 0.0 if k == "busy_sec" else 0
+
+
+class Pipeline:
+    def __init__(self, stages: List[Stage]):
+        if not stages:
+            raise ValueError("pipeline needs at least one stage")
+        self.stages = stages
+        self.last_run = {"items": 0, "unfed": 0, "elapsed_sec": 0.0}
+
+    async def _worker(self, st: Stage, q_in: asyncio.Queue, q_out: Optional[asyncio.Queue]):
+        while True:
+            st.stats["queue_max"] = max(st.stats["queue_max"], q_in.qsize())
+            item = await q_in.get()
+            if item is _DONE:
+                q_in.task_done()
+                return
+            st.stats["in"] += 1
+            t0 = time.perf_counter()
+            try:
+                res = await st.fn(item)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                st.stats["errors"] += 1
+                logger.warning(f"⚠️ [{st.name}] error: {e}")
+                res = None
+            finally:
+                st.stats["busy_sec"] += time.perf_counter() - t0
+                q_in.task_done()
+            if res is None:
+                st.stats["dropped"] += 1
+                continue
+            st.stats["out"] += 1
+            if q_out is not None:
+                await q_out.put(res)                      # ينتظر إن امتلأ الطابور التالي
+
+    async def run(self, items: Iterable[Any], deadline: Optional[float] = None) -> dict:
+        """يشغّل العناصر عبر كل المراحل ويعود بعد تفريغ الخط بالكامل (أو توقف التغذية عند deadline)."""
+        t0 = time.perf_counter()
+        for st in self.stages:
+            st.reset_stats()
+        queues = [asyncio.Queue(maxsize=st.queue_size) for st in self.stages]
+        groups: List[List[asyncio.Task]] = []
+        for i, st in enumerate(self.stages):
+            q_out = queues[i + 1] if i + 1 < len(queues) else None
+            groups.append([asyncio.create_task(self._worker(st, queues[i], q_out))
+                           for _ in range(st.workers)])
+        n = unfed = 0
+        try:
+            for it in items:
+                if deadline is not None and time.monotonic() >= deadline:
+                    unfed += 1
+                    continue
+                await queues[0].put(it)
+                n += 1
+            # إغلاق متسلسل: بعد انتهاء عمّال مرحلة نرسل إشارة الإنهاء للمرحلة التالية
+            for i, st in enumerate(self.stages):
+                for _ in range(st.workers):
+                    await queues[i].put(_DONE)
+                await asyncio.gather(*groups[i])
+        finally:
+            for g in groups:
+                for t in g:
+                    if not t.done():
+                        t.cancel()
+        self.last_run = {"items": n, "unfed": unfed, "elapsed_sec": round(time.perf_counter() - t0, 3)}
+        return self.snapshot()
+
+    def snapshot(self) -> dict:
+        out = dict(self.last_run)
+        for st in self.stages:
+            out[st.name] = dict(st.stats, workers=st.workers, busy_sec=round(st.stats["busy_sec"], 3))
+        return out
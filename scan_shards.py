@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+"""
+scan_shards.py — تقسيم كون الرموز أفقيًا بين عدة عمّال (SHARD_MODE=1).
+
+- كل رمز يُحوَّل إلى هاش ثابت 32-bit (crc32 للرمز بعد التطبيع: BTC/USDT و BTC/USDT:USDT نفس الهاش).
+- العمّال الأحياء (نبض خلال SHARD_TTL_SEC) مرتبين بالمعرّف؛ العامل رقم i من n يطالب بالنطاق
+  [i·2³²/n, (i+1)·2³²/n) ويكتبه في scan_workers مع كل نبضة.
+- موت عامل = يتوقف نبضه ⇒ يختفي من القائمة خلال TTL ⇒ يعيد الباقون حساب نطاقاتهم (إعادة توازن).
+- إن فشل نبض هذا العامل أطول من TTL يتخلى عن نطاقه (لا يفحص شيئًا) حتى لا يتداخل مع من ورثه.
+- عمليات قاعدة البيانات متزامنة ⇒ تُشغَّل عبر asyncio.to_thread.
+"""
+
+from __future__ import annotations
+import asyncio
+import logging
+import os
+import time
+import zlib
+from typing import Callable, Dict, List, Optional, Tuple
+
+from database import heartbeat_scan_worker, list_live_scan_workers, remove_scan_worker, prune_scan_workers
+
+SHARD_MODE = os.getenv("SHARD_MODE", "0") == "1"
+SHARD_HEARTBEAT_SEC = int(os.getenv("SHARD_HEARTBEAT_SEC", "20"))
+SHARD_TTL_SEC = int(os.getenv("SHARD_TTL_SEC", "75"))
+SHARD_OUTBOX_POLL_SEC = float(os.getenv("SHARD_OUTBOX_POLL_SEC", "2"))
+
+HASH_SPACE = 1 << 32
+
+logger = logging.getLogger("scan_shards")
+
+
+def symbol_hash(sym: str) -> int:
+    s = (sym or "").upper().split(":")[0].replace("-", "/")
+    return zlib.crc32(s.encode("utf-8")) & 0xFFFFFFFF
+
+
+def ranges_for(worker_ids: List[str]) -> Dict[str, Tuple[int, int]]:
+    ids = sorted(worker_ids)
+    n = len(ids)
+    return {w: (i * HASH_SPACE // n, (i + 1) * HASH_SPACE // n) for i, w in enumerate(ids)}
+
+
+class ShardCoordinator:
+    def __init__(self, worker_id: str, ttl_sec: int = SHARD_TTL_SEC, heartbeat_sec: int = SHARD_HEARTBEAT_SEC):
+        self.worker_id = worker_id
+        self.ttl_sec = int(ttl_sec)
+        self.heartbeat_sec = int(heartbeat_sec)
+        self.range: Tuple[int, int] = (0, 0)      # لا شيء قبل أول مزامنة
+        self.workers: List[str] = []
+        self.owned = 0
+        self._last_ok = 0.0
+        self.stats = {"syncs": 0, "errors": 0, "rebalances": 0}
+
+    # ---------- الملكية ----------
+    def _active_range(self) -> Tuple[int, int]:
+        if time.time() - self._last_ok > self.ttl_sec:
+            return (0, 0)
+        return self.range
+
+    def owns(self, sym: str) -> bool:
+        lo, hi = self._active_range()
+        return lo <= symbol_hash(sym) < hi
+
+    def filter(self, symbols: List[str]) -> List[str]:
+        lo, hi = self._active_range()
+        out = [s for s in symbols if lo <= symbol_hash(s) < hi]
+        self.owned = len(out)
+        return out
+
+    # ---------- المزامنة ----------
+    def _sync_blocking(self, is_leader: bool):
+        lo, hi = self.range
+        heartbeat_scan_worker(self.worker_id, lo, hi, self.owned, is_leader)
+        live = [w["worker_id"] for w in list_live_scan_workers(self.ttl_sec)]
+        if self.worker_id not in live:
+            live.append(self.worker_id)
+        new_range = ranges_for(live)[self.worker_id]
+        if new_range != self.range:
+            # نكتب النطاق الجديد فورًا ليظهر للآخرين في /data_stats
+            heartbeat_scan_worker(self.worker_id, new_range[0], new_range[1], self.owned, is_leader)
+        return sorted(live), new_range
+
+    async def sync(self, is_leader: bool = False) -> bool:
+        try:
+            live, new_range = await asyncio.to_thread(self._sync_blocking, is_leader)
+        except Exception as e:
+            self.stats["errors"] += 1
+            logger.warning(f"[shards] heartbeat failed: {e}")
+            return False
+        if new_range != self.range:
+            if self.stats["syncs"]:
+                self.stats["rebalances"] += 1
+            logger.info(f"🧩 shard range {self.range} → {new_range} | workers={len(live)}")
+        self.range, self.workers = new_range, live
+        self._last_ok = time.time()
+        self.stats["syncs"] += 1
+        return True
+
+    async def run(self, is_leader: Callable[[], bool]):
+        n = 0
+        while True:
+            await asyncio.sleep(self.heartbeat_sec)
+            await self.sync(is_leader())
+            n += 1
+            if n % 90 == 0:
+                try:
+                    await asyncio.to_thread(prune_scan_workers, self.ttl_sec)
+                except Exception:
+                    pass
+
+    async def leave(self):
+        try:
+            await asyncio.to_thread(remove_scan_worker, self.worker_id)
+        except Exception:
+            pass
+
+    def snapshot(self) -> dict:
+        lo, hi = self._active_range()
+        return {"worker_id": self.worker_id, "workers": len(self.workers),
+                "share_pct": round(100.0 * (hi - lo) / HASH_SPACE, 1), "owned": self.owned,
+                "active": (lo, hi) != (0, 0), **self.stats}
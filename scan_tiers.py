@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+"""
+scan_tiers.py — جدولة فحص متدرجة (hot/warm/cold) لتغطية كون رموز أكبر بنفس ميزانية الطلبات.
+
+- hot: أعلى SCAN_TIER_HOT_N رمزًا تُفحص كل شمعة.
+- warm: التالية SCAN_TIER_WARM_N تُفحص كل SCAN_TIER_WARM_EVERY شمعة.
+- cold: الباقي كل SCAN_TIER_COLD_EVERY شمعة.
+  الفحص المتباعد موزّع (إزاحة ثابتة من هاش الرمز) حتى لا تتكدس كل الرموز الباردة في نفس الشمعة.
+- الترتيب من بيانات نجلبها أصلاً (بدون أي طلب إضافي):
+  السيولة (quote volume لآخر 10 شموع مغلقة)، rvol، ATR%، وعمق وصول الرمز في البوابات
+  (0 لا بيانات، 1 رُفض في precheck، 2 رُفض في check_signal، 3 أعطى إشارة).
+  كل مقياس يُحوَّل إلى ترتيب مئيني ثم يُجمع بأوزان.
+- رمز بلا قياس بعد (جديد) يُعامل كـ hot حتى يُقاس مرة واحدة.
+- إعادة التصنيف مرة لكل شمعة (retier) وليست مع كل فحص.
+"""
+
+from __future__ import annotations
+import os
+import zlib
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+SCAN_TIERS = os.getenv("SCAN_TIERS", "0") == "1"
+SCAN_TIER_HOT_N = int(os.getenv("SCAN_TIER_HOT_N", "60"))
+SCAN_TIER_WARM_N = int(os.getenv("SCAN_TIER_WARM_N", "120"))
+SCAN_TIER_WARM_EVERY = int(os.getenv("SCAN_TIER_WARM_EVERY", "3"))
+SCAN_TIER_COLD_EVERY = int(os.getenv("SCAN_TIER_COLD_EVERY", "12"))
+
+# أوزان: السيولة، rvol، ATR%، عمق البوابات
+_W = {"qv": 0.35, "rvol": 0.25, "atr": 0.15, "gate": 0.25}
+
+
+def _offset(sym: str) -> int:
+    return zlib.crc32((sym or "").encode("utf-8")) & 0xFFFF
+
+
+def _pct_rank(x: np.ndarray) -> np.ndarray:
+    if len(x) <= 1:
+        return np.ones(len(x))
+    order = x.argsort(kind="stable")
+    r = np.empty(len(x))
+    r[order] = np.arange(len(x))
+    return r / (len(x) - 1)
+
+
+class ScanTiers:
+    def __init__(self, hot_n: int = SCAN_TIER_HOT_N, warm_n: int = SCAN_TIER_WARM_N,
+                 warm_every: int = SCAN_TIER_WARM_EVERY, cold_every: int = SCAN_TIER_COLD_EVERY):
+        self.hot_n, self.warm_n = int(hot_n), int(warm_n)
+        self.warm_every, self.cold_every = max(1, int(warm_every)), max(1, int(cold_every))
+        self._m: Dict[str, dict] = {}         # sym -> {"qv","rvol","atr","gate"}
+        self._tier: Dict[str, str] = {}
+        self._retier_bar: Optional[int] = None
+        self.stats = {"retier": 0, "due": 0, "deferred": 0}
+
+    # ---------- القياسات ----------
+    def observe(self, sym: str, ohlcv: list):
+        """من شموع LTF التي جُلبت للفحص (آخر صف = الشمعة قيد التكوين)."""
+        try:
+            a = np.asarray(ohlcv[-23:-1], dtype=np.float64)
+            if len(a) < 12:
+                return
+            h, l, c, v = a[:, 2], a[:, 3], a[:, 4], a[:, 5]
+            qv = float((c[-10:] * v[-10:]).sum())
+            base = v[:-1][-20:].mean()
+            rvol = float(v[-1] / base) if base > 0 else 0.0
+            atr = float(((h[-14:] - l[-14:]) / np.maximum(c[-14:], 1e-12)).mean())
+        except Exception:
+            return
+        m = self._m.setdefault(sym, {"gate": 0})
+        m.update(qv=qv, rvol=rvol, atr=atr)
+
+    def gate(self, sym: str, level: int):
+        """عمق البوابات فقط — لا يجعل الرمز "مُقاسًا": بلا observe (جديد أو فشل الجلب) يبقى hot
+        بدل أن يُرتَّب بسيولة 0 فيسقط إلى cold. level=0 (لا بيانات) لا يمحو عمقًا سابقًا."""
+        m = self._m.setdefault(sym, {})
+        if int(level) > 0 or "gate" not in m:
+            m["gate"] = int(level)
+
+    # ---------- التصنيف ----------
+    def retier(self, symbols: List[str], bar_idx: int):
+        if self._retier_bar == bar_idx:
+            return
+        self._retier_bar = bar_idx
+        self.forget(symbols)
+        known = [s for s in symbols if "qv" in self._m.get(s, {})]
+        tiers: Dict[str, str] = {s: "hot" for s in symbols if s not in known}
+        if known:
+            cols = {k: np.array([float(self._m[s].get(k, 0.0)) for s in known]) for k in _W}
+            score = sum(w * _pct_rank(cols[k]) for k, w in _W.items())
+            order = np.argsort(-score, kind="stable")
+            for rank, i in enumerate(order):
+                s = known[i]
+                tiers[s] = "hot" if rank < self.hot_n else ("warm" if rank < self.hot_n + self.warm_n else "cold")
+        self._tier = tiers
+        self.stats["retier"] += 1
+
+    def tier_of(self, sym: str) -> str:
+        return self._tier.get(sym, "hot")
+
+    def due(self, symbols: Iterable[str], bar_idx: int) -> List[str]:
+        symbols = list(symbols)
+        self.retier(symbols, bar_idx)
+        out = []
+        for s in symbols:
+            t = self.tier_of(s)
+            every = 1 if t == "hot" else (self.warm_every if t == "warm" else self.cold_every)
+            if every == 1 or (bar_idx + _offset(s)) % every == 0:
+                out.append(s)
+        self.stats["due"] += len(out)
+        self.stats["deferred"] += len(symbols) - len(out)
+        return out
+
+    def forget(self, keep: Iterable[str]):
+        keep = set(keep)
+        for s in list(self._m):
+            if s not in keep:
+                self._m.pop(s, None)
+
+    def counts(self) -> Dict[str, int]:
+        out = {"hot": 0, "warm": 0, "cold": 0}
+        for t in self._tier.values():
+            out[t] += 1
+        return out
+
+    def snapshot(self, top: int = 5) -> dict:
+        hot = [s for s, t in self._tier.items() if t == "hot" and "qv" in self._m.get(s, {})]
+        hot.sort(key=lambda s: -self._m[s].get("qv", 0.0))
+        return {**self.counts(), **self.stats, "top_hot": hot[:top]}
@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+"""
+single_flight.py — دمج الطلبات المتطابقة الجارية في طلب واحد (single-flight) مع TTL قصير.
+
+إذا طلب الفحص والمراقبة و/debug_sig نفس (method, symbol, timeframe, params) في نفس اللحظة،
+ينفَّذ طلب واحد فقط وينتظر الباقون نفس النتيجة. وبعد نجاحه تُعاد النتيجة لمن يطلبها
+خلال ttl ثانية دون الرجوع للشبكة. الاستثناءات لا تُخزَّن (تصل لكل المنتظرين الحاليين فقط).
+"""
+
+from __future__ import annotations
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+
+
+def make_key(method: str, args: tuple, kwargs: dict) -> Hashable:
+    """مفتاح ثابت من الاسم والوسائط (القواميس تُرتّب لتتطابق بغض النظر عن ترتيب الإدخال)."""
+    def _norm(v):
+        if isinstance(v, dict):
+            return tuple(sorted((k, _norm(x)) for k, x in v.items()))
+        if isinstance(v, (list, tuple)):
+            return tuple(_norm(x) for x in v)
+        return v
+    return (method, _norm(args), _norm(kwargs))
+
+
+class SingleFlight:
+    def __init__(self, ttl_sec: float = 1.0, max_entries: int = 4096):
+        self.ttl_sec = float(ttl_sec)
+        self.max_entries = int(max_entries)
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+        self._done: Dict[Hashable, Tuple[float, Any]] = {}
+        self.stats = {"calls": 0, "shared": 0, "cached": 0}
+
+    def _prune(self, now: float):
+        if len(self._done) <= self.max_entries:
+            return
+        for k, (ts, _) in list(self._done.items()):
+            if now - ts > self.ttl_sec:
+                self._done.pop(k, None)
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        now = time.monotonic()
+        if self.ttl_sec > 0:
+            hit = self._done.get(key)
+            if hit is not None and now - hit[0] <= self.ttl_sec:
+                self.stats["cached"] += 1
+                return hit[1]
+
+        task = self._inflight.get(key)
+        if task is not None:
+            self.stats["shared"] += 1
+        else:
+            self.stats["calls"] += 1
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+
+            def _finish(t: asyncio.Task, key=key):
+                self._inflight.pop(key, None)
+                if self.ttl_sec > 0 and not t.cancelled() and t.exception() is None:
+                    ts = time.monotonic()
+                    self._done[key] = (ts, t.result())
+                    self._prune(ts)
+            task.add_done_callback(_finish)
+
+        # shield: إلغاء أحد المنتظرين لا يلغي الطلب المشترك على الباقين
+        return await asyncio.shield(task)
@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+"""
+state_store.py — حالة strategy في الذاكرة مع كتابة مؤجلة (write-behind) لملف JSON.
+
+- الملف يُقرأ مرة واحدة (أول وصول)، وبعدها كل القراءات/التعديلات على dict في الذاكرة.
+- التعديل عبر `with store.edit() as s:` (تحت القفل)؛ خيط الكتابة يسلسل تحت نفس القفل ⇒ لا يرى
+  dict أثناء تعديله ولا حالة نصف معدّلة.
+- التعديل يعلّم الحالة "متسخة" فقط؛ خيط خلفي يكتبها كل STATE_FLUSH_SEC ثانية، وعند الخروج (atexit).
+  flush_soon() يوقظ الخيط فورًا (مثلاً بعد إشارة) بدل انتظار الدورة.
+- الكتابة ذرّية: ملف مؤقت في نفس المجلد ثم os.replace ⇒ لا يُقرأ ملف نصف مكتوب أبدًا.
+- العملية المالكة فقط تكتب: عمليات fork (عمّال strategy_pool) لا تلمس الملف؛ تستلم snapshot()
+  مع كل طلب وتعيد تعديلاتها عمليات تطبّقها العملية الرئيسية (strategy.apply_state_ops).
+- STATE_FLUSH_SEC=0 ⇒ كتابة فورية مع كل تعديل (السلوك القديم، لكن بلا قراءة متكررة).
+"""
+
+from __future__ import annotations
+import atexit
+import json
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Optional
+
+STATE_FLUSH_SEC = float(os.getenv("STATE_FLUSH_SEC", "5"))
+
+
+class StateStore:
+    def __init__(self, path: str, defaults: Callable[[], dict], flush_sec: float = STATE_FLUSH_SEC):
+        self.path = str(path)
+        self.defaults = defaults
+        self.flush_sec = max(0.0, float(flush_sec))
+        self._data: Optional[dict] = None
+        self._dirty = False
+        self._lock = threading.RLock()
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._pid = os.getpid()
+        self.stats = {"loads": 0, "flushes": 0, "flush_errors": 0, "marks": 0}
+        atexit.register(self.flush)
+
+    # ---------- القراءة ----------
+    def _read(self) -> dict:
+        base = self.defaults()
+        try:
+            with open(self.path, "r") as f:
+                s = json.load(f)
+            if isinstance(s, dict):
+                for k, v in base.items():
+                    s.setdefault(k, v)
+                base = s
+        except Exception:
+            pass
+        self.stats["loads"] += 1
+        return base
+
+    @property
+    def data(self) -> dict:
+        if self._data is None:
+            with self._lock:
+                if self._data is None:
+                    self._data = self._read()
+        return self._data
+
+    def replace(self, s: dict):
+        with self._lock:
+            if s is not self._data:
+                self._data = s
+            self.mark_dirty()
+
+    @contextmanager
+    def edit(self):
+        with self._lock:
+            yield self.data
+            self.mark_dirty()
+
+    # ---------- الكتابة المؤجلة ----------
+    def mark_dirty(self):
+        self._dirty = True
+        self.stats["marks"] += 1
+        if os.getpid() != self._pid:
+            return
+        if self.flush_sec <= 0:
+            self.flush()
+        elif self._thread is None:
+            # يبدأ الخيط مع أول تعديل (بعد fork العمّال في main، لا عند الاستيراد)
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._loop, name="state-flush", daemon=True)
+                    self._thread.start()
+
+    def flush_soon(self):
+        self._wake.set()
+
+    def _loop(self):
+        while True:
+            self._wake.wait(self.flush_sec)
+            self._wake.clear()
+            self.flush()
+
+    def flush(self) -> bool:
+        if not self._dirty or self._data is None or os.getpid() != self._pid:
+            return False
+        with self._lock:
+            self._dirty = False
+            try:
+                payload = json.dumps(self._data)
+            except Exception:
+                self._dirty = True
+                self.stats["flush_errors"] += 1
+                return False
+        try:
+            d = Path(self.path).parent
+            d.mkdir(parents=True, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(prefix=".state-", suffix=".tmp", dir=str(d))
+            try:
+                with os.fdopen(fd, "w") as f:
+                    f.write(payload)
+                os.replace(tmp, self.path)
+            except Exception:
+                try:
+                    os.unlink(tmp)
+                except OSError:
+                    pass
+                raise
+            self.stats["flushes"] += 1
+            return True
+        except Exception:
+            self._dirty = True
+            self.stats["flush_errors"] += 1
+            return False
+
+    # ---------- عمّال strategy_pool ----------
+    def snapshot(self, skip: tuple = ()) -> dict:
+        with self._lock:
+            return {k: v for k, v in self.data.items() if k not in skip}
+
+    def snapshot_stats(self) -> dict:
+        return dict(self.stats, dirty=self._dirty, flush_sec=self.flush_sec)
+
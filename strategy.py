@@ -11,6 +11,14 @@ from typing import Dict, List, Optional, Tuple
 import os, json, math, time, csv
 import pandas as pd
 import numpy as np
+from indicators_np import add_indicators_np
+from batch_features import compute_universe, matches as _batch_matches
+from pivot_index import PivotIndexes, pivots as _pivots
+from avwap import avwap_at, frame_prefix
+from state_store import StateStore
+from gate_chain import Gate, GateChain
+from gate_profiler import GateProfiler
+from reject_telemetry import RejectTelemetry, STAGES as REJECT_STAGES, stage_of
 
 # ---- Optional OKX fetch hook (safe if missing) ----
 try:
@@ -103,6 +111,11 @@ SILENCE_SOFTEN_HOURS = int(os.getenv("SILENCE_SOFTEN_HOURS", "9"))
 
 VOL_MA = 20
 ATR_PERIOD = 14
+# numpy = نواة indicators_np (مطابقة ≤1e-9 لمسار pandas، أسرع بكثير) | pandas = المسار المرجعي
+INDICATORS_ENGINE = os.getenv("INDICATORS_ENGINE", "numpy").strip().lower()
+# فهرس قمم محورية لكل (رمز، LTF) لـ nearest_resistance_above (PIVOT_INDEX=0 ⇒ مسح نوافذ بلا تخزين)
+PIVOT_INDEX = os.getenv("PIVOT_INDEX", "1") == "1"
+PIVOT_INDEXES = PivotIndexes()
 EMA_FAST, EMA_SLOW, EMA_TREND, EMA_LONG = 9, 21, 50, 200
 
 RISK_MODE = os.getenv("RISK_MODE", "balanced").lower()
@@ -200,33 +213,37 @@ TRAIL_AFTER_TP2 = _as_bool("TRAIL_AFTER_TP2", "1")
 def _now() -> int:
     return int(time.time())
 
+def _state_defaults() -> dict:
+    return {
+        "last_signal_ts": 0, "relax_wins": 0,
+        "signals_day_date": "", "signals_today": 0,
+        "breadth_ema": None, "relax_last_update_ts": 0,
+        "reject_counters": {}
+    }
+
+# الحالة في الذاكرة: الملف يُقرأ مرة واحدة ويُكتب ذرّيًا في الخلفية (state_store.py)
+STATE = StateStore(STATE_FILE, _state_defaults)
+
 def _load_state():
-    try:
-        with open(STATE_FILE, "r") as f:
-            s = json.load(f)
-            s.setdefault("relax_wins", 0)
-            s.setdefault("last_signal_ts", 0)
-            s.setdefault("signals_day_date", "")
-            s.setdefault("signals_today", 0)
-            s.setdefault("breadth_ema", None)
-            s.setdefault("relax_last_update_ts", 0)
-            s.setdefault("reject_counters", {})
-            return s
-    except Exception:
-        return {
-            "last_signal_ts": 0, "relax_wins": 0,
-            "signals_day_date": "", "signals_today": 0,
-            "breadth_ema": None, "relax_last_update_ts": 0,
-            "reject_counters": {}
-        }
+    """الحالة الحية للقراءة؛ أي تعديل عبر `with STATE.edit() as s:` (تحت قفل خيط الكتابة)."""
+    return STATE.data
 
-def _save_state(s: dict):
-    try:
-        Path(STATE_FILE).parent.mkdir(parents=True, exist_ok=True)
-        with open(STATE_FILE, "w") as f:
-            json.dump(s, f)
-    except Exception:
-        pass
+# ---- عمّال strategy_pool: لقطة الحالة تُرسل مع الطلب للقراءة، وتعديلات العامل تعود عمليات ----
+# (لا قيم): العملية الرئيسية تعيدها على قيمها الحالية ⇒ عاملان من نفس اللقطة لا يضيّع أحدهما تحديث الآخر.
+_STATE_OPS: Optional[list] = None
+
+def state_for_worker() -> dict:
+    return STATE.snapshot(skip=("reject_counters",))
+
+def apply_worker_state(st: dict):
+    STATE.replace(dict(st, reject_counters={}))
+
+def apply_state_ops(ops: Optional[list]):
+    for op, arg in ops or ():
+        if op == "signal":
+            mark_signal_now(arg)
+        elif op == "breadth":
+            _breadth_smoothed(arg)
 
 def _reset_daily_counters(s: dict):
     try:
@@ -238,11 +255,15 @@ def _reset_daily_counters(s: dict):
     except Exception:
         pass
 
-def mark_signal_now():
-    s = _load_state(); _reset_daily_counters(s)
-    s["last_signal_ts"] = _now()
-    s["signals_today"] = int(s.get("signals_today", 0)) + 1
-    _save_state(s)
+def mark_signal_now(ts: Optional[int] = None):
+    ts = _now() if ts is None else int(ts)
+    if _STATE_OPS is not None:
+        _STATE_OPS.append(("signal", ts))
+    with STATE.edit() as s:
+        _reset_daily_counters(s)
+        s["last_signal_ts"] = ts
+        s["signals_today"] = int(s.get("signals_today", 0)) + 1
+    STATE.flush_soon()
 
 def hours_since_last_signal() -> float:
     ts = _load_state().get("last_signal_ts", 0)
@@ -263,19 +284,21 @@ def _relax_factor_continuous(h: float, h_soft: float = 6.0, h_max: float = 12.0)
 
 def _breadth_smoothed(b_now: Optional[float]) -> Optional[float]:
     if b_now is None: return None
-    s = _load_state()
-    b_prev = s.get("breadth_ema", b_now)
-    b_ema = 0.7 * (b_prev if b_prev is not None else b_now) + 0.3 * b_now
-    s["breadth_ema"] = b_ema
-    _save_state(s)
+    if _STATE_OPS is not None:
+        _STATE_OPS.append(("breadth", b_now))
+    with STATE.edit() as s:
+        b_prev = s.get("breadth_ema", b_now)
+        b_ema = 0.7 * (b_prev if b_prev is not None else b_now) + 0.3 * b_now
+        s["breadth_ema"] = b_ema
     return float(b_ema)
 
 # ========= محوّل الانتقائية (DSC) =========
 def _get_selectivity_mode(breadth_pct: Optional[float]) -> str:
     if SELECTIVITY_MODE in ("soft","balanced","strict"):
         return SELECTIVITY_MODE
-    s = _load_state(); _reset_daily_counters(s)
-    sigs = int(s.get("signals_today", 0))
+    with STATE.edit() as s:
+        _reset_daily_counters(s)
+        sigs = int(s.get("signals_today", 0))
     breadth_pct = 0.5 if breadth_pct is None else float(breadth_pct)
     if sigs < TARGET_SIGNALS_PER_DAY and breadth_pct >= 0.65: return "soft"
     if breadth_pct <= 0.40 or sigs >= TARGET_SIGNALS_PER_DAY * 1.5: return "strict"
@@ -313,23 +336,22 @@ def apply_relax(base_cfg: dict, breadth_hint: Optional[float] = None) -> dict:
 # ========= إعادة ضبط التخفيف بعد صفقتين ناجحتين ==========
 def register_trade_result(pnl_net: float, r_value: float | None = None):
     try:
-        s = _load_state()
-        now = _now()
-        last_ts = int(s.get("relax_last_update_ts", 0))
-        if last_ts and (now - last_ts) > 7*24*3600:
-            s["relax_wins"] = 0
-        min_win = 0.0
-        if r_value is not None and r_value > 0:
-            min_win = 0.3 * float(r_value)
-        wins = int(s.get("relax_wins", 0))
-        if float(pnl_net) >= float(min_win):
-            wins += 1
-        s["relax_wins"] = wins
-        s["relax_last_update_ts"] = now
-        if wins >= 2:
-            s["relax_wins"] = 0
-            s["last_signal_ts"] = now
-        _save_state(s)
+        with STATE.edit() as s:
+            now = _now()
+            last_ts = int(s.get("relax_last_update_ts", 0))
+            if last_ts and (now - last_ts) > 7*24*3600:
+                s["relax_wins"] = 0
+            min_win = 0.0
+            if r_value is not None and r_value > 0:
+                min_win = 0.3 * float(r_value)
+            wins = int(s.get("relax_wins", 0))
+            if float(pnl_net) >= float(min_win):
+                wins += 1
+            s["relax_wins"] = wins
+            s["relax_last_update_ts"] = now
+            if wins >= 2:
+                s["relax_wins"] = 0
+                s["last_signal_ts"] = now
     except Exception:
         pass
 
@@ -453,6 +475,14 @@ def is_nrN(series_high: pd.Series, series_low: pd.Series, N: int = 7) -> pd.Seri
     return rng == rng.rolling(N).min()
 
 def add_indicators(df: pd.DataFrame):
+    if INDICATORS_ENGINE == "numpy":
+        try:
+            return add_indicators_np(df, atr_period=ATR_PERIOD, vol_ma=VOL_MA)
+        except Exception:
+            pass  # NaN/حالة غير متوقعة → مسار pandas المرجعي
+    return _add_indicators_pd(df)
+
+def _add_indicators_pd(df: pd.DataFrame):
     df["ema9"]   = ema(df["close"], EMA_FAST)
     df["ema21"]  = ema(df["close"], EMA_SLOW)
     df["ema50"]  = ema(df["close"], EMA_TREND)
@@ -470,18 +500,27 @@ def add_indicators(df: pd.DataFrame):
 # ========= S/R & FIB =========
 def get_sr_on_closed(df: pd.DataFrame, window=SR_WINDOW) -> Tuple[Optional[float], Optional[float]]:
     if len(df) < window + 3: return None, None
-    hi = float(df.iloc[-(window+1):-1]["high"].max())
-    lo = float(df.iloc[-(window+1):-1]["low"].min())
+    hi = float(np.nanmax(df["high"].to_numpy()[-(window+1):-1]))
+    lo = float(np.nanmin(df["low"].to_numpy()[-(window+1):-1]))
     if not math.isfinite(hi) or not math.isfinite(lo): return None, None
     return float(lo), float(hi)
 
 def recent_swing(df: pd.DataFrame, lookback=SWING_LOOKBACK) -> Tuple[Optional[float], Optional[float], Optional[int], Optional[int]]:
     if len(df) < lookback + 5: return None, None, None, None
-    seg = df.iloc[-(lookback+1):-1]
-    hhv = seg["high"].max(); llv = seg["low"].min()
-    if pd.isna(hhv) or pd.isna(llv) or hhv <= llv: return None, None, None, None
-    hi_idx = seg["high"].idxmax(); lo_idx = seg["low"].idxmin()
-    return float(hhv), float(llv), int(hi_idx), int(lo_idx)
+    h = df["high"].to_numpy()[-(lookback+1):-1]
+    l = df["low"].to_numpy()[-(lookback+1):-1]
+    if np.isnan(h).any() or np.isnan(l).any():
+        # مسار pandas (idxmax يتخطى NaN)
+        seg = df.iloc[-(lookback+1):-1]
+        hhv = seg["high"].max(); llv = seg["low"].min()
+        if pd.isna(hhv) or pd.isna(llv) or hhv <= llv: return None, None, None, None
+        return float(hhv), float(llv), int(seg["high"].idxmax()), int(seg["low"].idxmin())
+    i_hi, i_lo = int(h.argmax()), int(l.argmin())
+    hhv, llv = float(h[i_hi]), float(l[i_lo])
+    if hhv <= llv: return None, None, None, None
+    # تسميات index (كما يعيد idxmax) وليست مواضع
+    base = len(df) - (lookback + 1)
+    return hhv, llv, int(df.index[base + i_hi]), int(df.index[base + i_lo])
 
 def near_any_fib(price: float, hhv: float, llv: float, tol: float) -> Tuple[bool, str]:
     rng = hhv - llv
@@ -491,31 +530,31 @@ def near_any_fib(price: float, hhv: float, llv: float, tol: float) -> Tuple[bool
         if abs(price - lvl) / max(lvl, 1e-9) <= tol: return True, name
     return False, ""
 
-def avwap_from_index(df: pd.DataFrame, idx: int) -> Optional[float]:
+def avwap_from_index(df: pd.DataFrame, idx: int, prefix: Optional[tuple] = None) -> Optional[float]:
+    # prefix = (cumsum(tp·v), cumsum(v)) للإطار: تُحسب مرة واحدة وتخدم كل المراسي (avwap.py)
     if idx is None or idx < 0 or idx >= len(df)-1: return None
-    sub = df.iloc[idx:].copy()
-    tp = (sub["high"] + sub["low"] + sub["close"]) / 3.0
-    numer = (tp * sub["volume"]).cumsum()
-    denom = (sub["volume"]).cumsum().replace(0, np.nan)
-    v = numer / denom
-    return float(v.iloc[-2]) if len(v) >= 2 and math.isfinite(v.iloc[-2]) else None
+    return avwap_at(prefix if prefix is not None else frame_prefix(df), int(idx))
+
+def _day_start_index(df: pd.DataFrame) -> int:
+    """تسمية أول صف في يوم (UTC) الشمعة المغلقة — كما كان عبر pd.to_datetime().dt.date."""
+    t = df["timestamp"].to_numpy().astype(np.int64)
+    day = t // (86_400_000 if t[-2] > 1e12 else 86_400)
+    return int(df.index[int(np.argmax(day == day[-2]))])
 
 # ========= Helpers =========
 def _pivot_highs(df: pd.DataFrame, left: int = 2, right: int = 2) -> List[Tuple[int, float]]:
-    hs = []
-    for i in range(left, len(df)-right):
-        if df["high"].iloc[i] == df["high"].iloc[i-left:i+right+1].max():
-            hs.append((i, float(df["high"].iloc[i])))
-    return hs
+    return _pivots(df["high"].to_numpy(dtype=np.float64), left, right)
 
 def _pivot_lows(df: pd.DataFrame, left: int = 2, right: int = 2) -> List[Tuple[int, float]]:
-    ls = []
-    for i in range(left, len(df)-right):
-        if df["low"].iloc[i] == df["low"].iloc[i-left:i+right+1].min():
-            ls.append((i, float(df["low"].iloc[i])))
-    return ls
+    return _pivots(df["low"].to_numpy(dtype=np.float64), left, right, lows=True)
 
-def nearest_resistance_above(df: pd.DataFrame, price: float, lookback: int = 60) -> Optional[float]:
+def nearest_resistance_above(df: pd.DataFrame, price: float, lookback: int = 60, key=None) -> Optional[float]:
+    # key=(symbol, tf): من فهرس القمم المخزّن (يُحدَّث مع كل شمعة مغلقة) بدل مسح الـ tail
+    if key is not None and PIVOT_INDEX:
+        try:
+            return PIVOT_INDEXES.resistance_above(key, df, price, lookback)
+        except Exception:
+            PIVOT_INDEXES.drop(key)
     piv = _pivot_highs(df.tail(lookback+5))
     above = [v for (_, v) in piv if v > price]
     return min(above) if above else None
@@ -653,7 +692,9 @@ def quantile_atr_band(atr_pct: pd.Series) -> tuple[float, float]:
     if len(x) < 40:
         m = float(x.median()) if len(x) else 0.01
         return max(1e-5, m*0.6), m*1.6
-    q25, q75 = float(x.quantile(0.25)), float(x.quantile(0.75))
+    return _atr_band_from_q(float(x.quantile(0.25)), float(x.quantile(0.75)))
+
+def _atr_band_from_q(q25: float, q75: float) -> tuple[float, float]:
     iqr = max(q75 - q25, 1e-6)
     lo = q25 - 0.25*iqr
     hi = q75 + 0.35*iqr
@@ -661,11 +702,15 @@ def quantile_atr_band(atr_pct: pd.Series) -> tuple[float, float]:
         lo, hi = q25*0.9, q75*1.1
     return max(1e-5, lo), max(hi, lo + 5e-5)
 
-def adapt_atr_band(atr_pct_series: pd.Series, base_band: tuple[float, float]) -> tuple[float, float]:
-    if atr_pct_series is None or len(atr_pct_series) < 40:
+def adapt_atr_band(atr_pct_series: pd.Series, base_band: tuple[float, float], q_band: Optional[tuple] = None) -> tuple[float, float]:
+    # q_band: (q25, q75) جاهزة من batch_features (نفس التنعيم والكمّيات) بدل السلسلة
+    if q_band is not None:
+        q_lo, q_hi = _atr_band_from_q(*q_band)
+    elif atr_pct_series is None or len(atr_pct_series) < 40:
         return base_band
-    sm = _ema_smooth(atr_pct_series.tail(240), span=5)
-    q_lo, q_hi = quantile_atr_band(sm)
+    else:
+        sm = _ema_smooth(atr_pct_series.tail(240), span=5)
+        q_lo, q_hi = quantile_atr_band(sm)
     lvl = relax_level()
     ATR_EXTRA_EXPAND = float(os.getenv("ATR_EXTRA_EXPAND", "0.02"))  # افتراضي +2%
     expand = (0.05 if lvl == 1 else (0.10 if lvl >= 2 else 0.0)) + ATR_EXTRA_EXPAND
@@ -832,32 +877,69 @@ def score_signal(
 
     return int(round(score)), bd
 
+# ========= بروفايلر البوابات =========
+# زمن/نجاح كل مرحلة في ltf_precheck/check_signal (gate_profiler.py)؛ معطّل ⇒ فحص علم فقط
+PROFILE = GateProfiler()
+_stage = PROFILE.stage
+
 # ========= سجل الرفض =========
-def _log_reject(symbol: str, msg: str):
-    if LOG_REJECTS:
+# كل رفض = (مرحلة، رمز، قيمة رقمية) في عدّادات/مدرّجات ثابتة الحجم (reject_telemetry.py)؛
+# الرسالة النصية للطباعة فقط (عيّنة + حد لكل مرحلة)، و reject_counters في الحالة بمفاتيح المراحل.
+REJECTS = RejectTelemetry()
+
+# إن عُيّن (داخل عمّال strategy_pool): مراحل الرفض تُجمع هنا وتُدمج في العملية الرئيسية
+# بدل أن تكتب كل عملية ملف الحالة بنفسها (تسابق قراءة/كتابة يضيّع العدّادات)
+_REJECT_SINK: Optional[list] = None
+
+def _log_reject(symbol: str, msg: str, value: Optional[float] = None):
+    si = REJECTS.record(symbol, msg, value)
+    if LOG_REJECTS and REJECTS.should_log(si):
         print(f"[strategy][reject] {symbol}: {msg}")
-    # سجّل السبب يوميًا في STATE_FILE
+    if _REJECT_SINK is not None:
+        _REJECT_SINK.append(REJECT_STAGES[si])
+        return
+    record_rejects([REJECT_STAGES[si]])
+
+def record_rejects(stages: List[str]):
+    """عدّادات الرفض اليومية في الحالة بمفاتيح المراحل (REJECT_STAGES) ⇒ عدد مفاتيح ثابت."""
+    if not stages:
+        return
     try:
-        s = _load_state()
-        _reset_daily_counters(s)
-        rc = s.get("reject_counters", {})
-        rc[msg] = int(rc.get(msg, 0)) + 1
-        s["reject_counters"] = rc
-        s["last_reject_ts"] = _now()
-        _save_state(s)
+        with STATE.edit() as s:
+            _reset_daily_counters(s)
+            rc = s.get("reject_counters", {})
+            if any(k not in REJECT_STAGES for k in rc):
+                # مفاتيح نصية حرة من إصدار سابق ⇒ تُحوَّل لمراحلها مرة واحدة
+                old, rc = rc, {}
+                for k, n in old.items():
+                    st = k if k in REJECT_STAGES else stage_of(k)
+                    rc[st] = rc.get(st, 0) + int(n)
+            for st in stages:
+                rc[st] = int(rc.get(st, 0)) + 1
+            s["reject_counters"] = rc
+            s["last_reject_ts"] = _now()
     except Exception:
         pass
 
-# ========= المولّد الرئيسي للإشارة (Merged+) =========
-def check_signal(
-    symbol: str,
-    ohlcv: list[list],
-    ohlcv_htf: Optional[object] = None
-) -> Optional[dict]:
-    import math  # للتأكد موجود
-    # اجلب/أكمل البيانات إن احتجنا (بدون الاعتماد الإجباري على okx_api)
-    ohlcv, ohlcv_htf = _ensure_data(symbol, ohlcv, ohlcv_htf)
+# ========= حالة البار (منع التكرار/holdout) القابلة للنقل بين العمليات =========
+def bar_state_for(symbol: str) -> dict:
+    """ما يحتاجه check_signal من _LAST_* لهذا الرمز فقط."""
+    base_sym = symbol.split("#")[0]
+    return {
+        "entry_ts": {k: _LAST_ENTRY_BAR_TS[k] for k in {symbol, base_sym} if k in _LAST_ENTRY_BAR_TS},
+        "signal_idx": {symbol: _LAST_SIGNAL_BAR_IDX[symbol]} if symbol in _LAST_SIGNAL_BAR_IDX else {},
+    }
 
+def apply_bar_state(st: dict, replace: bool = False):
+    if replace:
+        _LAST_ENTRY_BAR_TS.clear()
+        _LAST_SIGNAL_BAR_IDX.clear()
+    _LAST_ENTRY_BAR_TS.update(st.get("entry_ts") or {})
+    _LAST_SIGNAL_BAR_IDX.update(st.get("signal_idx") or {})
+
+# ========= تجهيز LTF + بوابات مشتركة =========
+def _prepare_ltf_df(symbol: str, ohlcv: Optional[list]) -> Optional[pd.DataFrame]:
+    _stage("df_build")
     # تحقق بيانات
     if not ohlcv or len(ohlcv) < 80:
         _log_reject(symbol, "insufficient_bars")
@@ -872,11 +954,320 @@ def check_signal(
         return None
 
     df = _trim(df, 240)
+    _stage("indicators")
     df = add_indicators(df)
     if len(df) < 60:
         _log_reject(symbol, "after_indicators_len<60")
         return None
+    return df
+
+def _base_thresholds(prof: dict) -> dict:
+    base_cfg = dict(_cfg)
+    base_cfg["ATR_BAND"] = (prof["atr_lo"], prof["atr_hi"])
+    base_cfg["RVOL_MIN"] = max(base_cfg.get("RVOL_MIN", 1.0), float(prof["rvol_min"]))
+    return base_cfg
+
+def _hour_riyadh(cur_ts: int) -> int:
+    try:
+        ts_sec = (cur_ts / 1000.0) if cur_ts > 1e12 else float(cur_ts)
+        return (datetime.utcfromtimestamp(ts_sec).hour + 3) % 24
+    except Exception:
+        return 12
+
+def _atr_band_eff(df: Optional[pd.DataFrame], base_band: tuple, widen_d1: bool, is_major: bool, regime: str,
+                  q_band: Optional[tuple] = None) -> tuple[float, float, float, float]:
+    """نطاق ATR% الفعّال (ديناميكي + تليين) — widen_d1 عند توفر إطارات MTF مع فشل D1.
+    يعيد (lo_eff, hi_eff, lo_dyn, hi_dyn)؛ النطاق الديناميكي قبل الهوامش يُمرَّر إلى score_signal.
+    q_band من جدول الميزات الدفعي يغني عن df."""
+    base_lo, base_hi = base_band
+    atr_pct_series = None if q_band is not None else (df["atr"] / df["close"]).dropna()
+    lo_dyn, hi_dyn = adapt_atr_band(atr_pct_series, (base_lo, base_hi), q_band=q_band)
+
+    if widen_d1:
+        lo_dyn *= 0.95
+        hi_dyn *= 1.07
 
+    # ==== FIX (step 4): توسيع/تحقق نطاق ATR بأمان ====
+    eps_abs = 0.00018
+    ATR_EPS_REL_ADD = float(os.getenv("ATR_EPS_REL_ADD", "0.02"))
+    eps_rel = 0.05 + ATR_EPS_REL_ADD
+
+    lo_eff = float(lo_dyn)
+    hi_eff = float(hi_dyn)
+
+    lo_eff = max(lo_eff - eps_abs, lo_eff * (1 - eps_rel))
+    hi_eff = min(hi_eff + eps_abs, hi_eff * (1 + eps_rel))
+
+    if is_major:
+        hi_eff *= 1.08
+    if regime == "trend":
+        hi_eff *= (1.08 if is_major else 1.05)
+    elif regime == "range":
+        lo_eff *= 0.94
+    if hours_since_last_signal() >= SILENCE_SOFTEN_HOURS:
+        lo_eff *= 0.98
+        hi_eff *= 1.02
+    return lo_eff, hi_eff, lo_dyn, hi_dyn
+
+def _atr_band_reject(lo_eff: float, hi_eff: float, atr_pct: float) -> Optional[str]:
+    import math
+    try:
+        if not (math.isfinite(lo_eff) and math.isfinite(hi_eff) and lo_eff > 0 and hi_eff > 0 and hi_eff > lo_eff):
+            return "atr_band_invalid"
+    except Exception:
+        return "atr_band_invalid"
+    if not (lo_eff <= atr_pct <= hi_eff):
+        return f"atr_pct_outside[{atr_pct:.4f}] not in [{lo_eff:.4f},{hi_eff:.4f}]"
+    return None
+
+def _rvol_metrics(df: pd.DataFrame, closed: pd.Series, atr_pct: float) -> tuple[float, float, float, bool]:
+    v_med60 = float(df["volume"].iloc[-61:-1].median()) if len(df) >= 61 else float(closed.get("vol_ma20") or 1e-9)
+    z20 = float(df["vol_z20"].iloc[-2])
+    vol_ema5 = df["volume"].ewm(span=5, adjust=False).mean().iloc[-2]
+    vol_ema20 = df["volume"].ewm(span=20, adjust=False).mean().iloc[-2]
+    return _rvol_from(closed, v_med60, z20, vol_ema5, vol_ema20, atr_pct)
+
+def _rvol_from(closed, v_med60: float, z20: float, vol_ema5: float, vol_ema20: float, atr_pct: float) -> tuple[float, float, float, bool]:
+    """rvol/spike من إحصاءات جاهزة (df أو rvol_stats من batch_features)."""
+    base_vol = v_med60 if v_med60 > 0 else (float(closed.get("vol_ma20") or 1e-9))
+    rvol = float(closed["volume"]) / max(base_vol, 1e-9)
+    spike_z = 1.2 - min(0.3, (atr_pct / 0.02) * 0.2)
+    accel_vol = (vol_ema5 > vol_ema20 * 1.05)
+    return rvol, float(z20), spike_z, accel_vol
+
+def _allow_red_pin(closed: pd.Series) -> bool:
+    try:
+        h, l, o, c = float(closed["high"]), float(closed["low"]), float(closed["open"]), float(closed["close"])
+        tr = max(h - l, 1e-9)
+        body = abs(c - o)
+        lower_wick = min(o, c) - l
+        upper_wick = h - max(o, c)
+        return (body / tr <= 0.25) and (lower_wick / tr >= 0.45) and ((c - l) / tr >= 0.55) and (upper_wick / tr <= 0.20)
+    except Exception:
+        return False
+
+# ========= بوابات LTF كسلسلة قابلة لإعادة الترتيب (gate_chain.py) =========
+# كل بوابة نقية بالنسبة للقرار (لا تكتب حالة) وتقرأ/تكتب ctx فقط ⇒ ترتيبها لا يغيّر النتيجة.
+# تبقى خارج السلسلة: ما يسبق apply_relax (يحدّث breadth_ema) والتكرار/holdout وما يعتمد على الست-أب.
+def _g_qv(c: dict):
+    ok_qv, qv_dbg = _qv_gate(
+        c["qv"] if c.get("qv") is not None else _compute_quote_vol_series(c["df"], contract_size=1.0),
+        float(c["prof"]["min_quote_vol"]),
+        win=10,
+        low_vol_env=(c["atr_pct"] <= 0.006),
+        is_major=c["is_major"],
+        hr_riyadh=_hour_riyadh(c["cur_ts"]),
+    )
+    return None if ok_qv else (f"low_quote_vol ({qv_dbg})", None)
+
+def _mtf_ctx(c: dict) -> tuple:
+    """pass_mtf_filter_any مرة واحدة لكل رمز وعند أول حاجة فقط (atr_band ثم النقاط).
+    زمنه مرحلة "mtf" في /profile وفي lazy_sec للسلسلة، لا ضمن atr_band."""
+    m = c.get("mtf")
+    if m is None:
+        t = time.perf_counter()
+        with PROFILE.sub("mtf"):
+            m = c["mtf"] = pass_mtf_filter_any(c["htf"])
+        c["lazy_sec"] = c.get("lazy_sec", 0.0) + time.perf_counter() - t
+    return m
+
+def _g_atr_band(c: dict):
+    bf = c["bf"]
+    widen_d1 = c.get("widen_d1")
+    if widen_d1 is None:        # check_signal: يحتاج d1_ok ⇒ أول (وآخر) حساب لـ MTF هنا
+        has, _, d1_ok, _ = _mtf_ctx(c)
+        widen_d1 = has and not d1_ok
+    lo_eff, hi_eff, c["lo_dyn"], c["hi_dyn"] = _atr_band_eff(
+        c["df"], c["thr"]["ATR_BAND"], widen_d1, c["is_major"], c["regime"],
+        q_band=bf["q_band"] if bf is not None else None)
+    why = _atr_band_reject(lo_eff, hi_eff, c["atr_pct"])
+    return (why, c["atr_pct"]) if why else None
+
+def _rvol_ctx(c: dict) -> tuple[float, float, float, bool]:
+    if c["bf"] is not None:
+        return _rvol_from(c["closed"], *c["bf"]["rvol_stats"], c["atr_pct"])
+    return _rvol_metrics(c["df"], c["closed"], c["atr_pct"])
+
+def _g_rvol_pre(c: dict):
+    # أدنى RVOL_MIN ممكن: نفس تحويلات check_signal (كلها رتيبة) مع أرخى خيار في كل خطوة
+    # تعتمد على breadth: وضع soft (إن لم يكن الوضع مثبّتًا) ثم breadth>=0.70.
+    thr, prof, is_major = c["thr"], c["prof"], c["is_major"]
+    rvol, z20, spike_z, accel_vol = _rvol_ctx(c)
+    if SELECTIVITY_MODE in ("soft", "balanced", "strict"):
+        rvol_min = float(thr["RVOL_MIN"])
+    else:
+        x = max(0.85, _base_thresholds(prof)["RVOL_MIN"] - 0.10 * float(thr.get("RELAX_F", 0.0)))
+        rvol_min = max(0.80, x - 0.03)
+    rvol_min = min(rvol_min, max(0.75, rvol_min - 0.08))
+    if thr.get("RELAX_LEVEL", 0) >= 1:
+        rvol_min = max(0.72 if prof.get("class") != "major" else 0.85, rvol_min - 0.03)
+    if hours_since_last_signal() >= SILENCE_SOFTEN_HOURS:
+        rvol_min = max(0.80 if is_major else 0.70, rvol_min - 0.05)
+        spike_z -= 0.10
+    spike_ok = (z20 >= (spike_z - 0.15))
+    if rvol < rvol_min and not spike_ok:
+        if not (accel_vol and z20 >= (spike_z - 0.35)):
+            return f"rvol<{rvol_min:.2f} and no spike/accel (rv={rvol:.2f}, z={z20:.2f})", rvol
+    return None
+
+def _g_rvol(c: dict):
+    thr = c["thr"]
+    rvol, z20, spike_z, accel_vol = _rvol_ctx(c)
+    spike_ok = (z20 >= (spike_z - 0.15))
+    if hours_since_last_signal() >= SILENCE_SOFTEN_HOURS:
+        thr["RVOL_MIN"] = max(0.80 if c["is_major"] else 0.70, float(thr["RVOL_MIN"]) - 0.05)
+        spike_z -= 0.10
+        spike_ok = (z20 >= (spike_z - 0.15))
+    c["rvol"], c["spike_ok"] = rvol, spike_ok
+    if rvol < thr["RVOL_MIN"] and not spike_ok:
+        if not (accel_vol and z20 >= (spike_z - 0.35)):
+            return f"rvol<{thr['RVOL_MIN']:.2f} and no spike/accel (rv={rvol:.2f}, z={z20:.2f})", rvol
+    return None
+
+def _g_market_guard(c: dict):
+    return None if market_guard_ok(c["prof"], c["mtf_feats"]) else ("market_guard_block", None)
+
+def _g_close_open(c: dict):
+    # الإغلاق فوق الافتتاح (مع استثناء pin-hammer الأحمر)
+    if not (c["price"] > float(c["closed"]["open"])) and not _allow_red_pin(c["closed"]):
+        return "close<=open", None
+    return None
+
+def _g_runup(c: dict):
+    if USE_PARABOLIC_GUARD and c["atr_pct"] > 0.020:
+        seq_bull = int((c["df"]["close"] > c["df"]["open"]).tail(6).sum())
+        if seq_bull > MAX_SEQ_BULL:
+            return "parabolic_runup", None
+    return None
+
+# الترتيب المعلن = ترتيب الكود السابق؛ الكلفة (µs) من /profile على عينات إعادة التشغيل.
+# في check_signal تحسب atr_band MTF عند أول حاجة لـ d1_ok (lazy_us، يُقاس منفصلًا) ⇒ تأتي آخرًا:
+# البوابات المستقلة عن MTF ترفض أولاً ولا يُحسب MTF لمرفوضاتها.
+PRE_GATES = GateChain("pre", [
+    Gate("qv", _g_qv, 850), Gate("atr_band", _g_atr_band, 1700),
+    Gate("rvol", _g_rvol_pre, 550), Gate("close_open", _g_close_open, 15),
+], stage=_stage)
+CHECK_GATES = GateChain("check", [
+    Gate("qv", _g_qv, 850), Gate("rvol", _g_rvol, 550), Gate("market_guard", _g_market_guard, 10),
+    Gate("close_open", _g_close_open, 15), Gate("runup", _g_runup, 60),
+    Gate("atr_band", _g_atr_band, 1700, lazy_us=9000),
+], stage=_stage)
+
+# ========= فحص مسبق سريع على LTF فقط =========
+def ltf_batch_features(data: Dict[str, list]) -> Dict[str, dict]:
+    """جدول ميزات LTF لكل الكون (batch_features) بنفس إعدادات _prepare_ltf_df؛ يُمرَّر لكل رمز
+    إلى ltf_precheck(feats=...). الرموز غير الصالحة للدفعة تغيب ⇒ المسار الفردي المعتاد."""
+    try:
+        return compute_universe(data, trim=240, atr_period=ATR_PERIOD, vol_ma=VOL_MA)
+    except Exception as e:
+        print(f"[strategy][batch][warn] {e}")
+        return {}
+
+@PROFILE.wrap("pre")
+def ltf_precheck(symbol: str, ohlcv: list[list], feats: Optional[dict] = None) -> Optional[dict]:
+    """
+    يشغّل بوابات LTF الرخيصة قبل جلب HTF: البيانات، القيم الشاذة، التبريد البارابولي،
+    التكرار/الـ holdout، السيولة (QV)، نطاق ATR، rvol/spike، و close<=open.
+    البوابات التي تتأثر بـ HTF تُقيَّم بأرخى قيمة ممكنة (نطاق ATR موسّع كأن D1 فشل،
+    و RVOL_MIN بأقصى تليين ممكن من breadth/soft) ⇒ لا يُرفض هنا رمز كان سيمر في check_signal.
+    feats: سجل الرمز من batch_features.compute_universe (نفس الصفوف) ⇒ البوابات تقرأ القيم الجاهزة
+    بلا DataFrame، ويُبنى df المؤشرات للناجين فقط.
+    يعيد None عند الرفض (مع تسجيل السبب) أو سياقًا يمرَّر إلى check_signal(pre=...).
+    """
+    REJECTS.begin("pre")
+    if feats is not None and _batch_matches(feats, ohlcv):
+        df = None
+        closed = feats["closed"]
+        atr = feats["atr"]
+        n_bars = feats["n"]
+    else:
+        feats = None
+        df = _prepare_ltf_df(symbol, ohlcv)
+        if df is None:
+            return None
+        closed = df.iloc[-2]
+        atr = float(df["atr"].iloc[-2])
+        n_bars = len(df)
+
+    _stage("qc")
+    cur_ts = int(closed["timestamp"])
+    price = float(closed["close"])
+    atr_pct = atr / max(price, 1e-9)
+    if bar_is_outlier(closed, atr):
+        _log_reject(symbol, "bar_outlier")
+        return None
+    if feats is not None:
+        macd_slope_3 = feats["macd_slope_3"]
+    else:
+        try:
+            macd_slope_3 = float(df["macd_hist"].diff(3).iloc[-2])
+        except Exception:
+            macd_slope_3 = 0.0
+    if USE_PARABOLIC_GUARD and atr_pct > 0.020 and macd_slope_3 < 0:
+        _log_reject(symbol, "parabolic_macd_cooling", atr_pct)
+        return None
+
+    _stage("relax")
+    prof = get_symbol_profile(symbol)
+    regime = feats["regime"] if feats is not None else detect_regime(df)
+    is_major = (prof.get("class") == "major")
+    thr = apply_relax(_base_thresholds(prof), breadth_hint=None)
+
+    # منع التكرار + Holdout (لا يعتمد على HTF)
+    base_sym = symbol.split("#")[0]
+    if _LAST_ENTRY_BAR_TS.get(base_sym) == cur_ts:
+        _log_reject(symbol, "duplicate_symbol_bar")
+        return None
+    if _LAST_ENTRY_BAR_TS.get(symbol) == cur_ts:
+        _log_reject(symbol, "duplicate_bar")
+        return None
+    holdout_eff = thr.get("HOLDOUT_BARS_EFF", _cfg.get("HOLDOUT_BARS", 2))
+    if is_major:
+        holdout_eff = max(1, int(holdout_eff) - 1)
+    if (n_bars - 2) - _LAST_SIGNAL_BAR_IDX.get(symbol, -10_000) < holdout_eff:
+        _log_reject(symbol, f"holdout<{holdout_eff}")
+        return None
+
+    # سيولة / نطاق ATR بأوسع صيغة (كأن D1 فشل) / rvol & spike / close<=open — بترتيب PRE_GATES
+    r = PRE_GATES.run({
+        "symbol": symbol, "df": df, "bf": feats, "closed": closed, "price": price, "atr_pct": atr_pct,
+        "cur_ts": cur_ts, "prof": prof, "is_major": is_major, "regime": regime, "thr": thr, "widen_d1": True,
+        "qv": pd.Series(feats["qv"]) if feats is not None else None,
+    })
+    if r is not None:
+        _log_reject(symbol, *r)
+        return None
+
+    REJECTS.passed_one()
+    if feats is not None:
+        return {"df": feats["frame"](), "ohlcv": ohlcv, "bar_ts": cur_ts, "feats": feats}
+    return {"df": df, "ohlcv": ohlcv, "bar_ts": cur_ts}
+
+# ========= المولّد الرئيسي للإشارة (Merged+) =========
+@PROFILE.wrap("check")
+def check_signal(
+    symbol: str,
+    ohlcv: list[list],
+    ohlcv_htf: Optional[object] = None,
+    pre: Optional[dict] = None
+) -> Optional[dict]:
+    import math  # للتأكد موجود
+    REJECTS.begin("check")
+    if pre is not None and pre.get("df") is not None:
+        # سياق من ltf_precheck: نفس df (مع المؤشرات) بدون إعادة بناء
+        ohlcv = pre.get("ohlcv") or ohlcv
+        ohlcv, ohlcv_htf = _ensure_data(symbol, ohlcv, ohlcv_htf)
+        df = pre["df"]
+        bf = pre.get("feats")   # جدول الميزات الدفعي (إن وُجد): regime/نطاق ATR/rvol جاهزة
+    else:
+        bf = None
+        # اجلب/أكمل البيانات إن احتجنا (بدون الاعتماد الإجباري على okx_api)
+        ohlcv, ohlcv_htf = _ensure_data(symbol, ohlcv, ohlcv_htf)
+        df = _prepare_ltf_df(symbol, ohlcv)
+        if df is None:
+            return None
+
+    _stage("qc")
     prev2 = df.iloc[-4] if len(df) >= 4 else df.iloc[-3]
     prev = df.iloc[-3]
     closed = df.iloc[-2]
@@ -894,13 +1285,13 @@ def check_signal(
     except Exception:
         macd_slope_3 = 0.0
     if USE_PARABOLIC_GUARD and atr_pct > 0.020 and macd_slope_3 < 0:
-        _log_reject(symbol, "parabolic_macd_cooling")
+        _log_reject(symbol, "parabolic_macd_cooling", atr_pct)
         return None
 
-    # بروفايل + نظام + MTF + ميزات
+    _stage("relax")
+    # بروفايل + نظام + ميزات السوق (MTF نفسه مؤجل: لا يحتاجه إلا atr_band والنقاط)
     prof = get_symbol_profile(symbol)
-    regime = detect_regime(df)
-    mtf_has_frames, mtf_pass, d1_ok, mtf_detail = pass_mtf_filter_any(ohlcv_htf)
+    regime = bf["regime"] if bf is not None else detect_regime(df)
     feats = extract_features(ohlcv_htf)
 
     # Breadth hint من majors_state
@@ -919,9 +1310,7 @@ def check_signal(
         breadth_pct = None
 
     # قواعد Relax + DSC
-    base_cfg = dict(_cfg)
-    base_cfg["ATR_BAND"] = (prof["atr_lo"], prof["atr_hi"])
-    base_cfg["RVOL_MIN"] = max(base_cfg.get("RVOL_MIN", 1.0), float(prof["rvol_min"]))
+    base_cfg = _base_thresholds(prof)
     thr = apply_relax(base_cfg, breadth_hint=breadth_pct)
 
     MIN_T1_ABOVE_ENTRY = thr.get("MIN_T1_ABOVE_ENTRY", 0.010)
@@ -952,93 +1341,22 @@ def check_signal(
         _log_reject(symbol, f"holdout<{holdout_eff}")
         return None
 
-    # سيولة — QV Gate
-    qv_series = _compute_quote_vol_series(df, contract_size=1.0)
-    low_vol_env = (atr_pct <= 0.006)
-    try:
-        ts_sec = (cur_ts / 1000.0) if cur_ts > 1e12 else float(cur_ts)
-        hr_riyadh = (datetime.utcfromtimestamp(ts_sec).hour + 3) % 24
-    except Exception:
-        hr_riyadh = 12
-    ok_qv, qv_dbg = _qv_gate(
-        qv_series,
-        float(prof["min_quote_vol"]),
-        win=10,
-        low_vol_env=low_vol_env,
-        is_major=is_major,
-        hr_riyadh=hr_riyadh,
-    )
-    if not ok_qv:
-        _log_reject(symbol, f"low_quote_vol ({qv_dbg})")
-        return None
-
-    # نطاق ATR ديناميكي (مع تليين)
-    base_lo, base_hi = thr["ATR_BAND"]
-    atr_pct_series = (df["atr"] / df["close"]).dropna()
-    lo_dyn, hi_dyn = adapt_atr_band(atr_pct_series, (base_lo, base_hi))
-
-    if mtf_has_frames and not d1_ok:
-        lo_dyn *= 0.95
-        hi_dyn *= 1.07
-
-    # ==== FIX (step 4): توسيع/تحقق نطاق ATR بأمان ====
-    eps_abs = 0.00018
-    ATR_EPS_REL_ADD = float(os.getenv("ATR_EPS_REL_ADD", "0.02"))
-    eps_rel = 0.05 + ATR_EPS_REL_ADD
-
-    lo_eff = float(lo_dyn)
-    hi_eff = float(hi_dyn)
-
-    lo_eff = max(lo_eff - eps_abs, lo_eff * (1 - eps_rel))
-    hi_eff = min(hi_eff + eps_abs, hi_eff * (1 + eps_rel))
-
-    if is_major:
-        hi_eff *= 1.08
-    if regime == "trend":
-        hi_eff *= (1.08 if is_major else 1.05)
-    elif regime == "range":
-        lo_eff *= 0.94
-    if hours_since_last_signal() >= SILENCE_SOFTEN_HOURS:
-        lo_eff *= 0.98
-        hi_eff *= 1.02
-
-    try:
-        if not (math.isfinite(lo_eff) and math.isfinite(hi_eff) and lo_eff > 0 and hi_eff > 0 and hi_eff > lo_eff):
-            _log_reject(symbol, "atr_band_invalid")
-            return None
-    except Exception:
-        _log_reject(symbol, "atr_band_invalid")
-        return None
-
-    if not (lo_eff <= atr_pct <= hi_eff):
-        _log_reject(symbol, f"atr_pct_outside[{atr_pct:.4f}] not in [{lo_eff:.4f},{hi_eff:.4f}]")
-        return None
-    # ==== END FIX ====
-
-    # RVول & Spike
-    v_med60 = float(df["volume"].iloc[-61:-1].median()) if len(df) >= 61 else float(closed.get("vol_ma20") or 1e-9)
-    base_vol = v_med60 if v_med60 > 0 else (float(closed.get("vol_ma20") or 1e-9))
-    rvol = float(closed["volume"]) / max(base_vol, 1e-9)
-    z20 = float(df["vol_z20"].iloc[-2])
-    spike_z = 1.2 - min(0.3, (atr_pct / 0.02) * 0.2)
-    vol_ema5 = df["volume"].ewm(span=5, adjust=False).mean().iloc[-2]
-    vol_ema20 = df["volume"].ewm(span=20, adjust=False).mean().iloc[-2]
-    accel_vol = (vol_ema5 > vol_ema20 * 1.05)
-    spike_ok = (z20 >= (spike_z - 0.15))
-    if hours_since_last_signal() >= SILENCE_SOFTEN_HOURS:
-        thr["RVOL_MIN"] = max(0.80 if is_major else 0.70, float(thr["RVOL_MIN"]) - 0.05)
-        spike_z -= 0.10
-        spike_ok = (z20 >= (spike_z - 0.15))
-    if rvol < thr["RVOL_MIN"] and not spike_ok:
-        if not (accel_vol and z20 >= (spike_z - 0.35)):
-            _log_reject(symbol, f"rvol<{thr['RVOL_MIN']:.2f} and no spike/accel (rv={rvol:.2f}, z={z20:.2f})")
-            return None
-
-    # حارس السوق
-    if not market_guard_ok(prof, feats):
-        _log_reject(symbol, "market_guard_block")
+    # سيولة / rvol & spike / حارس السوق / close<=open / parabolic run-up / نطاق ATR ديناميكي (مع تليين)
+    # — بوابات مستقلة بترتيب CHECK_GATES (الأرخص والأكثر رفضًا أولاً)؛ MTF يُحسب داخل atr_band
+    hr_riyadh = _hour_riyadh(cur_ts)
+    gctx = {
+        "symbol": symbol, "df": df, "bf": bf, "closed": closed, "price": price, "atr_pct": atr_pct,
+        "cur_ts": cur_ts, "prof": prof, "is_major": is_major, "regime": regime, "thr": thr,
+        "widen_d1": None, "htf": ohlcv_htf, "mtf": None, "mtf_feats": feats,
+    }
+    r = CHECK_GATES.run(gctx)
+    if r is not None:
+        _log_reject(symbol, *r)
         return None
+    lo_dyn, hi_dyn = gctx["lo_dyn"], gctx["hi_dyn"]
+    rvol, spike_ok = gctx["rvol"], gctx["spike_ok"]
 
+    _stage("avwap")
     # اتجاه/VWAP/AVWAP
     vwap_now = float(closed["vwap"]) if "vwap" in closed else float(df["vwap"].iloc[-2])
     vw_tol = _vwap_tol_pct(atr_pct, is_major=is_major)
@@ -1049,20 +1367,15 @@ def check_signal(
 
     # AVWAPs
     avwap_swing_low = avwap_swing_high = avwap_day = None
+    # المجاميع التراكمية مرة واحدة (أو من جدول الميزات الدفعي) ⇒ كل مرساة O(1)
+    vw_prefix = bf["vwap_prefix"] if bf is not None else frame_prefix(df)
     hhv, llv, hi_idx, lo_idx = recent_swing(df, SWING_LOOKBACK)
     if lo_idx is not None:
-        avwap_swing_low = avwap_from_index(df, lo_idx)
+        avwap_swing_low = avwap_from_index(df, lo_idx, vw_prefix)
     if hi_idx is not None:
-        avwap_swing_high = avwap_from_index(df, hi_idx)
+        avwap_swing_high = avwap_from_index(df, hi_idx, vw_prefix)
     try:
-        ts = pd.to_datetime(
-            df["timestamp"],
-            unit="ms" if df["timestamp"].iloc[-2] > 1e12 else "s",
-            utc=True,
-        )
-        last_day = ts.dt.date.iloc[-2]
-        day_start_idx = ts[ts.dt.date == last_day].index[0]
-        avwap_day = avwap_from_index(df, int(day_start_idx))
+        avwap_day = avwap_from_index(df, _day_start_index(df), vw_prefix)
     except Exception:
         avwap_day = None
 
@@ -1082,23 +1395,6 @@ def check_signal(
         if (two_of_three_soft and (av_ok_count>=1 or bool(df["nr7"].iloc[-2] or df["nr4"].iloc[-2]))):
             ema_align = True
 
-    # شرط الإغلاق فوق الافتتاح (مع استثناء pin-hammer الأحمر)
-    if not (price > float(closed["open"])):
-        allow_red_pin = False
-        try:
-            h, l, o, c = float(closed["high"]), float(closed["low"]), float(closed["open"]), float(closed["close"])
-            tr = max(h - l, 1e-9)
-            body = abs(c - o)
-            lower_wick = min(o, c) - l
-            upper_wick = h - max(o, c)
-            if (body / tr <= 0.25) and (lower_wick / tr >= 0.45) and ((c - l) / tr >= 0.55) and (upper_wick / tr <= 0.20):
-                allow_red_pin = True
-        except Exception:
-            allow_red_pin = False
-        if not allow_red_pin:
-            _log_reject(symbol, "close<=open")
-            return None
-
     # تليين فشل EMA/VWAP/AVWAP في وضع soft بدل الرفض الفوري
     ema_align_final = ema_align
     soft_ema_penalty = 0
@@ -1112,13 +1408,15 @@ def check_signal(
             _log_reject(symbol, "ema/vwap/avwap_align_false")
             return None
 
+    _stage("sr")
     # S/R + برايس أكشن
     sup = res = None
     if USE_SR:
         sup, res = get_sr_on_closed(df, SR_WINDOW)
-    pivot_res = nearest_resistance_above(df, price, lookback=SR_WINDOW)
+    pivot_res = nearest_resistance_above(df, price, lookback=SR_WINDOW, key=(symbol, LTF_TF))
     res_eff = min(x for x in [res, pivot_res] if x is not None) if (res is not None or pivot_res is not None) else None
 
+    _stage("setup")
     rev_hammer = is_hammer(closed)
     rev_engulf = is_bull_engulf(prev, closed)
     rev_insideb = is_inside_break(df.iloc[-5] if len(df) >= 5 else prev2, prev, closed)
@@ -1144,12 +1442,6 @@ def check_signal(
     range_atr = float(seg["atr"].iloc[-2]) / max(price, 1e-9)
     range_env = (range_width <= 6 * range_atr)
 
-    if USE_PARABOLIC_GUARD and atr_pct > 0.020:
-        seq_bull = int((df["close"] > df["open"]).tail(6).sum())
-        if seq_bull > MAX_SEQ_BULL:
-            _log_reject(symbol, "parabolic_runup")
-            return None
-
     # مسافة EMA كحارس
     ema50 = float(closed["ema50"])
     ema200 = float(closed["ema200"])
@@ -1221,9 +1513,10 @@ def check_signal(
     dist_ema50_atr = (price - float(closed["ema50"])) / max(atr, 1e-9)
     rsi_now = float(closed["rsi"])
     if (setup in ("BRK", "PULL") and rsi_now >= RSI_EXHAUSTION and dist_ema50_atr >= DIST_EMA50_EXHAUST_ATR):
-        _log_reject(symbol, f"exhaustion_guard rsi={rsi_now:.1f}, distATR={dist_ema50_atr:.2f}")
+        _log_reject(symbol, f"exhaustion_guard rsi={rsi_now:.1f}, distATR={dist_ema50_atr:.2f}", rsi_now)
         return None
 
+    _stage("targets")
     # SL وأهداف
     def _protect_sl_with_swing(df_: pd.DataFrame, entry_price: float, atr_: float) -> float:
         base_sl = entry_price - max(atr_ * 0.9, entry_price * 0.002)
@@ -1278,7 +1571,7 @@ def check_signal(
     t1, _ = _clamp_t1_below_res(price, t_list[0], (res_eff if ('res_eff' in locals()) else None), buf_pct=0.0015)
     t_list[0] = t1
     if (t_list[0] - price) / max(price, 1e-9) < min_t1_pct:
-        _log_reject(symbol, f"t1_entry_gap<{min_t1_pct:.3%}")
+        _log_reject(symbol, f"t1_entry_gap<{min_t1_pct:.3%}", (t_list[0] - price) / max(price, 1e-9))
         return None
     if not (sl < price < t_list[0] <= t_list[-1]):
         _log_reject(symbol, "bounds_invalid(sl<price<t1<=tN)")
@@ -1288,9 +1581,11 @@ def check_signal(
     R_val = max(price - sl, 1e-9)
     srdist_R = ((res_eff - price) / R_val) if ('res_eff' in locals() and res_eff is not None and res_eff > price) else 10.0
     if setup == "BRK" and near_res and srdist_R < 0.7:
-        _log_reject(symbol, f"near_resistance_R={srdist_R:.2f}<0.70")
+        _log_reject(symbol, f"near_resistance_R={srdist_R:.2f}<0.70", srdist_R)
         return None
 
+    _stage("score")
+    mtf_has_frames, mtf_pass, d1_ok, mtf_detail = _mtf_ctx(gctx)     # محسوب مسبقًا في atr_band
     # سكور شامل — نمرّر ema_align_final بدل True/ema_align
     score, bd = score_signal(
         struct_ok, rvol, atr_pct, ema_align_final, mtf_pass, srdist_R, mtf_has_frames,
@@ -1305,7 +1600,7 @@ def check_signal(
         score = max(0, score - soft_ema_penalty)
 
     if score < thr["SCORE_MIN"]:
-        _log_reject(symbol, f"score<{thr['SCORE_MIN']} (got {score})")
+        _log_reject(symbol, f"score<{thr['SCORE_MIN']} (got {score})", score)
         return None
 
     # منطقة دخول ديناميكية
@@ -1387,6 +1682,7 @@ def check_signal(
         "time": MOTIVATION["time"].format(symbol=symbol),
     }
 
+    REJECTS.passed_one()
     return {
         "symbol": symbol, "side": "buy",
         "entry": round(entry_out, 6), "entries": entries,
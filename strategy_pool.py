@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+"""
+strategy_pool.py — تشغيل ltf_precheck/check_signal في ProcessPoolExecutor (اختياري: STRATEGY_POOL=1).
+
+- عدد العمليات = STRATEGY_POOL_WORKERS (الافتراضي عدد الأنوية).
+- الشموع تُرسل كمصفوفات مضغوطة: timestamps int64 + (open,high,low,close,volume) float64
+  بدل قوائم بايثون، وتُعاد قوائم داخل العامل بنفس الأنواع (ts int، الباقي float).
+- حالة strategy الموزّعة تُدمج في العملية الرئيسية:
+  * _LAST_ENTRY_BAR_TS/_LAST_SIGNAL_BAR_IDX: ترسل حالة الرمز مع الطلب وتعود حالته بعد التقييم.
+  * أسباب الرفض: مراحلها تُجمع في العامل وتُكتب في ملف الحالة مرة واحدة من العملية الرئيسية،
+    وفروقات تيليمتري الرفض (REJECTS.drain) تُدمج في عدّادات القمع الرئيسية.
+  * بروفايلر البوابات: علم التشغيل يُرسل مع الطلب وأزمنة المراحل (PROFILE.drain) تُدمج في الدورة الحالية.
+  * حالة strategy في الذاكرة (relax/selectivity/breadth/آخر إشارة): لقطة تُرسل مع الطلب للقراءة،
+    وتعديلات العامل تعود عمليات (strategy._STATE_OPS) تُعاد على القيم الحالية في العملية الرئيسية
+    (عدّاد signals_today وEMA الـ breadth لا يضيع تحديثهما بين عمّال متزامنين)، وهي وحدها تكتب الملف.
+- precheck في هذا الوضع يعيد نجح/فشل فقط (إرسال df للعملية الرئيسية ثم إعادته أغلى من إعادة بنائه).
+- start() يُستدعى مبكرًا في main قبل تشغيل الخيوط/المهام: العمّال تُنسخ بـ fork مرة واحدة وتبقى.
+"""
+
+from __future__ import annotations
+import asyncio
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+
+import strategy
+
+STRATEGY_POOL = os.getenv("STRATEGY_POOL", "0") == "1"
+STRATEGY_POOL_WORKERS = int(os.getenv("STRATEGY_POOL_WORKERS", "0")) or (os.cpu_count() or 1)
+
+Packed = Tuple[np.ndarray, np.ndarray]
+
+
+# ---------- التحويل المضغوط ----------
+def pack_ohlcv(rows) -> Packed:
+    a = np.asarray(rows, dtype=np.float64).reshape(-1, 6)
+    return a[:, 0].astype(np.int64), np.ascontiguousarray(a[:, 1:])
+
+
+def unpack_ohlcv(p: Packed) -> list:
+    ts, vals = p
+    return [[t, *v] for t, v in zip(ts.tolist(), vals.tolist())]
+
+
+def pack_htf(htf):
+    if isinstance(htf, dict):
+        return {k: (pack_ohlcv(v) if (isinstance(v, list) and v) else v) for k, v in htf.items()}
+    if isinstance(htf, list) and htf:
+        return pack_ohlcv(htf)
+    return htf
+
+
+def unpack_htf(htf):
+    if isinstance(htf, dict):
+        return {k: (unpack_ohlcv(v) if isinstance(v, tuple) else v) for k, v in htf.items()}
+    if isinstance(htf, tuple):
+        return unpack_ohlcv(htf)
+    return htf
+
+
+# ---------- داخل العامل ----------
+def _warm(_=None) -> int:
+    return os.getpid()
+
+
+def _evaluate(kind: str, symbol: str, ltf: Packed, htf, bar_state: dict, state: dict, profile: bool = False):
+    t0 = time.perf_counter()
+    strategy.PROFILE.on = profile
+    strategy.apply_bar_state(bar_state, replace=True)
+    strategy.apply_worker_state(state)
+    sink: list = []
+    ops: list = []
+    strategy._REJECT_SINK = sink
+    strategy._STATE_OPS = ops
+    strategy.REJECTS.reset()
+    try:
+        rows = unpack_ohlcv(ltf)
+        if kind == "pre":
+            res: Any = strategy.ltf_precheck(symbol, rows) is not None
+        else:
+            res = strategy.check_signal(symbol, rows, unpack_htf(htf))
+    finally:
+        strategy._REJECT_SINK = None
+        strategy._STATE_OPS = None
+    return (res, sink, strategy.REJECTS.drain(), strategy.PROFILE.drain() if profile else None,
+            strategy.bar_state_for(symbol), ops, time.perf_counter() - t0)
+
+
+# ---------- في العملية الرئيسية ----------
+class StrategyPool:
+    def __init__(self, workers: int = STRATEGY_POOL_WORKERS):
+        self.workers = max(1, int(workers))
+        self._ex: Optional[ProcessPoolExecutor] = None
+        self.stats = {"pre": 0, "check": 0, "signals": 0, "errors": 0, "cpu_sec": 0.0, "rejects": 0}
+
+    def start(self):
+        if self._ex is not None:
+            return
+        self._ex = ProcessPoolExecutor(max_workers=self.workers,
+                                       mp_context=multiprocessing.get_context("fork"))
+        # fork الآن (قبل الخيوط والمهام) وليس عند أول فحص
+        list(self._ex.map(_warm, range(self.workers)))
+
+    async def _submit(self, kind: str, symbol: str, ltf, htf=None):
+        self.start()
+        loop = asyncio.get_running_loop()
+        try:
+            res, rejects, telemetry, prof, bar_state, ops, cpu = await loop.run_in_executor(
+                self._ex, _evaluate, kind, symbol, pack_ohlcv(ltf), pack_htf(htf), strategy.bar_state_for(symbol),
+                strategy.state_for_worker(), strategy.PROFILE.on)
+        except Exception:
+            self.stats["errors"] += 1
+            raise
+        strategy.apply_bar_state(bar_state)
+        strategy.apply_state_ops(ops)
+        strategy.record_rejects(rejects)
+        strategy.REJECTS.merge(telemetry)
+        strategy.PROFILE.merge(prof)
+        self.stats[kind] += 1
+        self.stats["cpu_sec"] += cpu
+        self.stats["rejects"] += len(rejects)
+        return res
+
+    async def precheck(self, symbol: str, ohlcv) -> bool:
+        return bool(await self._submit("pre", symbol, ohlcv))
+
+    async def check_signal(self, symbol: str, ohlcv, ohlcv_htf=None) -> Optional[dict]:
+        sig = await self._submit("check", symbol, ohlcv, ohlcv_htf)
+        if sig:
+            self.stats["signals"] += 1
+        return sig
+
+    def close(self):
+        if self._ex is not None:
+            self._ex.shutdown(wait=False, cancel_futures=True)
+            self._ex = None
+
+    def snapshot(self) -> Dict[str, Any]:
+        return dict(self.stats, workers=self.workers, cpu_sec=round(self.stats["cpu_sec"], 2))
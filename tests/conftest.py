@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+import os
+import sys
+import tempfile
+
+import numpy as np
+import pandas as pd
+import pytest
+from numpy.lib.stride_tricks import sliding_window_view
+
+# الوحدات مسطّحة في جذر المستودع
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+# strategy يقرأ هذه عند الاستيراد: ملف حالة مؤقت وبلا طباعة أسباب الرفض
+os.environ.setdefault("STRATEGY_STATE_FILE", os.path.join(tempfile.mkdtemp(), "strategy_state.json"))
+os.environ.setdefault("STRATEGY_LOG_REJECTS", "0")
+
+# فروق بين EMAs (تعبر الصفر): الخطأ نسبي لمستوى السعر وليس للفرق نفسه
+PRICE_DIFF_COLS = ("macd", "macd_signal", "macd_hist")
+
+
+def _windows(v: np.ndarray, win: int = 20):
+    """(نافذة ثابتة، (mean/std)² للنافذة) لكل صف ابتداءً من اكتمال النافذة."""
+    flat = np.zeros(len(v), dtype=bool)
+    cond = np.ones(len(v))
+    if len(v) >= win:
+        w = sliding_window_view(v, win)
+        flat[win - 1:] = w.max(axis=1) == w.min(axis=1)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            cond[win - 1:] = np.nan_to_num((w.mean(axis=1) / w.std(axis=1)) ** 2, nan=1.0, posinf=1.0)
+    return flat, np.maximum(cond, 1.0)
+
+
+@pytest.fixture
+def assert_frames_close():
+    """مقارنة أعمدة المؤشرات بتسامح نسبي حقيقي (|x-y| ≤ rtol·|y|، والصفر يطابق صفرًا)؛
+    أعمدة MACD نسبةً إلى الإغلاق (PRICE_DIFF_COLS).
+    vol_z20: pandas يحسب rolling var تراكميًا فخطؤه يتضخم بـ (mean/std)² للنافذة ⇒ التسامح مضروب
+    بها؛ وفي نوافذ ثابتة تمامًا قد يترك std≈1e-3 فيعطي z≈0 حيث النواة تعطي NaN (يُتجاوز؛ القرارات
+    تقارن z بعتبة ≥ 0.45)."""
+    def check(got: pd.DataFrame, ref: pd.DataFrame, rtol: float = 1e-9):
+        assert list(got.columns) == list(ref.columns)
+        assert got.index.equals(ref.index)
+        flat, cond = _windows(ref["volume"].to_numpy(dtype=np.float64))
+        for col in ref.columns:
+            x, y = got[col].to_numpy(), ref[col].to_numpy()
+            if ref[col].dtype == bool:
+                assert got[col].dtype == bool and np.array_equal(x, y), col
+                continue
+            x, y = x.astype(np.float64), y.astype(np.float64)
+            scale = np.abs(y)
+            if col == "vol_z20":
+                scale = scale * cond
+                keep = ~(flat & np.isnan(x) & (np.abs(np.nan_to_num(y)) < 1e-6))
+                x, y, scale = x[keep], y[keep], scale[keep]
+            if col in PRICE_DIFF_COLS:
+                scale = np.maximum(scale, np.abs(ref["close"].to_numpy(dtype=np.float64)))
+            assert np.array_equal(np.isnan(x), np.isnan(y)), col
+            err = np.abs(x - y)
+            bad = err > rtol * scale
+            assert not bad.any(), f"{col}: {int(bad.sum())} values, worst at {int(np.nanargmax(err / np.where(scale > 0, scale, 1.0)))}"
+    return check
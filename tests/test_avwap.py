@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+import math
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from avwap import avwap_at, avwap_many, confluence_count, frame_prefix, vwap_prefix
+
+S, N = 40, 240
+
+
+def _direct_avwap(df: pd.DataFrame, idx: int) -> Optional[float]:
+    """avwap_from_index الأصلي: نسخة الذيل من المرساة + cumsum، القيمة عند الشمعة المغلقة."""
+    if idx is None or idx < 0 or idx >= len(df) - 1:
+        return None
+    sub = df.iloc[idx:].copy()
+    tp = (sub["high"] + sub["low"] + sub["close"]) / 3.0
+    numer = (tp * sub["volume"]).cumsum()
+    denom = (sub["volume"]).cumsum().replace(0, np.nan)
+    v = numer / denom
+    return float(v.iloc[-2]) if len(v) >= 2 and math.isfinite(v.iloc[-2]) else None
+
+
+@pytest.fixture(scope="module")
+def universe():
+    rng = np.random.default_rng(21)
+    c = 10 ** rng.uniform(-3, 4, (S, 1)) * np.exp(np.cumsum(rng.normal(0, 0.01, (S, N)), axis=1))
+    h = c * (1 + rng.uniform(0, 0.01, (S, N)))
+    l = c * (1 - rng.uniform(0, 0.01, (S, N)))
+    v = rng.lognormal(5, 1.0, (S, N))
+    v[::5, :30] = 0.0                                   # بداية بلا حجم
+    v[1::7, -40:] = 0.0                                 # ذيل بلا حجم ⇒ None
+    anchors = np.column_stack([rng.integers(-3, N + 2, S) for _ in range(3)])
+    anchors[:, 0] = 0
+    anchors[2, 1], anchors[3, 1], anchors[4, 1] = N - 2, N - 1, N    # الشمعة المغلقة / الجارية / خارج
+    return h, l, c, v, anchors
+
+
+def test_prefix_avwap_matches_direct(universe):
+    h, l, c, v, anchors = universe
+    P, V = vwap_prefix(h, l, c, v)
+    many = avwap_many(P, V, anchors)
+    n_none = 0
+    for s in range(S):
+        df = pd.DataFrame({"high": h[s], "low": l[s], "close": c[s], "volume": v[s]})
+        pre = frame_prefix(df)
+        for k, a in enumerate(anchors[s]):
+            ref = _direct_avwap(df, int(a))
+            got = avwap_at(pre, int(a))
+            if ref is None:
+                n_none += 1
+                assert got is None and np.isnan(many[s, k]), (s, a)
+            else:
+                assert got == pytest.approx(ref, rel=1e-9, abs=0)
+                assert many[s, k] == pytest.approx(ref, rel=1e-9, abs=0)
+    assert n_none > 0
+
+
+def test_confluence_count_matches_per_anchor(universe):
+    h, l, c, v, anchors = universe
+    P, V = vwap_prefix(h, l, c, v)
+    price, tol = c[:, -2], np.full(S, 0.003)
+    cnt = confluence_count(price, avwap_many(P, V, anchors), tol)
+    for s in range(S):
+        vals = [avwap_at((P[s], V[s]), int(a)) for a in anchors[s]]
+        assert cnt[s] == sum(1 for x in vals if x is not None and price[s] >= x * (1 - tol[s]))
@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+from typing import Dict
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import strategy
+from batch_features import compute_universe, matches
+
+COLS = ["timestamp", "open", "high", "low", "close", "volume"]
+N_SYMS = 60
+
+
+def _universe(n_syms: int = N_SYMS, n: int = 300, seed: int = 7) -> Dict[str, list]:
+    """كون بنفس شبكة الشموع + رمز بطول مختلف + رمز فيه None (يُترك للمسار الفردي)."""
+    rng = np.random.default_rng(seed)
+    ts = np.arange(n, dtype=np.int64) * 300_000 + 1_700_000_000_000
+    out: Dict[str, list] = {}
+    for i in range(n_syms + 2):
+        m = n - 37 if i == n_syms else n
+        start = 10 ** rng.uniform(-4, 5)
+        c = start * np.exp(np.cumsum(rng.normal(0, rng.uniform(0.001, 0.03), m)))
+        o = c * np.exp(rng.normal(0, 0.002, m))
+        h = np.maximum(o, c) * (1 + rng.uniform(0, 0.01, m))
+        l = np.minimum(o, c) * (1 - rng.uniform(0, 0.01, m))
+        v = rng.lognormal(rng.uniform(0, 15), 1.0, m)
+        if i % 7 == 0:
+            v[-25:] = v[-25]                                  # حجم ثابت (z-score NaN)
+        rows = [[int(t), float(a), float(b), float(x), float(y), float(z)]
+                for t, a, b, x, y, z in zip(ts[-m:], o, h, l, c, v)]
+        if i == n_syms + 1:
+            rows[5][4] = None
+        out[f"S{i}/USDT"] = rows
+    return out
+
+
+def _ltf_df(rows: list) -> pd.DataFrame:
+    """نفس تجهيز _prepare_ltf_df قبل المؤشرات."""
+    df = pd.DataFrame(rows, columns=COLS)
+    return strategy._trim(df.dropna().reset_index(drop=True), 240)
+
+
+@pytest.fixture(scope="module")
+def universe():
+    data = _universe()
+    return data, compute_universe(data)
+
+
+def test_batch_membership(universe):
+    data, feats = universe
+    assert set(data) - set(feats) == {f"S{N_SYMS + 1}/USDT"}        # None ⇒ المسار الفردي
+    assert feats[f"S{N_SYMS}/USDT"]["n"] == 240                      # شبكة مختلفة ⇒ مجموعة خاصة
+
+
+def test_frames_match_pandas_path(universe, assert_frames_close):
+    data, feats = universe
+    for sym, f in feats.items():
+        assert_frames_close(f["frame"](), strategy._add_indicators_pd(_ltf_df(data[sym])))
+
+
+def test_gate_inputs_match_per_symbol_functions(universe):
+    data, feats = universe
+    base = (0.002, 0.02)
+    for sym, f in feats.items():
+        ref = strategy._add_indicators_pd(_ltf_df(data[sym]))
+        closed = ref.iloc[-2]
+        assert f["regime"] == strategy.detect_regime(ref), sym
+        np.testing.assert_allclose(
+            strategy._atr_band_eff(None, base, True, False, f["regime"], q_band=f["q_band"]),
+            strategy._atr_band_eff(ref, base, True, False, f["regime"]), rtol=1e-9, atol=0)
+        ra = strategy._rvol_metrics(ref, closed, f["atr_pct"])
+        rb = strategy._rvol_from(f["closed"], *f["rvol_stats"], f["atr_pct"])
+        assert ra[3] == rb[3], sym
+        np.testing.assert_allclose(rb[0], ra[0], rtol=1e-9, atol=0)
+        if np.isnan(rb[1]):                                          # نافذة حجم ثابتة (انظر assert_frames_close)
+            assert np.isnan(ra[1]) or abs(ra[1]) < 1e-6, sym
+        else:
+            np.testing.assert_allclose(rb[1], ra[1], rtol=1e-9, atol=1e-12)
+        np.testing.assert_allclose(f["qv"], strategy._compute_quote_vol_series(ref).to_numpy(), rtol=1e-9, atol=0)
+
+
+def test_matches_detects_changed_rows(universe):
+    data, feats = universe
+    sym = "S1/USDT"
+    rows = data[sym]
+    assert matches(feats[sym], rows)
+    moved = [list(r) for r in rows]
+    moved[-1][4] *= 1.001                                              # الشمعة الجارية تغيّرت
+    assert not matches(feats[sym], moved)
+    assert not matches(feats[sym], rows[1:])
+    assert not matches(None, rows)
+
+
+def test_precheck_decisions_match_per_symbol_path(universe, assert_frames_close):
+    data, feats = universe
+    for sym in data:
+        a = strategy.ltf_precheck(sym, data[sym], feats=feats.get(sym))
+        b = strategy.ltf_precheck(sym, data[sym])
+        assert (a is None) == (b is None), sym
+        if a is not None:
+            assert a["bar_ts"] == b["bar_ts"]
+            assert_frames_close(a["df"], b["df"])
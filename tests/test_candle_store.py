@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import time
+
+import numpy as np
+
+from candle_store import CandleStore
+
+TF_MS = 300_000
+
+
+def _rows(n, t0=None):
+    t0 = t0 if t0 is not None else (int(time.time() * 1000) // TF_MS - n + 1) * TF_MS
+    return [[t0 + i * TF_MS, 1.0 + i, 2.0 + i, 0.5 + i, 1.5 + i, 10.0] for i in range(n)]
+
+
+class _Fetcher:
+    def __init__(self, rows):
+        self.rows = rows
+        self.calls = []
+
+    async def __call__(self, symbol, timeframe, limit, since):
+        self.calls.append((limit, since))
+        if since is None:
+            return self.rows[-limit:]
+        return [r for r in self.rows if r[0] >= since][:limit]
+
+
+def test_snapshot_with_bad_rows_clears_dirty_and_keeps_good_rows(tmp_path):
+    st = CandleStore(_Fetcher([]), capacity=50)
+    s = st._get_series("ABC/USDT", "5m")
+    rows = _rows(5)
+    rows[2][4] = None                     # None من المنصة ⇒ NaN
+    rows[3] = rows[3][:4]                 # صف ناقص ⇒ يُسقط
+    rows.append([None, 1, 1, 1, 1, 1])    # بلا ts ⇒ يُسقط
+    s.rows.extend(rows)
+    s.dirty = True
+
+    snap = st.snapshot_dirty()
+    assert not s.dirty
+    arr = snap[("ABC/USDT", "5m")]
+    assert arr.shape == (4, 6)
+    assert np.isnan(arr[2, 4])
+    assert st.snapshot_dirty() == {}      # لا إعادة محاولة في كل دورة
+
+    CandleStore.write_snapshot(tmp_path, snap)
+    st2 = CandleStore(_Fetcher([]), capacity=50)
+    assert st2.load_dir(tmp_path) == 1
+    assert len(st2.peek("ABC/USDT", "5m")) == 4
+
+
+def test_short_file_after_capacity_increase_refetches_full_depth(tmp_path):
+    rows = _rows(400)
+    old = CandleStore(_Fetcher(rows), capacity=300)
+    assert len(asyncio.run(old.get("ABC/USDT", "5m", 300))) == 300
+    old.save_dir(tmp_path)
+
+    f = _Fetcher(rows)
+    new = CandleStore(f, capacity=400)
+    new.load_dir(tmp_path)
+    assert new._series[("ABC/USDT", "5m")].depth == 300
+    out = asyncio.run(new.get("ABC/USDT", "5m", 400))
+    assert out == rows                                      # الصفوف المطلوبة هي المسلَّمة
+    assert new.stats["full"] == 1 and len(f.calls) == 2     # جلب كامل على صفحتين (سقف 300)
+
+
+def test_full_file_warm_load_fetches_only_delta(tmp_path):
+    rows = _rows(300)
+    old = CandleStore(_Fetcher(rows), capacity=300)
+    asyncio.run(old.get("ABC/USDT", "5m", 300))
+    old.save_dir(tmp_path)
+
+    f = _Fetcher(rows)
+    new = CandleStore(f, capacity=300)
+    new.load_dir(tmp_path)
+    assert asyncio.run(new.get("ABC/USDT", "5m", 300)) == rows
+    assert new.stats["full"] == 0 and new.stats["delta"] == 1
+    assert f.calls[0][1] is not None                        # فرق عبر since وليس جلبًا كاملًا
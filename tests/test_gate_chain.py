@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+import json
+
+import numpy as np
+import pytest
+
+import strategy
+
+N = 150
+SYMS = ["BTC/USDT:USDT", "ETH/USDT:USDT", "SOL/USDT:USDT", "ARB/USDT:USDT", "DOGE/USDT:USDT", "PEPE/USDT:USDT"]
+
+
+def _series(rng, n, tf_ms, t0, p0, mu, sig):
+    r = rng.normal(mu, sig, n)
+    for _ in range(rng.integers(1, 4)):                       # اندفاعات ⇒ بعض الرموز تمر كل البوابات
+        a = rng.integers(0, n - 20)
+        r[a:a + rng.integers(5, 20)] += abs(mu) * 4 + sig
+    c = p0 * np.exp(np.cumsum(r))
+    o = np.r_[p0, c[:-1]]
+    w = np.abs(rng.normal(0, sig, n)) * c
+    h = np.maximum(o, c) + w * rng.uniform(0.1, 1.0, n)
+    lo = np.minimum(o, c) - w * rng.uniform(0.1, 1.0, n)
+    v = rng.lognormal(8, 0.5, n) * (1 + (rng.random(n) < 0.05) * rng.uniform(1, 5, n))
+    v *= 1 + 3 * np.clip(r / sig, 0, None)
+    ts = t0 + np.arange(n) * tf_ms
+    return [[int(ts[i]), float(o[i]), float(h[i]), float(lo[i]), float(c[i]), float(v[i])] for i in range(n)]
+
+
+@pytest.fixture(scope="module")
+def samples():
+    rng = np.random.default_rng(7)
+    out = []
+    for k in range(N):
+        p0 = float(10 ** rng.uniform(-2, 4))
+        mu = rng.choice([0.0006, 0.0012, 0.0, -0.0004])
+        sig = rng.uniform(0.001, 0.006)
+        t0 = 1_790_000_000_000 + k * 300_000
+        sym = rng.choice(SYMS) + f"#{k % 5}"
+        htf = {tf: _series(rng, 220, ms, t0 - 220 * ms, p0, 0.002 * rng.choice([1, 1, -1]), 0.004)
+               for tf, ms in (("H1", 3_600_000), ("H4", 14_400_000), ("D1", 86_400_000))}
+        out.append((sym, _series(rng, 300, 300_000, t0, p0, mu, sig), htf))
+    return out
+
+
+def _reset(adaptive: bool, reorder_every: int = 200):
+    strategy.STATE.replace(strategy._state_defaults())
+    strategy.apply_bar_state({}, replace=True)
+    for ch in (strategy.PRE_GATES, strategy.CHECK_GATES):
+        ch.adaptive, ch.runs, ch.order, ch.reorder_every = adaptive, 0, list(ch.gates), reorder_every
+        for g in ch.gates:
+            g.calls = g.rejects = 0
+            g.sec = g.lazy_sec = 0.0
+
+
+@pytest.fixture
+def chains():
+    saved = [(ch, ch.adaptive, ch.reorder_every, list(ch.order)) for ch in (strategy.PRE_GATES, strategy.CHECK_GATES)]
+    yield
+    for ch, adaptive, every, order in saved:
+        ch.adaptive, ch.reorder_every, ch.order = adaptive, every, order
+    strategy.STATE.replace(strategy._state_defaults())
+    strategy.apply_bar_state({}, replace=True)
+
+
+def _chain_passed(fn) -> bool:
+    ch = strategy.CHECK_GATES
+    runs, rejects = ch.runs, sum(g.rejects for g in ch.gates)
+    fn()
+    return ch.runs > runs and sum(g.rejects for g in ch.gates) == rejects
+
+
+def _decisions(samples, adaptive: bool):
+    _reset(adaptive, reorder_every=25)                        # إعادة ترتيب متكررة داخل العيّنة الصغيرة
+    out = []
+    for sym, ltf, htf in samples:
+        pre = strategy.ltf_precheck(sym, ltf)
+        sig = strategy.check_signal(sym, ltf, htf, pre=pre) if pre else None
+        got = []                                              # بدون precheck: سلسلة check كاملة
+        passed = _chain_passed(lambda: got.append(strategy.check_signal(sym, ltf, htf)))
+        out.append(json.dumps([bool(pre), passed, sig, got[0]], sort_keys=True, default=str))
+    return out
+
+
+def test_adaptive_order_gives_same_decisions_as_static(samples, chains):
+    static = _decisions(samples, adaptive=False)
+    adaptive = _decisions(samples, adaptive=True)
+    assert static == adaptive
+    ch = strategy.CHECK_GATES
+    assert ch.reorders > 0 and ch.order != ch.gates          # الترتيب تغيّر فعلًا أثناء التشغيل
+    assert ch.order[-1].name == "atr_band"                    # كلفة MTF ⇒ يبقى أخيرًا
+    passed = [json.loads(x)[1] for x in static]
+    assert any(passed) and not all(passed)                    # السلسلة تقبل وترفض فعلًا في العيّنة
+    assert any(json.loads(x)[0] for x in static)
+
+
+def test_mtf_only_for_symbols_past_mtf_independent_gates(samples, chains, monkeypatch):
+    calls = []
+    real = strategy.pass_mtf_filter_any
+    monkeypatch.setattr(strategy, "pass_mtf_filter_any", lambda htf: calls.append(1) or real(htf))
+    _reset(adaptive=False)
+    gates = strategy.CHECK_GATES.gates
+    early = 0
+    for sym, ltf, htf in samples:
+        before, n0 = [g.rejects for g in gates], len(calls)
+        strategy.check_signal(sym, ltf, htf)
+        rejected_by = [g.name for g, b in zip(gates, before) if g.rejects > b]
+        assert len(calls) - n0 <= 1                            # مرة واحدة لكل رمز على الأكثر
+        if rejected_by and rejected_by[0] != "atr_band":
+            early += 1
+            assert len(calls) == n0, rejected_by               # رُفض قبل atr_band ⇒ لا MTF
+    assert early > 0 and calls
+    band = next(g for g in gates if g.name == "atr_band")
+    assert band.lazy_sec > band.sec > 0                     # MTF يُحتسب منفصلًا عن atr_band
+    assert all(g.lazy_sec == 0 for g in gates if g is not band)
+    snap = strategy.CHECK_GATES.snapshot()["gates"]["atr_band"]
+    assert snap["lazy_us"] > snap["avg_us"]
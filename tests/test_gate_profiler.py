@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+import time
+
+import pytest
+
+import strategy
+from gate_profiler import STRATEGY_PROFILE, GateProfiler
+
+
+def _chain(p: GateProfiler):
+    @p.wrap("check")
+    def gate_chain(x: int):
+        p.stage("a")
+        if x % 2:
+            return None
+        p.stage("b")
+        time.sleep(0.0005)
+        if x % 3 == 0:
+            return None
+        p.stage("c")
+        return x
+    return gate_chain
+
+
+def test_stages_pass_fail_and_cycles():
+    p = GateProfiler(enabled=True, history=3)
+    f = _chain(p)
+    for i in range(60):
+        f(i)
+    worker = GateProfiler(enabled=True)
+    worker.stage("a")                                   # خارج wrap ⇒ لا شيء
+    p.merge(worker.drain())
+    row = p.cycle()
+    st = {r["stage"]: r for r in row["stages"]}
+    assert (st["a"]["calls"], st["a"]["fail"]) == (60, 30)
+    assert (st["b"]["calls"], st["b"]["fail"]) == (30, 10)
+    assert (st["c"]["calls"], st["c"]["fail"]) == (20, 0)
+    assert st["total"]["pass"] == 20 and st["b"]["avg_us"] >= 400
+    assert not p.cur and len(p.cumulative()) == 4 and p.last() is row
+
+
+def test_sub_stage_is_charged_separately():
+    p = GateProfiler(enabled=True)
+
+    @p.wrap("check")
+    def fn():
+        p.stage("atr_band")
+        with p.sub("mtf"):
+            time.sleep(0.003)
+        return 1
+    for _ in range(5):
+        fn()
+    with p.sub("mtf"):                                  # خارج wrap ⇒ لا شيء
+        pass
+    st = {r["stage"]: r for r in p.rows(p.cur)}
+    assert st["mtf"]["calls"] == 5 and st["atr_band"]["calls"] == 5
+    assert st["mtf"]["avg_us"] >= 2500 and st["atr_band"]["avg_us"] < 1000
+    assert st["total"]["avg_us"] >= st["mtf"]["avg_us"]
+
+
+def test_disabled_wrap_is_the_function_itself():
+    p = GateProfiler(enabled=False)
+
+    def fn(x):
+        p.stage("a")
+        return x
+    assert p.wrap("check")(fn) is fn                    # بلا غلاف ⇒ صفر كلفة
+    assert p.wrapped == 0
+    p.on = True                                         # تشغيل لاحق لا يغلّف ما سبق
+    assert fn(1) == 1 and not p.cur
+
+
+def test_runtime_off_is_passthrough_without_recording():
+    p = GateProfiler(enabled=True)
+    f = _chain(p)
+    assert p.wrapped == 1 and f.__wrapped__ is not None
+    p.on = False
+    assert [f(i) for i in range(6)] == [None, None, 2, None, 4, None]
+    assert not p.cur
+    p.on = True
+    f(2)
+    assert p.cur
+
+
+@pytest.mark.skipif(STRATEGY_PROFILE, reason="STRATEGY_PROFILE=1 في البيئة")
+def test_strategy_entry_points_unwrapped_by_default():
+    assert not strategy.PROFILE.on and strategy.PROFILE.wrapped == 0
+    assert not hasattr(strategy.check_signal, "__wrapped__")
+    assert not hasattr(strategy.ltf_precheck, "__wrapped__")
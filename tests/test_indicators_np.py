@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import pandas as pd
+import pytest
+
+import strategy
+from indicators_np import EWM_BLOCK, _ewm_scan, add_indicators_np
+
+
+def _frame(rng, n: int, case: int = 0) -> pd.DataFrame:
+    start = 10 ** rng.uniform(-4, 5)
+    c = start * np.exp(np.cumsum(rng.normal(0, rng.uniform(0.001, 0.03), n)))
+    o = c * np.exp(rng.normal(0, 0.002, n))
+    h = np.maximum(o, c) * (1 + rng.uniform(0, 0.01, n))
+    l = np.minimum(o, c) * (1 - rng.uniform(0, 0.01, n))
+    v = rng.lognormal(rng.uniform(0, 15), 1.0, n)
+    if case % 5 == 0:
+        v[: int(rng.integers(1, min(30, n) + 1))] = 0.0       # بداية بلا حجم (VWAP NaN)
+    if case % 7 == 0 and n > 25:
+        v[-25:] = v[-25]                                     # حجم ثابت (z-score NaN)
+    if case % 9 == 0 and n > 40:
+        c[10:40] = o[10:40] = h[10:40] = l[10:40] = c[10]    # شموع مسطحة
+    ts = np.arange(n, dtype=np.int64) * 300_000 + 1_700_000_000_000
+    return pd.DataFrame({"timestamp": ts, "open": o, "high": h, "low": l, "close": c, "volume": v})
+
+
+def _check(df, assert_frames_close):
+    ref = strategy._add_indicators_pd(df.copy())
+    assert_frames_close(add_indicators_np(df), ref)
+
+
+def test_random_frames_match_pandas(assert_frames_close):
+    rng = np.random.default_rng(11)
+    for i in range(200):
+        df = _frame(rng, int(rng.choice([60, 61, 100, 239, 240, 300])), i)
+        _check(df.tail(240).copy() if i % 2 else df, assert_frames_close)
+
+
+@pytest.mark.parametrize("n", [1, 2, 3, 4, 7, 15, 16, 17, 19, 20, 21, 33])
+def test_short_series_match_pandas(n, assert_frames_close):
+    rng = np.random.default_rng(n)
+    _check(_frame(rng, n, 1), assert_frames_close)
+
+
+def test_flat_prices_match_pandas(assert_frames_close):
+    n = 240
+    ts = np.arange(n, dtype=np.int64) * 300_000
+    px = np.full(n, 0.000123)
+    for v in (np.full(n, 5.0), np.zeros(n)):
+        df = pd.DataFrame({"timestamp": ts, "open": px, "high": px, "low": px, "close": px, "volume": v})
+        _check(df, assert_frames_close)
+
+
+def test_nan_input_falls_back_to_pandas(assert_frames_close):
+    df = _frame(np.random.default_rng(3), 120, 1)
+    df.loc[50, "close"] = np.nan
+    with pytest.raises(ValueError):
+        add_indicators_np(df)
+    assert_frames_close(strategy.add_indicators(df.copy()), strategy._add_indicators_pd(df.copy()))
+
+
+@pytest.mark.parametrize("n", [1, EWM_BLOCK - 1, EWM_BLOCK, EWM_BLOCK + 1, 240, 1000])
+def test_ewm_scan_matches_pandas_recursion(n):
+    rng = np.random.default_rng(n)
+    alphas = (2.0 / 10, 1.0 / 14, 2.0 / 201)
+    x = np.abs(rng.normal(size=(len(alphas), n))) * 10 ** rng.uniform(-4, 4)
+    x[1, : n // 2] = 0.0                                      # أصفار تامة تبقى أصفارًا
+    got = _ewm_scan(x, alphas)
+    for k, a in enumerate(alphas):
+        ref = pd.Series(x[k]).ewm(alpha=a, adjust=False).mean().to_numpy()
+        np.testing.assert_allclose(got[k], ref, rtol=1e-12, atol=0)
+
+
+def test_ewm_scan_batched_axis_matches_rows():
+    rng = np.random.default_rng(4)
+    alphas = (2.0 / 10, 1.0 / 14)
+    x = rng.normal(size=(2, 7, 240)) * 10 ** rng.uniform(-4, 4, (1, 7, 1))
+    got = _ewm_scan(x, alphas)                                # (K, S, n): رموز batch_features
+    for s in range(7):
+        np.testing.assert_array_equal(got[:, s], _ewm_scan(np.ascontiguousarray(x[:, s]), alphas))
@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+import asyncio
+
+from okx_async import OKXAsync
+
+
+def _market(sym, base, quote, t):
+    return {"id": sym.replace("/", "-"), "symbol": sym, "base": base, "quote": quote, "type": t,
+            "spot": t == "spot", "swap": t == "swap", "active": True}
+
+
+def test_market_loads_go_through_the_call_hook():
+    calls = []
+
+    async def call(method, *args):
+        calls.append((method, args))
+        t = args[0]
+        good = _market("ABC/USDT" + (":USDT" if t == "swap" else ""), "ABC", "USDT", t)
+        return [good, {"symbol": None, "base": "", "quote": "USDT"}]      # معطوب ⇒ يُفلتر
+
+    async def go():
+        ex = OKXAsync(base_url="http://127.0.0.1:9")
+        try:
+            return await ex.load_markets_by_types(["spot", "swap"], call=call)
+        finally:
+            await ex.close()
+
+    assert asyncio.run(go()) == {"ABC/USDT", "ABC/USDT:USDT"}
+    assert calls == [("fetch_markets_by_type", ("spot", {})), ("fetch_markets_by_type", ("swap", {}))]
@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+import okx_routes
+from okx_routes import SymbolRouter
+
+
+def _adapt(sym, keys):
+    if sym in keys:
+        return sym
+    swap = f"{sym}:USDT" if ":USDT" not in sym else sym
+    return swap if swap in keys else None
+
+
+def _router():
+    r = SymbolRouter(_adapt)
+    r.rebuild({"ABC/USDT:USDT": {"type": "swap"}, "XYZ/USDT": {"type": "spot"}})
+    return r
+
+
+def test_raw_and_resolved_symbol_share_one_quarantine():
+    r = _router()
+    r.quarantine("ABC/USDT")                       # مسار OHLCV (الرمز الخام)
+    assert r.is_quarantined("ABC/USDT:USDT")       # مسار التيكر/الدفتر (الرمز الفعلي)
+    assert r.is_quarantined("ABC/USDT")
+    assert list(r.quarantined()) == ["ABC/USDT:USDT"]
+
+
+def test_first_strike_is_short_and_repeat_is_full(monkeypatch):
+    r = _router()
+    t = [1000.0]
+    monkeypatch.setattr(okx_routes.time, "time", lambda: t[0])
+    assert r.quarantine("ABC/USDT") == okx_routes.OKX_ROUTE_FIRST_STRIKE_SEC
+    t[0] += okx_routes.OKX_ROUTE_FIRST_STRIKE_SEC + 1
+    assert not r.is_quarantined("ABC/USDT")
+    assert r.quarantine("ABC/USDT:USDT") == okx_routes.OKX_ROUTE_QUARANTINE_SEC
+    assert r.is_quarantined("ABC/USDT")
+
+
+def test_success_between_failures_resets_strikes(monkeypatch):
+    r = _router()
+    t = [1000.0]
+    monkeypatch.setattr(okx_routes.time, "time", lambda: t[0])
+    r.quarantine("XYZ/USDT")
+    t[0] += okx_routes.OKX_ROUTE_FIRST_STRIKE_SEC + 1
+    r.remember("XYZ/USDT", "ticker", None)         # نجاح ⇒ forgive
+    assert r.quarantine("XYZ/USDT") == okx_routes.OKX_ROUTE_FIRST_STRIKE_SEC
+    t[0] += okx_routes.OKX_ROUTE_QUARANTINE_SEC + okx_routes.OKX_ROUTE_FIRST_STRIKE_SEC + 1
+    assert r.quarantine("XYZ/USDT") == okx_routes.OKX_ROUTE_FIRST_STRIKE_SEC   # خارج النافذة ⇒ أول مرة
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import pandas as pd
+
+import strategy
+from pivot_index import PivotIndexes
+
+T0 = 1_700_000_000_000
+
+
+def _highs(seed: int, n: int = 900) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    c = 100 * np.exp(np.cumsum(rng.normal(0, 0.004, n)))
+    h = c * (1 + rng.uniform(0, 0.004, n))
+    h[400:430] = h[400]                                   # قمم متساوية (تعادل)
+    return h
+
+
+def _frame(ts: np.ndarray, h: np.ndarray, t: int, forming: float) -> pd.DataFrame:
+    rows = slice(max(0, t - 239), t + 1)                  # نافذة 240 منزلقة (الحلقة تدور)
+    hh = h[rows].copy()
+    hh[-1] *= forming                                     # الشمعة الجارية تتغير
+    return pd.DataFrame({"timestamp": ts[rows], "high": hh})
+
+
+def _assert_same(idx: PivotIndexes, key, df: pd.DataFrame):
+    hh = df["high"].to_numpy()
+    for lb in (40, 60, 300):
+        for price in (float(hh[-2]), float(np.median(hh)), float(hh.max()) * 0.999, float(hh.max()) * 1.01):
+            assert idx.resistance_above(key, df, price, lb) == strategy.nearest_resistance_above(df, price, lb), \
+                (key, lb, price)
+
+
+def test_streaming_windows_match_window_scan():
+    rng = np.random.default_rng(3)
+    h = _highs(3)
+    ts = np.arange(len(h), dtype=np.int64) * 300_000 + T0
+    idx = PivotIndexes()
+    t = 300
+    while t < len(h):
+        _assert_same(idx, "X", _frame(ts, h, t, rng.uniform(0.995, 1.003)))
+        r = rng.random()
+        t += 0 if r < 0.1 else (3 if r > 0.97 else 1)    # نفس الشمعة / قفزة / شمعة واحدة
+        if r > 0.99:
+            h[t - 5] *= 1.001                              # تعديل شمعة مغلقة ⇒ إعادة بناء
+    st = idx.snapshot()
+    assert st["stepped"] > 400 and st["same_bar"] > 0 and st["mismatch"] > 0
+
+
+def test_timeframe_changes_match_window_scan():
+    rng = np.random.default_rng(5)
+    h = _highs(5)
+    ts5 = np.arange(len(h), dtype=np.int64) * 300_000 + T0
+    ts15 = np.arange(len(h), dtype=np.int64) * 900_000 + T0
+    idx = PivotIndexes()
+    for t in range(300, 420):
+        f = rng.uniform(0.995, 1.003)
+        _assert_same(idx, ("S", "5m"), _frame(ts5, h, t, f))           # مفتاحان لنفس الرمز
+        _assert_same(idx, ("S", "15m"), _frame(ts15, h[::-1].copy(), t, f))
+        if t % 40 == 0:                                                 # تغيّر الإطار تحت نفس المفتاح
+            _assert_same(idx, ("S", "5m"), _frame(ts15, h, t, f))
+    assert idx.snapshot()["keys"] == 2
+
+
+def test_eviction_keeps_results_exact():
+    h = _highs(7)
+    ts = np.arange(len(h), dtype=np.int64) * 300_000 + T0
+    idx = PivotIndexes(max_keys=2)
+    for t in range(300, 330):
+        for k in ("A", "B", "C"):
+            _assert_same(idx, k, _frame(ts, h, t, 1.0))
+    st = idx.snapshot()
+    assert st["keys"] == 2 and st["evicted"] > 0
@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+import pytest
+
+from rate_limiter import OKX_RECENT_CANDLES, EndpointRateLimiter, ohlcv_family
+
+NOW = 1_790_000_000_000
+H1 = 3_600_000
+
+
+def test_recent_and_delta_calls_use_candles():
+    assert ohlcv_family("5m", None, NOW) == "candles"
+    assert ohlcv_family("5m", NOW - 3 * 300_000, NOW) == "candles"
+    assert ohlcv_family("1h", NOW - 884 * H1, NOW) == "candles"
+
+
+def test_old_since_uses_history_candles():
+    # صفحات H1 العميقة (5300 شمعة لـ D1 المشتق) وما قبل حد الـ 1440 شمعة
+    assert ohlcv_family("1h", NOW - 5300 * H1, NOW) == "history_candles"
+    border = NOW - (OKX_RECENT_CANDLES - 1) * H1
+    assert ohlcv_family("1h", border, NOW) == "candles"
+    assert ohlcv_family("1h", border - 1, NOW) == "history_candles"
+
+
+def test_family_of_routes_fetch_ohlcv_by_since():
+    lim = EndpointRateLimiter()
+    fam, _ = lim.family_of("fetch_ohlcv", {"timeframe": "1h", "since": 0})
+    assert fam == "history_candles" and "history_candles" in lim.buckets
+    assert lim.family_of("fetch_ohlcv", {"timeframe": "5m", "limit": 300})[0] == "candles"
+    assert lim.family_of("fetch_ticker")[0] == "ticker"
+
+
+def test_market_loads_use_instruments_bucket():
+    lim = EndpointRateLimiter()
+    assert lim.family_of("fetch_markets_by_type") == ("instruments", 1.0)
+    assert lim.family_of("load_markets")[0] == "instruments" and "instruments" in lim.buckets
+
+
+def test_timeframe_parser_is_shared_and_strict():
+    import candle_store
+    import rate_limiter
+    from resample import tf_to_ms
+    assert candle_store.tf_to_ms is rate_limiter.tf_to_ms is tf_to_ms
+    assert [tf_to_ms(t) for t in ("30s", "5m", "1H", "1h", "1D", "1W")] == \
+        [30_000, 300_000, H1, H1, 24 * H1, 168 * H1]
+    assert tf_to_ms("1M") == 720 * H1                        # شهر OKX، لا دقيقة
+    with pytest.raises(ValueError):
+        tf_to_ms("5x")
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+import re
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from reject_telemetry import STAGES, RejectTelemetry, stage_of
+
+# رسائل الرفض كما تبنيها strategy (ltf_precheck/check_signal والبوابات)
+MESSAGES = [
+    ("insufficient_bars", "data"), ("after_cleaning_len<60", "data"), ("after_indicators_len<60", "data"),
+    ("bar_outlier", "outlier"),
+    ("parabolic_macd_cooling", "parabolic"), ("parabolic_runup", "runup"),
+    ("duplicate_symbol_bar", "duplicate"), ("duplicate_bar", "duplicate"),
+    ("holdout<2", "holdout"),
+    ("low_quote_vol (qv=1.2e5 < 3.0e5)", "liquidity"),
+    ("atr_pct_outside[0.0123] not in [0.0020,0.0100]", "atr_band"), ("atr_band_invalid", "atr_band"),
+    ("rvol<0.84 and no spike/accel (rv=0.47, z=-0.66)", "rvol"),
+    ("market_guard_block", "market_guard"), ("close<=open", "close_open"),
+    ("ema/vwap/avwap_align_false", "align"), ("no_setup_match", "setup"),
+    ("exhaustion_guard rsi=81.0, distATR=2.10", "exhaustion"), ("R_too_small", "risk"),
+    ("t1_entry_gap<0.400%", "t1_gap"), ("bounds_invalid(sl<price<t1<=tN)", "bounds"),
+    ("near_resistance_R=0.42<0.70", "resistance"), ("score<70 (got 61)", "score"),
+    ("something new", "other"),
+]
+
+
+@pytest.mark.parametrize("msg,stage", MESSAGES)
+def test_stage_of(msg, stage):
+    assert stage_of(msg) == stage
+
+
+def test_every_strategy_reject_literal_has_a_stage():
+    src = (Path(__file__).resolve().parents[1] / "strategy.py").read_text(encoding="utf-8")
+    lits = re.findall(r'_log_reject\(\w+, f?"([^"{]+)', src)
+    assert len(lits) >= 15
+    assert [m for m in lits if stage_of(m) == "other"] == []
+    assert {s for _, s in MESSAGES} == set(STAGES)            # كل مرحلة مغطاة في الجدول أعلاه
+
+
+def _feed(tel, rng, n, syms=300):
+    msgs = [m for m, _ in MESSAGES]
+    for _ in range(n):
+        tel.begin("check")
+        if rng.random() < 0.97:
+            m = msgs[rng.integers(0, len(msgs))]
+            v = float(rng.uniform(0, 100)) if m.startswith(("score<", "rvol<", "atr_pct")) else None
+            tel.record(f"S{rng.integers(0, syms)}/USDT", m, v)
+        else:
+            tel.passed_one()
+
+
+def test_symbol_keys_are_bounded():
+    tel = RejectTelemetry(log_sample=1, log_per_min=0, top_symbols=50)
+    _feed(tel, np.random.default_rng(23), 20000)
+    for si, d in enumerate(tel.by_symbol):
+        assert len(d) <= 51                                    # 50 رمزًا + "_other"
+        assert sum(d.values()) == int(tel.rejected[1, si])     # لا يضيع أي عدّ
+    assert any("_other" in d for d in tel.by_symbol)
+
+
+def test_worker_drains_merge_to_serial_counts():
+    serial = RejectTelemetry(top_symbols=50)
+    workers = [RejectTelemetry(top_symbols=50), RejectTelemetry(top_symbols=50)]
+    rng_a, rng_b = np.random.default_rng(5), np.random.default_rng(5)
+    _feed(serial, rng_a, 4000)
+    for i in range(4000):                                      # نفس التسلسل موزّعًا على عاملين
+        _feed(workers[i % 2], rng_b, 1)
+    merged = RejectTelemetry(top_symbols=50)
+    for w in workers:
+        merged.merge(w.drain())
+        assert w.rejected.sum() == 0                           # drain يصفّر العامل
+    assert np.array_equal(serial.rejected, merged.rejected)
+    assert np.array_equal(serial.hist, merged.hist)
+    assert np.array_equal(serial.evaluated, merged.evaluated)
+    assert all(len(d) <= 51 for d in merged.by_symbol)
+
+
+def test_funnel_accounts_for_every_evaluation():
+    tel = RejectTelemetry()
+    _feed(tel, np.random.default_rng(1), 3000)
+    rows = tel.funnel("check")
+    assert rows[-1]["entered"] - rows[-1]["rejected"] == int(tel.passed[1])
+    assert sum(r["rejected"] for r in rows) + int(tel.passed[1]) == int(tel.evaluated[1])
+
+
+def test_log_rate_limit_per_stage_and_minute():
+    tel = RejectTelemetry(log_sample=1, log_per_min=3)
+    si = tel.record("X", "close<=open")
+    assert sum(tel.should_log(si) for _ in range(10)) == 3
+    assert tel.log_dropped == 7
@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+from scan_tiers import ScanTiers
+
+
+def _rows(qv_scale: float, n=25):
+    w = 0.001 * qv_scale ** 0.5                                 # سيولة أعلى ⇒ ATR وrvol أعلى أيضًا
+    return [[i, 1.0, 1.0 + w, 1.0 - w, 1.0, qv_scale * (1 + (i % 3) + (i == n - 2) * w)] for i in range(n)]
+
+
+def test_unmeasured_symbol_is_not_ranked_as_zero_liquidity():
+    t = ScanTiers(hot_n=1, warm_n=1)
+    syms = ["A", "B", "C"]
+    t.observe("A", _rows(1000))
+    t.observe("B", _rows(10))
+    t.gate("C", 0)                                             # جديد وفشل جلبه: لا quote volume بعد
+    t.retier(syms, 1)
+    assert t.tier_of("C") == "hot"                             # لم يُقَس ⇒ يبقى hot، لا cold
+    assert [t.tier_of(s) for s in ("A", "B")] == ["hot", "warm"]
+
+    t.observe("C", _rows(1))                                   # قيس فعلًا ⇒ يُرتَّب بسيولته
+    t.retier(syms, 2)
+    assert t.tier_of("C") == "cold"
+
+
+def test_failed_fetch_keeps_last_gate_depth():
+    t = ScanTiers()
+    t.observe("A", _rows(100))
+    t.gate("A", 3)
+    t.gate("A", 0)
+    assert t._m["A"]["gate"] == 3 and t._m["A"]["qv"] > 0
@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+import json
+import os
+import threading
+import time
+
+import pytest
+
+import state_store
+from state_store import StateStore
+
+
+def _defaults():
+    return {"n": 0, "reject_counters": {}}
+
+
+def _wait_for(cond, timeout=3.0):
+    t = time.time() + timeout
+    while time.time() < t:
+        if cond():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def _tmp_files(d):
+    return [x for x in os.listdir(d) if x.endswith(".tmp")]
+
+
+def test_write_behind_coalesces_updates(tmp_path):
+    path = tmp_path / "state.json"
+    st = StateStore(str(path), _defaults, flush_sec=30)
+    for i in range(1000):
+        s = st.data
+        s["n"] += 1
+        s["reject_counters"][f"r{i % 7}"] = s["reject_counters"].get(f"r{i % 7}", 0) + 1
+        st.replace(s)
+    assert not path.exists()                        # لا كتابة مع كل تعديل
+    st.flush_soon()                                 # يوقظ خيط الكتابة بدل انتظار الدورة
+    assert _wait_for(lambda: st.stats["flushes"] == 1)
+    assert json.loads(path.read_text())["n"] == 1000
+    assert st.stats["loads"] == 1
+    assert not st.flush()                           # لا شيء متسخ
+
+
+def test_flush_sec_zero_writes_on_every_change(tmp_path):
+    path = tmp_path / "state.json"
+    st = StateStore(str(path), _defaults, flush_sec=0)
+    for i in range(3):
+        st.data["n"] = i + 1
+        st.mark_dirty()
+        assert json.loads(path.read_text())["n"] == i + 1
+    assert st.stats["flushes"] == 3
+
+
+def test_failed_replace_keeps_old_file_and_retries(tmp_path, monkeypatch):
+    path = tmp_path / "state.json"
+    st = StateStore(str(path), _defaults, flush_sec=30)
+    st.data["n"] = 1
+    st.mark_dirty()
+    assert st.flush()
+
+    st.data["n"] = 2
+    st.mark_dirty()
+    real_replace = os.replace
+
+    def boom(src, dst):
+        raise OSError("disk full")
+    monkeypatch.setattr(state_store.os, "replace", boom)
+    assert not st.flush()
+    assert json.loads(path.read_text())["n"] == 1   # الملف القديم سليم
+    assert not _tmp_files(tmp_path)                 # لا ملف مؤقت متروك
+    assert st.snapshot_stats()["dirty"] and st.stats["flush_errors"] == 1
+
+    monkeypatch.setattr(state_store.os, "replace", real_replace)
+    assert st.flush()
+    assert json.loads(path.read_text())["n"] == 2
+
+
+def test_readers_never_see_a_partial_file(tmp_path):
+    path = tmp_path / "state.json"
+    st = StateStore(str(path), _defaults, flush_sec=30)
+    st.data["blob"] = "x" * 200_000
+    st.mark_dirty()
+    st.flush()
+    errors, stop = [], threading.Event()
+
+    def reader():
+        while not stop.is_set():
+            try:
+                json.loads(path.read_text())
+            except Exception as e:  # نصف ملف ⇒ JSONDecodeError
+                errors.append(e)
+
+    t = threading.Thread(target=reader)
+    t.start()
+    for i in range(50):
+        st.data["n"] = i
+        st.mark_dirty()
+        st.flush()
+    stop.set()
+    t.join()
+    assert not errors
+    assert not _tmp_files(tmp_path)
+
+
+def test_edits_under_lock_never_race_the_flush(tmp_path):
+    path = tmp_path / "state.json"
+    st = StateStore(str(path), _defaults, flush_sec=30)
+    stop = threading.Event()
+    torn = []
+
+    def flusher():
+        while not stop.is_set():
+            if st.flush():
+                d = json.loads(path.read_text())
+                if len(d["reject_counters"]) != d["n"]:      # زوج يُعدَّل معًا ⇒ لا حالة نصف معدّلة
+                    torn.append(d["n"])
+
+    t = threading.Thread(target=flusher)
+    t.start()
+    for i in range(3000):
+        with st.edit() as s:
+            s["n"] += 1
+            time.sleep(0)                                    # يترك GIL وسط التعديل (بلا قفل ⇒ مئات اللقطات الممزقة)
+            s["reject_counters"][f"r{i}"] = 1
+    stop.set()
+    t.join()
+    st.flush()
+    assert st.stats["flush_errors"] == 0 and st.stats["flushes"] > 10
+    assert not torn
+    assert json.loads(path.read_text())["n"] == 3000
+
+
+def test_unserializable_state_stays_dirty(tmp_path):
+    st = StateStore(str(tmp_path / "state.json"), _defaults, flush_sec=30)
+    st.data["bad"] = object()
+    st.mark_dirty()
+    assert not st.flush()
+    assert st.snapshot_stats()["dirty"] and st.stats["flush_errors"] == 1
+    del st.data["bad"]
+    assert st.flush()
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="fork")
+def test_forked_worker_never_writes(tmp_path):
+    path = tmp_path / "state.json"
+    st = StateStore(str(path), _defaults, flush_sec=30)
+    st.data["n"] = 1
+    st.mark_dirty()
+    st.flush()
+    pid = os.fork()
+    if pid == 0:
+        st.data["n"] = -1
+        st.replace(st.data)
+        os._exit(0 if not st.flush() else 1)
+    assert os.waitpid(pid, 0)[1] == 0
+    assert json.loads(path.read_text())["n"] == 1
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="fork")
+def test_crash_then_reload(tmp_path):
+    path = tmp_path / "state.json"
+    pid = os.fork()
+    if pid == 0:                                    # عملية تكتب ثم تموت قبل الكتابة التالية (بلا atexit)
+        st = StateStore(str(path), _defaults, flush_sec=30)
+        st.data["n"] = 1
+        st.mark_dirty()
+        st.flush()
+        st.data["n"] = 2
+        st.mark_dirty()
+        os._exit(0)
+    assert os.waitpid(pid, 0)[1] == 0
+    assert not _tmp_files(tmp_path)
+
+    st2 = StateStore(str(path), lambda: dict(_defaults(), extra=1), flush_sec=30)
+    assert st2.data["n"] == 1                       # آخر حالة مكتوبة
+    assert st2.data["extra"] == 1                   # مفاتيح افتراضية جديدة تُدمج
+
+    path.write_text('{"n": 3, "reject_')           # ملف تالف (مثلاً كُتب بغير هذا المخزن)
+    st3 = StateStore(str(path), _defaults, flush_sec=30)
+    assert st3.data == _defaults()
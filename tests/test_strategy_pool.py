@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import pytest
+
+import strategy
+from strategy_pool import _evaluate, pack_htf, pack_ohlcv, unpack_ohlcv
+
+
+def _rows(n=300, seed=1):
+    rng = np.random.default_rng(seed)
+    c = 100 * np.exp(np.cumsum(rng.normal(0, 0.003, n)))
+    o = np.r_[c[0], c[:-1]]
+    h, lo = np.maximum(o, c) * 1.001, np.minimum(o, c) * 0.999
+    v = rng.lognormal(8, 0.5, n)
+    ts = 1_790_000_000_000 + np.arange(n) * 300_000
+    return [[int(ts[i]), float(o[i]), float(h[i]), float(lo[i]), float(c[i]), float(v[i])] for i in range(n)]
+
+
+def _htf(breadth: float):
+    majors = [{"close": 2.0 if i < breadth * 4 else 1.0, "ema200": 1.5} for i in range(4)]
+    return {"features": {"majors_state": majors}}
+
+
+@pytest.fixture
+def main_state():
+    strategy.STATE.replace(dict(strategy._state_defaults(), breadth_ema=0.5, signals_today=3))
+    strategy.mark_signal_now()
+    yield strategy.STATE.snapshot()
+    strategy.STATE.replace(strategy._state_defaults())
+    strategy.apply_bar_state({}, replace=True)
+
+
+def test_pack_roundtrip():
+    rows = _rows(50)
+    assert unpack_ohlcv(pack_ohlcv(rows)) == rows
+
+
+def test_concurrent_workers_replay_ops_onto_current_state(main_state):
+    sent = strategy.state_for_worker()
+    results = [_evaluate("check", "ABC/USDT:USDT", pack_ohlcv(_rows()), pack_htf(_htf(b)), {}, sent)
+               for b in (1.0, 0.0)]                              # عاملان من نفس اللقطة
+    ops = [r[5] for r in results]
+    assert ops == [[("breadth", 1.0)], [("breadth", 0.0)]]
+    assert strategy._STATE_OPS is None
+
+    strategy.STATE.replace(dict(main_state))                     # العملية الرئيسية كما كانت قبل الإرسال
+    for o in ops:
+        strategy.apply_state_ops(o)
+    b = 0.7 * (0.7 * 0.5 + 0.3 * 1.0) + 0.3 * 0.0               # التحديثان معًا، لا آخر كاتب فقط
+    assert strategy.STATE.data["breadth_ema"] == pytest.approx(b)
+
+
+def test_signal_counter_is_not_lost_between_workers(main_state):
+    sent = strategy.state_for_worker()
+    ops = []
+    for _ in range(2):
+        strategy.apply_worker_state(sent)
+        strategy._STATE_OPS = o = []
+        try:
+            strategy.mark_signal_now()
+        finally:
+            strategy._STATE_OPS = None
+        assert strategy.STATE.data["signals_today"] == main_state["signals_today"] + 1
+        ops.append(o)
+
+    strategy.STATE.replace(dict(main_state))
+    for o in ops:
+        strategy.apply_state_ops(o)
+    assert strategy.STATE.data["signals_today"] == main_state["signals_today"] + 2
+    assert strategy.STATE.data["last_signal_ts"] == ops[-1][0][1]
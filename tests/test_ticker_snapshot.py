@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+import asyncio
+
+from ticker_snapshot import TickerSnapshot
+
+SYMS = [f"S{i}/USDT:USDT" for i in range(40)]
+
+
+class _Bulk:
+    def __init__(self):
+        self.calls = []
+
+    async def __call__(self, mtype):
+        self.calls.append(mtype)
+        await asyncio.sleep(0.01)
+        return {s: {"last": 1.0 + i} for i, s in enumerate(SYMS)}
+
+
+def test_stale_monitor_reads_share_one_bulk_refresh():
+    bulk = _Bulk()
+    snap = TickerSnapshot(bulk, refresh_sec=5)
+
+    async def go():
+        await snap.refresh_type("swap")
+        for row in snap._data.values():
+            row["ts"] -= 4                                  # لقطة دورية عمرها 4s > 2s
+        snap._type_ts["swap"] -= 4
+        return await asyncio.gather(*(snap.last_fresh(s, 2) for s in SYMS))
+
+    prices = asyncio.run(go())
+    assert prices == [1.0 + i for i in range(len(SYMS))]
+    assert bulk.calls == ["swap", "swap"]                   # تحديث جماعي واحد لكل الصفقات
+
+
+def test_fresh_snapshot_needs_no_request_and_unknown_symbol_falls_back():
+    bulk = _Bulk()
+    snap = TickerSnapshot(bulk, refresh_sec=5)
+
+    async def go():
+        await snap.refresh_type("swap")
+        a = await snap.last_fresh(SYMS[3], 2)
+        b = await snap.last_fresh("NEW/USDT:USDT", 2)       # ليس في اللقطة الحديثة ⇒ None (تيكر فردي)
+        return a, b
+
+    assert asyncio.run(go()) == (4.0, None)
+    assert bulk.calls == ["swap"]
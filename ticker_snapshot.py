@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+"""
+ticker_snapshot.py — لقطة أسعار مشتركة (last/bid/ask) لكل الرموز عبر طلب tickers جماعي واحد لكل instType.
+
+بدلاً من fetch_ticker لكل صفقة مفتوحة/مرشّح/تريلينغ، تعمل حلقة خلفية تجلب
+/market/tickers?instType=SWAP (و SPOT عند الحاجة) كل TICKER_SNAPSHOT_SEC ثانية
+وتحفظ كل الأسعار في الذاكرة مع طابع زمني.
+
+- get(symbol) يعيد السعر فقط إن كان أحدث من TICKER_MAX_AGE_SEC، وإلا None
+  (والمستدعي يرجع لطريقة الجلب الفردية القديمة).
+- TICKER_MAX_AGE_SEC (20s) لفلترة الفحص فقط (السبريد)؛ مراقبة الصفقات المفتوحة (TP/SL/تريلينغ)
+  تستخدم last_fresh بعمر أضيق بكثير (MONITOR_PRICE_MAX_AGE_SEC في bot): لقطة أقدم من ذلك ⇒ تحديث
+  جماعي واحد لنوعها مشترك بين كل الصفقات (لا تيكر فردي لكل صفقة).
+- الأنواع تُجلب حسب الطلب: أي نوع سُئل عنه خلال TICKER_DEMAND_TTL_SEC يبقى ضمن الحلقة.
+"""
+
+from __future__ import annotations
+import asyncio
+import logging
+import os
+import time
+from typing import Awaitable, Callable, Dict, Optional
+
+TICKER_SNAPSHOT_SEC = float(os.getenv("TICKER_SNAPSHOT_SEC", "5"))
+TICKER_MAX_AGE_SEC = float(os.getenv("TICKER_MAX_AGE_SEC", "20"))
+TICKER_DEMAND_TTL_SEC = float(os.getenv("TICKER_DEMAND_TTL_SEC", "900"))
+
+logger = logging.getLogger("ticker_snapshot")
+
+
+def market_type_of(symbol: str) -> str:
+    """نفس تخمين bot: ':USDT' = سواب وإلا سبوت."""
+    return "swap" if ":USDT" in (symbol or "") else "spot"
+
+
+def _f(x) -> Optional[float]:
+    try:
+        v = float(x)
+        return v if v > 0 else None
+    except Exception:
+        return None
+
+
+class TickerSnapshot:
+    def __init__(self, fetch_by_type: Callable[[str], Awaitable[Dict[str, dict]]],
+                 refresh_sec: float | None = None, max_age_sec: float | None = None):
+        self.fetch_by_type = fetch_by_type
+        self.refresh_sec = float(refresh_sec or TICKER_SNAPSHOT_SEC)
+        self.max_age_sec = float(max_age_sec or TICKER_MAX_AGE_SEC)
+        self._data: Dict[str, dict] = {}          # symbol -> {"last","bid","ask","ts"}
+        self._demand: Dict[str, float] = {}       # type -> آخر وقت طُلب فيه
+        self._type_ts: Dict[str, float] = {}      # type -> آخر تحديث جماعي ناجح
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self.stats = {"refresh": 0, "errors": 0, "hit": 0, "miss": 0}
+
+    # ---------- التحديث ----------
+    async def refresh_type(self, mtype: str) -> int:
+        try:
+            tickers = await self.fetch_by_type(mtype) or {}
+        except Exception as e:
+            self.stats["errors"] += 1
+            logger.warning(f"[tickers] bulk {mtype} failed: {e}")
+            return 0
+        now = time.time()
+        n = 0
+        for sym, t in tickers.items():
+            if not isinstance(t, dict):
+                continue
+            info = t.get("info") or {}
+            last = _f(t.get("last")) or _f(t.get("close")) or _f(info.get("last"))
+            if last is None:
+                continue
+            self._data[sym] = {"last": last, "bid": _f(t.get("bid")), "ask": _f(t.get("ask")), "ts": now}
+            n += 1
+        self._type_ts[mtype] = now
+        self.stats["refresh"] += 1
+        return n
+
+    async def refresh_stale(self, mtype: str, max_age_sec: float) -> bool:
+        """تحديث نوع واحد إن كان آخر تحديث له أقدم من max_age_sec؛ المستدعون المتزامنون ينتظرون نفس الطلب."""
+        lock = self._locks.setdefault(mtype, asyncio.Lock())
+        async with lock:
+            if time.time() - self._type_ts.get(mtype, 0.0) <= max_age_sec:
+                return False
+            await self.refresh_type(mtype)
+            return True
+
+    async def refresh(self):
+        now = time.time()
+        for mtype, ts in list(self._demand.items()):
+            if now - ts > TICKER_DEMAND_TTL_SEC:
+                self._demand.pop(mtype, None)
+                continue
+            await self.refresh_type(mtype)
+
+    async def run(self):
+        while True:
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.warning(f"[tickers] loop error: {e}")
+            await asyncio.sleep(self.refresh_sec)
+
+    # ---------- القراءة ----------
+    def track(self, symbol: str):
+        self._demand[market_type_of(symbol)] = time.time()
+
+    def get(self, symbol: str, max_age_sec: float | None = None) -> Optional[dict]:
+        self.track(symbol)
+        row = self._data.get(symbol)
+        age = self.max_age_sec if max_age_sec is None else float(max_age_sec)
+        if row is None or (time.time() - row["ts"]) > age:
+            self.stats["miss"] += 1
+            return None
+        self.stats["hit"] += 1
+        return row
+
+    def last(self, symbol: str, max_age_sec: float | None = None) -> Optional[float]:
+        row = self.get(symbol, max_age_sec)
+        return row["last"] if row else None
+
+    async def last_fresh(self, symbol: str, max_age_sec: float) -> Optional[float]:
+        """سعر بعمر ≤ max_age_sec؛ لقطة أقدم ⇒ refresh_stale لنوع الرمز ثم القراءة (None ⇒ المستدعي يجلب فرديًا)."""
+        row = self._data.get(symbol)
+        if row is None or (time.time() - row["ts"]) > max_age_sec:
+            await self.refresh_stale(market_type_of(symbol), max_age_sec)
+        return self.last(symbol, max_age_sec)
+
+    def bid_ask(self, symbol: str) -> Optional[tuple[float, float]]:
+        row = self.get(symbol)
+        if not row or not row["bid"] or not row["ask"]:
+            return None
+        return row["bid"], row["ask"]
+
+    def __len__(self) -> int:
+        return len(self._data)